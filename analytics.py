@@ -0,0 +1,195 @@
+import logging
+import time
+from datetime import date
+from itertools import chain
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from catalog import format_price
+from config import WORKERS
+from database import db
+from models import Order, format_ts
+
+# Заказ считается оплаченным с момента «Я оплатил» (ожидает проверки) и дальше
+PAID_STATUSES = ("ожидает проверки", "в работе", "выполнен")
+
+
+class Bucket:
+    """Число заказов и сумма в копейках по текущему статусу"""
+
+    __slots__ = ("counts", "amounts")
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.amounts: Dict[str, int] = {}
+
+    def add(self, status: str, count: int, amount: int):
+        """Прибавляет count заказов на amount копеек (отрицательные - вычесть)"""
+        self.counts[status] = self.counts.get(status, 0) + count
+        self.amounts[status] = self.amounts.get(status, 0) + amount
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def count(self, statuses: Iterable[str]) -> int:
+        return sum(self.counts.get(status, 0) for status in statuses)
+
+    def amount(self, statuses: Iterable[str]) -> int:
+        return sum(self.amounts.get(status, 0) for status in statuses)
+
+
+class SalesAnalytics:
+    """Накопительные агрегаты продаж по игре, позиции, способу оплаты, дню и неделе
+
+    Подписан на изменения заказов (db.add_order_listener): новый заказ
+    добавляется во все свои корзины, изменение вычитает прежнюю версию и
+    добавляет новую. Отчет читает только корзины - O(числа корзин), а не
+    заказов. rebuild() пересчитывает всё с нуля по существующим заказам.
+    """
+
+    DIMENSIONS = ("game", "sku", "payment", "day", "week")
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.overall = Bucket()
+        self._buckets: Dict[str, Dict[Hashable, Bucket]] = {dimension: {} for dimension in self.DIMENSIONS}
+        self.rebuilt_at: Optional[float] = None
+
+    @staticmethod
+    def _keys(game: str, currency: str, payment_method: Optional[str], created: date) -> Tuple:
+        year, week, _ = created.isocalendar()
+        return (game, (game, currency), payment_method or "не указан", created.toordinal(), (year, week))
+
+    def _add(self, keys: Tuple, status: str, count: int, amount: int):
+        self.overall.add(status, count, amount)
+        for dimension, key in zip(self.DIMENSIONS, keys):
+            bucket = self._buckets[dimension].get(key)
+            if bucket is None:
+                bucket = self._buckets[dimension][key] = Bucket()
+            bucket.add(status, count, amount)
+
+    def _apply(self, order: Order, sign: int):
+        keys = self._keys(order.game, order.currency, order.payment_method, date.fromtimestamp(order.created_at))
+        self._add(keys, order.status, sign, sign * order.amount)
+
+    def on_order(self, order: Order, previous: Optional[Order]):
+        """Слушатель базы: previous=None - новый заказ"""
+        if previous is not None:
+            self._apply(previous, -1)
+        self._apply(order, 1)
+
+    def rebuild(self, orders: Iterable[Order]):
+        """Пересчет по всем заказам (при запуске и по кнопке в админке)"""
+        started = time.perf_counter()
+        self._reset()
+        count = 0
+        for order in orders:
+            self._apply(order, 1)
+            count += 1
+        self.rebuilt_at = time.time()
+        logging.info(f"Аналитика пересчитана по {count} заказам за {time.perf_counter() - started:.2f} с")
+
+    def rebuild_groups(self, groups: Iterable[tuple]):
+        """Пересчет по готовой сводке базы: (игра, позиция, оплата, день ISO, статус, заказов, сумма)"""
+        started = time.perf_counter()
+        self._reset()
+        count = 0
+        for game, currency, payment_method, day, status, orders, amount in groups:
+            self._add(self._keys(game, currency, payment_method, date.fromisoformat(day)), status, orders, amount)
+            count += orders
+        self.rebuilt_at = time.time()
+        logging.info(f"Аналитика пересчитана по {count} заказам за {time.perf_counter() - started:.2f} с")
+
+    def buckets(self, dimension: str) -> Dict[Hashable, Bucket]:
+        return self._buckets[dimension]
+
+    def report(self, days: int = 7, weeks: int = 4, top: int = 10) -> str:
+        """Текст экрана аналитики для админа"""
+        overall = self.overall
+        created = overall.total
+        paid = overall.count(PAID_STATUSES)
+        in_work = overall.count(("в работе", "выполнен"))
+        done = overall.count(("выполнен",))
+        cancelled = overall.count(("отменён",))
+        lines = [
+            "📈 Аналитика продаж",
+            "",
+            f"🧾 Заказов: {created}",
+            f"💳 Оплачено: {paid} ({_percent(paid, created)} от созданных)",
+            f"🔵 Взято в работу: {in_work} ({_percent(in_work, paid)} от оплаченных)",
+            f"🟢 Выполнено: {done} ({_percent(done, in_work)} от взятых в работу)",
+            f"🔴 Отменено: {cancelled} ({_percent(cancelled, created)} от созданных)",
+            f"💰 Выручка: {format_price(overall.amount(PAID_STATUSES))}₽ оплачено, "
+            f"{format_price(overall.amount(('выполнен',)))}₽ выполнено",
+        ]
+        _section(lines, "🎮 По играм:", self._top("game", top), str)
+        _section(lines, "💎 Топ позиций:", self._top("sku", top), lambda key: f"{key[0]} / {key[1]}")
+        _section(lines, "💳 По способам оплаты:", self._top("payment", top), str)
+
+        today = date.today()
+        day_keys = [today.toordinal() - offset for offset in range(days)]
+        _section(lines, f"📅 По дням ({days}):", self._rows("day", day_keys),
+                 lambda key: date.fromordinal(key).strftime("%d.%m"))
+        week_keys = []
+        for offset in range(weeks):
+            year, week, _ = date.fromordinal(today.toordinal() - 7 * offset).isocalendar()
+            week_keys.append((year, week))
+        _section(lines, f"🗓 По неделям ({weeks}):", self._rows("week", week_keys),
+                 lambda key: f"{key[1]:02d} нед. {key[0]}")
+        return "\n".join(lines)
+
+    def _top(self, dimension: str, top: int) -> List[Tuple[Hashable, Bucket]]:
+        # Корзины без заказов остаются после изменений - их не показываем
+        rows = [(key, bucket) for key, bucket in self._buckets[dimension].items() if bucket.total]
+        rows.sort(key=lambda row: (-row[1].amount(PAID_STATUSES), -row[1].total))
+        return rows[:top]
+
+    def _rows(self, dimension: str, keys: List[Hashable]) -> List[Tuple[Hashable, Bucket]]:
+        buckets = self._buckets[dimension]
+        return [(key, buckets.get(key) or Bucket()) for key in keys]
+
+
+def _section(lines: List[str], title: str, rows: List[Tuple[Hashable, Bucket]], label):
+    if not rows:
+        return
+    lines.append("")
+    lines.append(title)
+    for key, bucket in rows:
+        lines.append(f"• {label(key)}: {bucket.total} зак., {bucket.count(PAID_STATUSES)} опл. "
+                     f"на {format_price(bucket.amount(PAID_STATUSES))}₽")
+
+
+def _percent(part: int, whole: int) -> str:
+    return f"{part / whole * 100:.1f}%" if whole else "—"
+
+
+analytics = SalesAnalytics()
+db.add_order_listener(analytics.on_order)
+
+
+def rebuild_analytics():
+    """Пересчет по всем заказам базы, включая архив; вызывать в потоке базы (run_db)"""
+    if hasattr(db, "sales_groups"):
+        # SQLite: сводку по корзинам ведут триггеры базы, заказы не читаются
+        analytics.rebuild_groups(db.sales_groups())
+    else:
+        # data.json: горячие заказы из памяти, архив - потоком по сегментам, без общего списка
+        analytics.rebuild(chain(db.orders.values(), db.archive.iter_orders()))
+
+
+def analytics_report(rebuild: bool = False) -> str:
+    """Текст экрана аналитики с отметкой, насколько свежи цифры; вызывать в потоке базы (run_db)"""
+    if rebuild or WORKERS > 1:
+        # Слушатель видит только заказы своего воркера - при WORKERS > 1 перед показом
+        # перечитываем корзины общей базы (WORKERS > 1 бывает только с SQLite)
+        rebuild_analytics()
+    if WORKERS > 1:
+        freshness = f"🕒 По общей базе всех воркеров на {format_ts(int(analytics.rebuilt_at))}"
+    elif analytics.rebuilt_at is not None:
+        freshness = (f"🕒 Полный пересчет: {format_ts(int(analytics.rebuilt_at))}, "
+                     "дальше обновляется с каждым заказом")
+    else:
+        freshness = "🕒 Обновляется с каждым заказом, полного пересчета еще не было"
+    return analytics.report() + "\n\n" + freshness
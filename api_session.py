@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from aiohttp import ClientConnectorError
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from config import (
+    TELEGRAM_API_SERVER, API_POOL_SIZE, API_KEEPALIVE, API_DNS_TTL, API_TIMEOUT, API_METHOD_TIMEOUTS,
+    API_RETRIES, API_RETRY_BACKOFF, API_RETRY_AFTER_MAX
+)
+from metrics import metrics
+
+# Методы, которые что-то отправляют пользователю: при неизвестном исходе
+# (таймаут, обрыв, 5xx) повтор мог бы дать дубль сообщения
+_SENDING_PREFIXES = ("send", "copy", "forward")
+
+_retry_after_passthrough: ContextVar[bool] = ContextVar("retry_after_passthrough", default=False)
+
+
+@contextmanager
+def own_flood_control():
+    """Внутри блока 429 сразу уходит вызывающему - он сам решает, как притормозить (рассылка)"""
+    token = _retry_after_passthrough.set(True)
+    try:
+        yield
+    finally:
+        _retry_after_passthrough.reset(token)
+
+
+class TunedSession(AiohttpSession):
+    """Сессия Bot API с настроенным пулом соединений и таймаутами по методам
+
+    Соединения с Bot API переиспользуются (keep-alive) вместо TCP- и
+    TLS-рукопожатия на каждый вызов; pool_size ограничивает одновременные
+    запросы, остальные ждут свободного соединения. Адрес сервера кэшируется
+    на dns_ttl секунд. Явный таймаут вызывающего (getUpdates в polling)
+    важнее таймаута метода.
+    """
+
+    def __init__(self, pool_size: int = API_POOL_SIZE, keepalive: float = API_KEEPALIVE,
+                 dns_ttl: int = API_DNS_TTL, timeout: float = API_TIMEOUT,
+                 method_timeouts: Optional[Dict[str, float]] = None, api_server: str = TELEGRAM_API_SERVER):
+        kwargs = {"api": TelegramAPIServer.from_base(api_server)} if api_server else {}
+        super().__init__(limit=pool_size, timeout=timeout, **kwargs)
+        self._connector_init.update(keepalive_timeout=keepalive, ttl_dns_cache=dns_ttl)
+        self.method_timeouts = API_METHOD_TIMEOUTS if method_timeouts is None else method_timeouts
+
+    async def make_request(self, bot, method, timeout=None):
+        if timeout is None:
+            timeout = self.method_timeouts.get(method.__api_method__)
+        return await super().make_request(bot, method, timeout)
+
+
+class RetryMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: повторы вызовов Bot API при временных ошибках
+
+    - 429: ждем retry_after, если он не дольше retry_after_max, - запрос не
+      выполнялся, повтор безопасен;
+    - соединение не установилось: запрос не дошел до Telegram, повторяется
+      любой метод;
+    - таймаут, обрыв, 5xx: исход неизвестен, повторяются только методы без
+      отправки сообщений (правка, ответ на кнопку, getUpdates, ...).
+    Пауза между попытками растет вдвое со случайной добавкой, чтобы
+    одновременно упавшие запросы не вернулись разом.
+    """
+
+    def __init__(self, retries: int = API_RETRIES, backoff: float = API_RETRY_BACKOFF,
+                 retry_after_max: float = API_RETRY_AFTER_MAX):
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_after_max = retry_after_max
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        attempt = 0
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if (attempt >= self.retries or e.retry_after > self.retry_after_max
+                        or _retry_after_passthrough.get()):
+                    raise
+                reason, delay = "retry_after", e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= self.retries or not self._retryable(name, e):
+                    raise
+                reason = "server" if isinstance(e, TelegramServerError) else "network"
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+            attempt += 1
+            metrics.inc("bot_api_retries_total", (name, reason))
+            logging.info(f"Повтор {name} ({reason}, попытка {attempt + 1}) через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retryable(name: str, error: Exception) -> bool:
+        if isinstance(error.__cause__, ClientConnectorError):
+            return True
+        return not name.startswith(_SENDING_PREFIXES)
+
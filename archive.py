@@ -0,0 +1,146 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from config import ARCHIVE_SEGMENT_SIZE, ARCHIVE_CACHE_SEGMENTS
+from models import Order
+
+# Статусы, после которых заказ больше не меняется сам по себе
+TERMINAL_STATUSES = ("выполнен", "отменён")
+# Поля заказа в индексе архива
+INDEX_FIELDS = ("id", "user_id", "created_at", "status", "game", "payment_method", "game_id")
+
+
+class ColdArchive:
+    """Холодное хранилище заказов: неизменяемые gzip-сегменты и индекс на диске
+
+    Сегмент seg-NNNNNN.jsonl.gz - строки заказов (Order.to_row), записывается
+    один раз и больше не меняется. index.jsonl дописывается строкой на сегмент:
+    номер сегмента и INDEX_FIELDS его заказов - этого хватает, чтобы строить
+    списки и поисковые индексы, не читая сами сегменты. Заказы читаются по запросу,
+    последние распакованные сегменты держатся в небольшом LRU.
+
+    Если заказ потом изменили, его актуальная копия живет в горячем хранилище
+    и перекрывает архивную (forget); при следующей архивации он попадет в
+    новый сегмент, а старая копия так и останется неиспользуемой.
+    """
+
+    def __init__(self, path: str, segment_size: int = ARCHIVE_SEGMENT_SIZE,
+                 cache_segments: int = ARCHIVE_CACHE_SEGMENTS):
+        self.path = path
+        self.index_path = os.path.join(path, "index.jsonl")
+        self.segment_size = segment_size
+        self.cache_segments = cache_segments
+        # id заказа -> номер сегмента с его последней копией
+        self._location: Dict[int, int] = {}
+        self._last_segment = 0
+        self._cache: "OrderedDict[int, Dict[int, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._location)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._location
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"seg-{segment:06d}.jsonl.gz")
+
+    def open(self, hot: Iterable[int]) -> List[list]:
+        """Читает индекс; возвращает записи INDEX_FIELDS архивных заказов, которых нет в hot"""
+        entries: Dict[int, list] = {}
+        self._location.clear()
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Строка индекса недописана - сегмент мог не записаться, его заказы ещё в снимке
+                        logging.warning(f"Повреждённая запись индекса архива пропущена: {line[:100]!r}")
+                        break
+                    segment = record["segment"]
+                    self._last_segment = max(self._last_segment, segment)
+                    for entry in record["orders"]:
+                        # Более поздний сегмент содержит более свежую копию
+                        self._location[entry[0]] = segment
+                        entries[entry[0]] = entry
+        for order_id in hot:
+            self._location.pop(order_id, None)
+            entries.pop(order_id, None)
+        return list(entries.values())
+
+    def get(self, order_id: int) -> Optional[Order]:
+        """Заказ из архива; каждый вызов возвращает новый объект"""
+        segment = self._location.get(order_id)
+        if segment is None:
+            return None
+        row = self._segment(segment).get(order_id)
+        return Order.from_row(row) if row is not None else None
+
+    def _segment(self, segment: int) -> Dict[int, list]:
+        with self._lock:
+            rows = self._cache.get(segment)
+            if rows is not None:
+                self._cache.move_to_end(segment)
+                return rows
+        rows = {}
+        with gzip.open(self._segment_path(segment), "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                rows[row[0]] = row
+        with self._lock:
+            self._cache[segment] = rows
+            while len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+        return rows
+
+    def forget(self, order_id: int):
+        """Заказ снова в горячем хранилище - архивная копия больше не используется"""
+        self._location.pop(order_id, None)
+
+    def append(self, orders: List[Order]):
+        """Записывает заказы в новые сегменты по segment_size штук"""
+        os.makedirs(self.path, exist_ok=True)
+        for start in range(0, len(orders), self.segment_size):
+            self._write_segment(orders[start:start + self.segment_size])
+
+    def _write_segment(self, orders: List[Order]):
+        segment = self._last_segment + 1
+        path = self._segment_path(segment)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for order in orders:
+                f.write(json.dumps(order.to_row(), ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+        # Индекс - после сегмента: строка индекса без файла сегмента невозможна
+        record = {"segment": segment, "orders": [[getattr(order, field) for field in INDEX_FIELDS] for order in orders]}
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._last_segment = segment
+        for order in orders:
+            self._location[order.id] = segment
+
+    def iter_orders(self) -> Iterator[Order]:
+        """Все актуальные архивные заказы, сегмент за сегментом (без заполнения кэша)"""
+        by_segment: Dict[int, Set[int]] = {}
+        for order_id, segment in self._location.items():
+            by_segment.setdefault(segment, set()).add(order_id)
+        for segment in sorted(by_segment):
+            wanted = by_segment[segment]
+            with gzip.open(self._segment_path(segment), "rt", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row[0] in wanted:
+                        yield Order.from_row(row)
+
+
+def archivable(orders: Iterable[Order], before: int) -> List[Order]:
+    """Заказы в конечном статусе, которые не менялись с момента before"""
+    return [order for order in orders if order.status in TERMINAL_STATUSES and order.updated_at < before]
@@ -0,0 +1,267 @@
+"""Исходящие вызовы Bot API: пул соединений, keep-alive и повторы против мок-сервера
+
+Мок Bot API - aiohttp-сервер в отдельном процессе: отвечает на любой метод
+с задержкой (логнормальной, медиана --latency), первый запрос на новом
+соединении ждет еще --handshake (как TCP+TLS до api.telegram.org), часть
+ответов - 502 (--error-rate), 429 с retry_after (--flood-rate) или обрыв
+соединения без ответа (--reset-rate).
+
+Нагрузка на каждую сессию одна и та же: идет рассылка настоящим
+Broadcaster на --recipients получателей, и одновременно приходят оплаченные
+заказы (--order-rate в секунду), каждый - уведомление --admins админам
+сразу (как в обработчике «Я оплатил»). Меряются время уведомления по
+заказу (самый долгий из вызовов), потерянные уведомления, скорость рассылки,
+повторы и сколько соединений открыл клиент.
+
+Сессии: aiogram по умолчанию (без повторов); без keep-alive (новое
+соединение на каждый вызов); TunedSession + RetryMiddleware для каждого
+размера пула из --pools.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_bot_api --orders 300 --admins 5 --recipients 2000
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import percentile
+
+TOKEN = "42:BENCHMARK"
+
+
+def serve(args):
+    """Мок Bot API; печатает порт и работает, пока его не остановят"""
+    from aiohttp import web
+
+    rnd = random.Random(args.seed)
+    mu = math.log(args.latency / 1000)
+    stats = {"requests": 0, "connections": 0, "errors": 0, "flood": 0, "resets": 0}
+    seen = set()
+
+    async def handle(request: web.Request) -> web.Response:
+        form = await request.post()
+        stats["requests"] += 1
+        delay = rnd.lognormvariate(mu, args.sigma)
+        peer = request.transport.get_extra_info("peername")
+        if peer not in seen:
+            # Новое соединение: рукопожатие до первого ответа
+            seen.add(peer)
+            stats["connections"] += 1
+            delay += args.handshake / 1000
+        await asyncio.sleep(delay)
+
+        roll = rnd.random()
+        if roll < args.reset_rate:
+            stats["resets"] += 1
+            request.transport.close()
+            return web.Response(status=502)
+        roll -= args.reset_rate
+        if roll < args.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status=502)
+        roll -= args.error_rate
+        if roll < args.flood_rate:
+            stats["flood"] += 1
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}}, status=429)
+
+        method = request.match_info["method"]
+        if method.startswith(("send", "copy")):
+            chat_id = int(form.get("chat_id", 0))
+            result = {"message_id": stats["requests"], "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": form.get("text", "")}
+            if method == "copyMessage":
+                result = {"message_id": stats["requests"]}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    async def reset(request: web.Request) -> web.Response:
+        # Каждая сессия получает ту же последовательность задержек и сбоев
+        rnd.seed(args.seed)
+        for key in stats:
+            stats[key] = 0
+        seen.clear()
+        return web.json_response(True)
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/stats", get_stats)
+        app.router.add_post("/reset", reset)
+        app.router.add_post("/bot{token}/{method}", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        print(site._server.sockets[0].getsockname()[1], flush=True)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def run_variant(args, name: str, make_session, retry: bool, server: str) -> dict:
+    """Рассылка и уведомления админам одновременно через одну сессию"""
+    import aiohttp
+    from aiogram import Bot
+    from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+    from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+
+    from api_session import RetryMiddleware
+    from broadcast import Broadcaster
+    from metrics import metrics
+
+    class Calls(BaseRequestMiddleware):
+        """Время каждого вызова с точки зрения вызывающего, вместе с повторами"""
+
+        def __init__(self):
+            self.latencies = []
+
+        async def __call__(self, make_request, bot, method):
+            start = time.perf_counter()
+            try:
+                return await make_request(bot, method)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    async with aiohttp.ClientSession() as http:
+        await http.post(f"{server}/reset")
+
+    session = make_session()
+    calls = Calls()
+    # Раньше повторов - значит снаружи них
+    session.middleware(calls)
+    if retry:
+        session.middleware(RetryMiddleware())
+    bot = Bot(TOKEN, session=session)
+    metrics.counters("bot_api_retries_total").clear()
+    rnd = random.Random(args.seed)
+    notify_latencies, lost = [], 0
+
+    async def notify_admin(admin_id: int):
+        nonlocal lost
+        try:
+            await bot.send_message(chat_id=admin_id, text="🛒 Новый оплаченный заказ!")
+        except (TelegramAPIError, TelegramNetworkError):
+            lost += 1
+
+    async def order(delay: float):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await asyncio.gather(*(notify_admin(admin_id) for admin_id in range(1, args.admins + 1)))
+        notify_latencies.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        broadcaster = Broadcaster(os.path.join(tmp, "broadcast.json"), rate=args.broadcast_rate,
+                                  concurrency=args.concurrency, progress_interval=1)
+        start = time.perf_counter()
+        if args.recipients:
+            await broadcaster.start(bot, 1, {"type": "text", "text": "📢 Рассылка"},
+                                    list(range(10_000, 10_000 + args.recipients)))
+        arrivals, at = [], 0.0
+        for _ in range(args.orders):
+            at += rnd.expovariate(args.order_rate)
+            arrivals.append(at)
+        await asyncio.gather(*(order(delay) for delay in arrivals))
+        orders_done = time.perf_counter() - start
+        if broadcaster._task is not None:
+            await broadcaster._task
+        elapsed = time.perf_counter() - start
+    await session.close()
+
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{server}/stats") as resp:
+            server_stats = await resp.json()
+    return {
+        "name": name,
+        "notify_p50": percentile(notify_latencies, 50),
+        "notify_p99": percentile(notify_latencies, 99),
+        "call_p99": percentile(calls.latencies, 99),
+        "lost": lost,
+        "notifications": args.orders * args.admins,
+        "broadcast_rate": args.recipients / elapsed if args.recipients else 0.0,
+        "orders_time": orders_done,
+        "retries": sum(metrics.counters("bot_api_retries_total").values()),
+        "connections": server_stats["connections"],
+        "requests": server_stats["requests"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=300, help="оплаченных заказов за прогон")
+    parser.add_argument("--order-rate", type=float, default=20, help="заказов в секунду")
+    parser.add_argument("--admins", type=int, default=5, help="админов в уведомлении")
+    parser.add_argument("--recipients", type=int, default=2000, help="получателей рассылки (0 - без рассылки)")
+    parser.add_argument("--broadcast-rate", type=float, default=200, help="лимит рассылки, сообщений/с")
+    parser.add_argument("--concurrency", type=int, default=10, help="одновременных отправок рассылки")
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 100], help="размеры пула TunedSession")
+    parser.add_argument("--latency", type=float, default=40, help="медиана ответа мок-сервера, мс")
+    parser.add_argument("--sigma", type=float, default=0.5, help="разброс задержки (логнормальное сигма)")
+    parser.add_argument("--handshake", type=float, default=100, help="задержка нового соединения, мс")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="доля ответов 502")
+    parser.add_argument("--flood-rate", type=float, default=0.01, help="доля ответов 429 (retry_after 1)")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="доля оборванных соединений")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    import logging
+
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from api_session import TunedSession
+
+    command = [sys.executable, "-m", "benchmarks.bench_bot_api", "--serve"] + [
+        f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+        if name not in ("serve", "pools")
+    ]
+    # Отказы рассылки и повторы логируются на каждый вызов - в таблице они посчитаны
+    logging.disable(logging.ERROR)
+    server_process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        server = f"http://localhost:{server_process.stdout.readline().strip()}"
+        api = TelegramAPIServer.from_base(server)
+
+        def default_session():
+            return AiohttpSession(api=api)
+
+        def no_keepalive_session():
+            session = AiohttpSession(api=api)
+            session._connector_init["force_close"] = True
+            return session
+
+        def tuned_session(pool_size: int):
+            return lambda: TunedSession(pool_size=pool_size, api_server=server)
+
+        variants = [("aiogram по умолчанию", default_session, False), ("без keep-alive", no_keepalive_session, False)]
+        variants += [(f"Tuned, пул {pool}", tuned_session(pool), True) for pool in args.pools]
+
+        print(f"{'сессия':>22} {'увед. p50, мс':>14} {'увед. p99, мс':>14} {'вызов p99, мс':>14} "
+              f"{'потеряно':>9} {'рассылка, /с':>13} {'повторов':>9} {'соединений':>11} {'запросов':>9}")
+        for name, make_session, retry in variants:
+            report = asyncio.run(run_variant(args, name, make_session, retry, server))
+            print(f"{report['name']:>22} {report['notify_p50'] * 1000:>14.1f} {report['notify_p99'] * 1000:>14.1f} "
+                  f"{report['call_p99'] * 1000:>14.1f} {report['lost']:>4}/{report['notifications']:<4} "
+                  f"{report['broadcast_rate']:>13.1f} {report['retries']:>9.0f} {report['connections']:>11} "
+                  f"{report['requests']:>9}")
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+
+if __name__ == "__main__":
+    main()
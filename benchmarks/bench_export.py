@@ -0,0 +1,100 @@
+"""Память и скорость выгрузки заказов (/export) на больших базах
+
+База из N синтетических заказов загружается в дочернем процессе, затем
+db.iter_orders + write_export пишут выгрузку во временный файл в каждом
+формате. Пиковая рабочая память выгрузки меряется tracemalloc отдельным
+проходом после загрузки базы (сама база в замер не входит), время - проходом
+без трассировки. Для сравнения - «наивная» выгрузка, собирающая все строки
+в список перед записью: ее память растет с числом заказов, потоковой - нет.
+
+Каждый размер базы - отдельный процесс.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_export --sizes 100000 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+VARIANTS = (("csv", False), ("csv", True), ("jsonl", True))
+
+
+def run_one(args) -> dict:
+    """Прогон в текущем процессе; путь к базе уже выставлен родителем"""
+    import csv
+    import resource
+    import time
+    import tracemalloc
+
+    from database import db
+    from export import COLUMNS, export_rows, write_export
+
+    def rss_mb() -> float:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def naive_export(orders, get_user, directory):
+        # Все строки в памяти до записи - так выгрузку написали бы «в лоб»
+        rows = list(export_rows(orders, get_user))
+        path = os.path.join(directory, "naive.csv")
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+        return path, len(rows)
+
+    def measure(export) -> dict:
+        start = time.perf_counter()
+        path, count = export(db.iter_orders())
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        os.remove(path)
+        tracemalloc.start()
+        path, _ = export(db.iter_orders())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        os.remove(path)
+        return {"count": count, "elapsed": elapsed, "size": size, "peak": peak}
+
+    db.open()
+    loaded_rss = rss_mb()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, compress in VARIANTS:
+            name = fmt + (".gz" if compress else "")
+            results[name] = measure(lambda orders: write_export(orders, db.get_user, fmt, compress, tmp))
+        if args.naive:
+            results["csv (список)"] = measure(lambda orders: naive_export(orders, db.get_user, tmp))
+    db.close()
+    return {"results": results, "loaded_rss": loaded_rss, "peak_rss": rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="заказов в базе")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--no-naive", dest="naive", action="store_false", help="без наивной выгрузки")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args)))
+        return
+
+    from benchmarks.common import bench_env, prepare_database, run_child
+
+    print(f"{'заказов':>8} {'формат':>13} {'время, с':>9} {'заказов/с':>10} {'файл, МБ':>9} "
+          f"{'пик памяти выгрузки, МБ':>24}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = bench_env(tmp, DB_BACKEND=args.backend)
+            prepare_database(env, size)
+            report = run_child("benchmarks.bench_export", [] if args.naive else ["--no-naive"], env)
+        for name, result in report["results"].items():
+            print(f"{size:>8} {name:>13} {result['elapsed']:>9.2f} {result['count'] / result['elapsed']:>10.0f} "
+                  f"{result['size'] / 2**20:>9.1f} {result['peak'] / 2**20:>24.1f}")
+        print(f"{size:>8} {'RSS базы / пик RSS, МБ':>24}: {report['loaded_rss']:.0f} / {report['peak_rss']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
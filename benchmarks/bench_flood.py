@@ -0,0 +1,167 @@
+"""Флуд кнопкой «Подтвердить»: отзывчивость для остальных с антифлудом и без
+
+Dispatcher - bot.create_dispatcher() с антифлудом бота, Bot API - поддельная сессия.
+Спамеры раз за разом оказываются на шаге подтверждения заказа и жмут
+confirm_yes пачками одновременных нажатий (как клиент с двойными тапами или
+скрипт); каждое прошедшее нажатие - новый заказ и запись базы. Параллельно
+обычные покупатели, приходящие равномерно за время прогона, проходят воронку
+с паузами «на подумать». Меряются задержка
+апдейтов обычных покупателей, задержка цикла событий (задача, которая
+просыпается каждые 5 мс) и число заказов, созданных спамерами.
+
+Режимы - отдельные процессы с THROTTLE=0 и THROTTLE=1.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_flood --duration 10 --spammers 10 --taps 10 --users 200
+"""
+import argparse
+import json
+import tempfile
+
+LAG_INTERVAL = 0.005
+
+
+def run_one(args) -> dict:
+    """Прогон в текущем процессе; окружение уже выставлено родителем"""
+    import asyncio
+    import random
+    import time
+
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from benchmarks.common import percentile, stub_rates
+    from bot import create_dispatcher
+    from benchmarks.fake_telegram import BOT_TOKEN, FakeTelegram, callback_update, command_update, text_update
+    from callbacks import GameCallback, SkuCallback, PaidCallback
+    from catalog import catalog
+    from config import States
+    from database import db
+    from metrics import metrics
+
+    stub_rates()
+
+    async def run():
+        db.open()
+        session = FakeTelegram()
+        bot = Bot(BOT_TOKEN, session=session)
+        dp = create_dispatcher()
+
+        rnd = random.Random(42)
+        next_update_id = iter(range(1, 10**9))
+        latencies, lags = [], []
+        spammer_ids = range(7_000_000, 7_000_000 + args.spammers)
+        done = asyncio.Event()
+
+        async def feed(update: dict, samples=None):
+            start = time.perf_counter()
+            await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+            if samples is not None:
+                samples.append(time.perf_counter() - start)
+
+        async def lag_probe():
+            while not done.is_set():
+                expected = time.perf_counter() + LAG_INTERVAL
+                await asyncio.sleep(LAG_INTERVAL)
+                lags.append(max(0.0, time.perf_counter() - expected))
+
+        async def spammer(user_id: int):
+            game = catalog.games[0]
+            sku = game.skus[0]
+            context = dp.fsm.get_context(bot, user_id, user_id)
+            taps = 0
+            while time.perf_counter() < deadline:
+                # Снова на шаге подтверждения - как после «Назад» к новому заказу
+                await context.set_state(States.CONFIRM_ORDER)
+                await context.set_data({"game": game.name, "currency": sku.name,
+                                        "price": sku.price, "game_id": "123"})
+                await asyncio.gather(*(feed(callback_update(next(next_update_id), user_id, "confirm_yes"))
+                                       for _ in range(args.taps)))
+                taps += args.taps
+                await asyncio.sleep(args.pause)
+            return taps
+
+        async def buyer(user_id: int):
+            game = rnd.choice(catalog.games)
+            sku = rnd.choice(game.skus)
+            steps = [
+                command_update(next(next_update_id), user_id, "/start"),
+                callback_update(next(next_update_id), user_id, GameCallback(v=catalog.version, game=game.id).pack()),
+                callback_update(next(next_update_id), user_id, SkuCallback(v=catalog.version, sku=sku.id).pack()),
+                text_update(next(next_update_id), user_id, str(rnd.randrange(10**8))),
+                callback_update(next(next_update_id), user_id, "confirm_yes"),
+                callback_update(next(next_update_id), user_id, "payment_ton"),
+            ]
+            await asyncio.sleep(rnd.random() * args.duration)
+            for update in steps:
+                await feed(update, latencies)
+                await asyncio.sleep(args.think)
+            data = await dp.fsm.get_context(bot, user_id, user_id).get_data()
+            await feed(callback_update(next(next_update_id), user_id,
+                                       PaidCallback(method="ton", order=data["order_id"]).pack()), latencies)
+
+        probe = asyncio.create_task(lag_probe())
+        start = time.perf_counter()
+        deadline = start + args.duration
+        spam_taps = await asyncio.gather(*(spammer(user_id) for user_id in spammer_ids),
+                                         *(buyer(8_000_000 + i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+        await dp.storage.close()
+
+        spam_orders = sum(len(db.get_user_orders(user_id)) for user_id in spammer_ids)
+        buyer_orders = sum(len(db.get_user_orders(8_000_000 + i)) for i in range(args.users))
+        db.close()
+        return {
+            "elapsed": elapsed,
+            "spam_taps": sum(spam_taps[:args.spammers]),
+            "spam_orders": spam_orders,
+            "buyer_orders": buyer_orders,
+            "throttled": sum(metrics.counters("bot_throttled_total").values()),
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "lag_p99": percentile(lags, 99),
+            "lag_max": max(lags, default=0.0),
+        }
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10, help="длительность флуда, сек")
+    parser.add_argument("--spammers", type=int, default=10)
+    parser.add_argument("--taps", type=int, default=10, help="одновременных нажатий в заходе")
+    parser.add_argument("--pause", type=float, default=0.2, help="пауза спамера между заходами, сек")
+    parser.add_argument("--users", type=int, default=200, help="обычных покупателей за время прогона")
+    parser.add_argument("--think", type=float, default=0.3, help="пауза покупателя между шагами, сек")
+    parser.add_argument("--size", type=int, default=20_000, help="заказов в базе до начала")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--journal", choices=("0", "1"), default="1",
+                        help="DB_JOURNAL для json: 0 - каждая мутация переписывает весь data.json")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args)))
+        return
+
+    from benchmarks.common import bench_env, child_args, prepare_database, run_child
+
+    print(f"{'антифлуд':>9} {'нажатий':>8} {'заказов спама':>14} {'отброшено':>10} {'заказов покупателей':>20} "
+          f"{'p50, мс':>8} {'p99, мс':>8} {'лаг p99, мс':>12} {'лаг макс, мс':>13} {'время, с':>9}")
+    for throttle in ("0", "1"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = bench_env(tmp, FSM_STORAGE="memory", DB_BACKEND=args.backend, ADMIN_IDS="1",
+                            DB_JOURNAL=args.journal, THROTTLE=throttle)
+            prepare_database(env, args.size)
+            report = run_child("benchmarks.bench_flood", child_args(args, exclude=("backend", "size", "journal")), env)
+        print(f"{'вкл' if throttle == '1' else 'выкл':>9} {report['spam_taps']:>8} {report['spam_orders']:>14} "
+              f"{report['throttled']:>10.0f} {report['buyer_orders']:>20} "
+              f"{report['p50'] * 1000:>8.2f} {report['p99'] * 1000:>8.2f} "
+              f"{report['lag_p99'] * 1000:>12.1f} {report['lag_max'] * 1000:>13.1f} {report['elapsed']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
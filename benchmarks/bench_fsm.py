@@ -0,0 +1,66 @@
+"""Операций get_data/update_data в секунду: MemoryStorage против SQLiteStorage
+
+SQLiteStorage меряется дважды: когда все сессии помещаются в LRU-кэш и когда
+кэш меньше числа пользователей (часть чтений идет в базу). Между сценариями
+хранилище закрывается и открывается заново - данные должны сохраниться.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_fsm --users 10000 --ops 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_storage import SQLiteStorage
+
+
+def keys(users: int):
+    return [StorageKey(bot_id=42, chat_id=1_000_000 + i, user_id=1_000_000 + i) for i in range(users)]
+
+
+async def ops_per_second(storage, storage_keys, ops: int, seed: int = 1) -> tuple:
+    rnd = random.Random(seed)
+    picks = [rnd.choice(storage_keys) for _ in range(ops)]
+    start = time.perf_counter()
+    for i, key in enumerate(picks):
+        # Как в оформлении заказа: прочитать данные и дописать поле
+        await storage.get_data(key)
+        await storage.update_data(key, {"game": "Free Fire", "price": 7500, "step": i})
+    elapsed = time.perf_counter() - start
+    return ops * 2 / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=200_000)
+    args = parser.parse_args()
+    storage_keys = keys(args.users)
+
+    print(f"{'хранилище':>22} {'оп/с':>10}")
+    print(f"{'MemoryStorage':>22} {await ops_per_second(MemoryStorage(), storage_keys, args.ops):>10.0f}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fsm.sqlite3")
+        for label, cache_size in (("SQLite, кэш 100%", args.users), ("SQLite, кэш 10%", args.users // 10)):
+            storage = SQLiteStorage(path=path, cache_size=cache_size)
+            rate = await ops_per_second(storage, storage_keys, args.ops)
+            await storage.close()
+            print(f"{label:>22} {rate:>10.0f}")
+
+        # Перезапуск: данные читаются из базы
+        storage = SQLiteStorage(path=path)
+        restored = 0
+        for key in storage_keys:
+            restored += (await storage.get_data(key)).get("price") == 7500
+        await storage.close()
+        print(f"после перезапуска восстановлено сессий: {restored} из {args.users}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
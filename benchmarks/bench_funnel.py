@@ -0,0 +1,174 @@
+"""Нагрузочный прогон воронки покупки через настоящий Dispatcher
+
+Dispatcher собирается bot.create_dispatcher() - те же роутеры и middleware,
+что у бота; апдейты подаются через feed_update, Bot API заменен поддельной сессией (считает
+вызовы, сети нет), курсы TON/USDT - заглушкой без HTTP. Тысячи одновременных
+покупателей проходят /start -> игра -> валюта -> игровой ID -> подтверждение ->
+способ оплаты -> «Я оплатил», параллельно админы листают «Все заказы»,
+открывают заказы и меняют статусы. Задержка - время feed_update одного
+апдейта, включая разбор JSON.
+
+Каждый размер базы - отдельный процесс: данные и память не смешиваются.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_funnel --sizes 0 10000 100000 --users 2000
+"""
+import argparse
+import json
+import tempfile
+
+STEPS = ("start", "game", "sku", "game_id", "confirm", "payment", "paid",
+         "admin_list", "admin_page", "admin_order", "admin_status")
+
+
+def run_one(args) -> dict:
+    """Прогон в текущем процессе; окружение (пути, админы) уже выставлено родителем"""
+    import asyncio
+    import random
+    import resource
+    import time
+    from collections import defaultdict
+
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from benchmarks.common import percentile, stub_rates
+    from bot import create_dispatcher
+    from benchmarks.fake_telegram import BOT_TOKEN, FakeTelegram, callback_update, command_update, text_update
+    from callbacks import (
+        GameCallback, SkuCallback, PaidCallback, OrderDetailCallback,
+        OrdersPageCallback, OrderStatusCallback
+    )
+    from catalog import catalog
+    from config import ADMIN_IDS
+    from database import db
+
+    stub_rates(args.rtt)
+
+    def rss_mb() -> float:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    async def run():
+        db.open()
+        db.sync_with_config_admins(ADMIN_IDS)
+        loaded_rss = rss_mb()
+
+        session = FakeTelegram(args.rtt)
+        bot = Bot(BOT_TOKEN, session=session)
+        dp = create_dispatcher()
+
+        rnd = random.Random(42)
+        samples = defaultdict(list)
+        next_update_id = iter(range(1, 10**9))
+
+        async def feed(step: str, update: dict):
+            start = time.perf_counter()
+            await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+            samples[step].append(time.perf_counter() - start)
+
+        async def buyer(user_id: int):
+            for _ in range(args.rounds):
+                game = rnd.choice(catalog.games)
+                sku = rnd.choice(game.skus)
+                method = rnd.choice(("ton", "usdt", "bank"))
+                await feed("start", command_update(next(next_update_id), user_id))
+                await feed("game", callback_update(next(next_update_id), user_id,
+                                                   GameCallback(v=catalog.version, game=game.id).pack()))
+                await feed("sku", callback_update(next(next_update_id), user_id,
+                                                  SkuCallback(v=catalog.version, sku=sku.id).pack()))
+                await feed("game_id", text_update(next(next_update_id), user_id, str(rnd.randrange(10**8))))
+                await feed("confirm", callback_update(next(next_update_id), user_id, "confirm_yes"))
+                data = await dp.fsm.get_context(bot, user_id, user_id).get_data()
+                await feed("payment", callback_update(next(next_update_id), user_id, f"payment_{method}"))
+                await feed("paid", callback_update(next(next_update_id), user_id,
+                                                   PaidCallback(method=method, order=data["order_id"]).pack()))
+
+        async def admin(admin_id: int):
+            for _ in range(args.admin_actions):
+                await feed("admin_list", callback_update(next(next_update_id), admin_id, "admin_all_orders"))
+                last_id = db.last_order_id
+                if not last_id:
+                    await asyncio.sleep(0.01)
+                    continue
+                # Листание по курсору: следующая страница после случайного недавнего заказа
+                edge = db.get_order(rnd.randint(max(last_id - 500, 1), last_id))
+                await feed("admin_page", callback_update(next(next_update_id), admin_id, OrdersPageCallback(
+                    page=2, admin=True, ts=edge.created_at, order=edge.id).pack()))
+                order_id = rnd.randint(1, last_id)
+                await feed("admin_order", callback_update(next(next_update_id), admin_id,
+                                                          OrderDetailCallback(order=order_id, admin=True).pack()))
+                await feed("admin_status", callback_update(next(next_update_id), admin_id,
+                                                           OrderStatusCallback(status="work", order=order_id).pack()))
+
+        start = time.perf_counter()
+        tasks = [buyer(args.first_user + i) for i in range(args.users)]
+        tasks += [admin(admin_id) for admin_id in ADMIN_IDS]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await dp.storage.close()
+        db.close()
+
+        everything = [sample for step_samples in samples.values() for sample in step_samples]
+        return {
+            "updates": len(everything),
+            "elapsed": elapsed,
+            "p50": percentile(everything, 50),
+            "p95": percentile(everything, 95),
+            "p99": percentile(everything, 99),
+            "steps": {step: [len(samples[step]), percentile(samples[step], 50), percentile(samples[step], 99)]
+                      for step in STEPS if samples[step]},
+            "api_calls": sum(session.calls.values()),
+            "loaded_rss": loaded_rss,
+            "peak_rss": rss_mb(),
+        }
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10_000, 100_000], help="заказов в базе")
+    parser.add_argument("--users", type=int, default=2000, help="одновременных покупателей")
+    parser.add_argument("--rounds", type=int, default=1, help="покупок на покупателя")
+    parser.add_argument("--admin-actions", type=int, default=200, help="циклов просмотра/смены статуса на админа")
+    parser.add_argument("--rtt", type=float, default=0.0, help="время ответа Bot API и источника курсов, сек")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--fsm", choices=("memory", "sqlite"), default="sqlite")
+    parser.add_argument("--first-user", type=int, default=5_000_000, help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args)))
+        return
+
+    from benchmarks.common import bench_env, child_args, prepare_database, run_child
+
+    print(f"{'заказов':>8} {'апдейтов':>9} {'апд/с':>7} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} "
+          f"{'вызовов API':>12} {'RSS базы, МБ':>13} {'пик RSS, МБ':>12}")
+    reports = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = bench_env(
+                tmp, DB_BACKEND=args.backend, FSM_STORAGE=args.fsm, ADMIN_IDS="1,2",
+                # Покупатели и админы жмут кнопки без пауз - антифлуд исказил бы замер пропускной способности
+                THROTTLE="0",
+            )
+            prepare_database(env, size)
+            report = run_child("benchmarks.bench_funnel", child_args(args, exclude=("sizes", "backend", "fsm")), env)
+        reports.append((size, report))
+        print(f"{size:>8} {report['updates']:>9} {report['updates'] / report['elapsed']:>7.0f} "
+              f"{report['p50'] * 1000:>8.2f} {report['p95'] * 1000:>8.2f} {report['p99'] * 1000:>8.2f} "
+              f"{report['api_calls']:>12} {report['loaded_rss']:>13.1f} {report['peak_rss']:>12.1f}")
+
+    print(f"\n{'шаг':>13}" + "".join(f" {f'{size} p50/p99, мс':>22}" for size, _ in reports))
+    for step in STEPS:
+        row = f"{step:>13}"
+        for _, report in reports:
+            count, p50, p99 = report["steps"].get(step, [0, 0, 0])
+            row += f" {f'{p50 * 1000:.2f} / {p99 * 1000:.2f}' if count else '-':>22}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Стоимость одной записи: журнал против полной перезаписи data.json
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_journal --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import Timer, percentile, write_snapshot
+from database import Database
+
+
+def measure(data_path: str, journal: bool, writes: int) -> list:
+    db = Database(data_path=data_path, journal=journal, compact_every=0)
+    samples = []
+    for i in range(writes):
+        start = time.perf_counter()
+        db.add_order(1_000_000 + i, "Free Fire", "100+5", 75, str(i), None)
+        samples.append(time.perf_counter() - start)
+    db.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--writes", type=int, default=1000, help="записей в режиме журнала")
+    parser.add_argument("--snapshot-writes", type=int, default=5,
+                        help="записей в режиме полной перезаписи (каждая O(n))")
+    args = parser.parse_args()
+
+    print(f"{'заказов':>10} {'режим':>10} {'p50, мс':>10} {'p99, мс':>10} {'сжатие, с':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.json")
+            write_snapshot(path, size)
+            for journal, writes in ((True, args.writes), (False, args.snapshot_writes)):
+                samples = measure(path, journal, writes)
+                compact = ""
+                if journal:
+                    db = Database(data_path=path, journal=True, compact_every=0)
+                    with Timer() as t:
+                        db.save()
+                    compact = f"{t.elapsed:.2f}"
+                print(f"{size:>10} {'журнал' if journal else 'снимок':>10} "
+                      f"{percentile(samples, 50) * 1000:>10.3f} {percentile(samples, 99) * 1000:>10.3f} "
+                      f"{compact:>10}")
+
+
+if __name__ == "__main__":
+    main()
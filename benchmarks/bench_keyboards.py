@@ -0,0 +1,40 @@
+"""Сборка клавиатур каталога на каждый апдейт против готовых из кэша
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_keyboards
+"""
+import argparse
+import time
+
+import keyboards
+from catalog import catalog
+
+
+def per_update(func, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    games = [game.id for game in catalog.games]
+    cases = {
+        "игры": (keyboards._build_game_keyboard, keyboards.create_game_keyboard),
+        "валюты": (lambda: [keyboards._build_currency_keyboard(g) for g in games],
+                   lambda: [keyboards.create_currency_keyboard(g) for g in games]),
+        "оплата": (keyboards._build_payment_keyboard, keyboards.create_payment_keyboard),
+    }
+    keyboards.warm_up_keyboards()
+    print(f"{'экран':>8} {'сборка, мкс':>12} {'кэш, мкс':>10}")
+    for name, (build, cached) in cases.items():
+        print(f"{name:>8} {per_update(build, args.repeats) * 1e6:>12.1f} "
+              f"{per_update(cached, args.repeats) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
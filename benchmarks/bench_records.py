@@ -0,0 +1,65 @@
+"""Память и время загрузки: словари + json против Order/User и компактного формата
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_records --sizes 100000 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from benchmarks.common import Timer, write_snapshot
+from database import Database
+
+
+def measure_memory(load) -> int:
+    """Сколько байт удерживает результат load()"""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'заказов':>10} {'формат':>8} {'диск, Б/заказ':>14} {'RAM, Б/заказ':>13} {'загрузка, с':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_path = os.path.join(tmp, "legacy.json")
+            compact_path = os.path.join(tmp, "data.json")
+            write_snapshot(legacy_path, size)
+            # Конвертация в текущий формат - загрузкой копии: миграция при открытии
+            # перезаписывает файл на месте, а legacy.json должен остаться старым
+            shutil.copyfile(legacy_path, compact_path)
+            db = Database(data_path=compact_path, journal=False)
+            db.save()
+            del db
+
+            def load_legacy():
+                with open(legacy_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+
+            def load_compact():
+                return Database(data_path=compact_path, journal=False)
+
+            for label, path, load in (("dict", legacy_path, load_legacy), ("Order", compact_path, load_compact)):
+                with Timer() as t:
+                    result = load()
+                del result
+                memory = measure_memory(load)
+                print(f"{size:>10} {label:>8} {os.path.getsize(path) / size:>14.0f} "
+                      f"{memory / size:>13.0f} {t.elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
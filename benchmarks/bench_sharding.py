@@ -0,0 +1,92 @@
+"""Масштабирование обработки апдейтов по числу процессов-воркеров
+
+Фронт (этот процесс) раздает синтетические /start и /myorders через
+sharding.ShardedFront по from_user.id; воркеры обрабатывают их Dispatcher
+из bot.create_dispatcher() с поддельной сессией Bot API и общей базой SQLite.
+Пропускная способность считается по подтверждениям sendMessage от воркеров.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sharding --workers 1 2 4 --updates 20000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+
+
+def bench_worker(index: int, updates_queue, done_queue, rtt: float):
+    """Воркер без сети: тот же Dispatcher, что у бота, и sharding.serve_queue"""
+    from aiogram import Bot
+
+    from benchmarks.fake_telegram import BOT_TOKEN, FakeTelegram
+    from bot import create_dispatcher
+    from database import db
+    from sharding import serve_queue
+
+    async def run():
+        db.open()
+        bot = Bot(BOT_TOKEN, session=FakeTelegram(rtt, on_send=done_queue.put))
+        dp = create_dispatcher()
+        done_queue.put("ready")
+        await serve_queue(dp, bot, updates_queue)
+        await dp.storage.close()
+
+    asyncio.run(run())
+
+
+def run_workers(workers: int, updates: int, users: int, rtt: float) -> float:
+    from benchmarks.fake_telegram import command_update
+    from sharding import ShardedFront
+
+    done = multiprocessing.get_context("spawn").Queue()
+    front = ShardedFront(workers, bench_worker, args=(done, rtt))
+    front.start()
+    for _ in range(workers):
+        done.get()
+    start = time.perf_counter()
+    for i in range(updates):
+        user_id = 1_000_000 + i % users
+        front.route(command_update(i + 1, user_id, "/myorders" if i % 2 else "/start"))
+    received = 0
+    while received < updates:
+        try:
+            done.get(timeout=60)
+        except queue.Empty:
+            break
+        received += 1
+    elapsed = time.perf_counter() - start
+    front.stop()
+    return received / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--rtt", type=float, default=0.0, help="время ответа Bot API, сек")
+    args = parser.parse_args()
+
+    from benchmarks.common import bench_env
+
+    print(f"ядер: {os.cpu_count()}")
+    print(f"{'воркеров':>9} {'апд/с':>8} {'ускорение':>10}")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Воркеры наследуют окружение: общая база SQLite во временном каталоге
+            os.environ.update(bench_env(
+                tmp, DB_BACKEND="sqlite", DB_WRITE_BEHIND="0",
+                # Синтетические пользователи шлют апдейты без пауз - антифлуд исказил бы замер
+                THROTTLE="0",
+            ))
+            rate = run_workers(workers, args.updates, args.users, args.rtt)
+        baseline = baseline or rate
+        print(f"{workers:>9} {rate:>8.0f} {rate / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
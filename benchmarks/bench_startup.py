@@ -0,0 +1,75 @@
+"""Время запуска: импорт bot плюс готовность к polling при разных размерах data.json
+
+Каждый запуск - отдельный процесс (холодный импорт модулей проекта). Готовность:
+собран Dispatcher, прогреты клавиатуры, данные загружены и админы
+синхронизированы (bot.open_database). Заодно проверяется, пишет ли запуск
+что-нибудь на диск: первый запуск добавляет админов из config, повторный
+не должен менять файлы.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --sizes 0 10000 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.common import bench_env, run_child, write_snapshot
+
+
+def run_one() -> dict:
+    """Запуск в текущем процессе; модули проекта до этого не импортированы"""
+    import asyncio
+    import time
+
+    start = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+
+    async def ready():
+        bot.create_dispatcher()
+        bot.warm_up_keyboards()
+        await bot.open_database()
+
+    asyncio.run(ready())
+    return {"import": imported - start, "ready": time.perf_counter() - start}
+
+
+def file_state(*paths):
+    return [(os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+            for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10_000, 100_000])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one()))
+        return
+
+    print(f"{'заказов':>9} {'запуск':>10} {'импорт, с':>10} {'готов, с':>9} {'запись':>7}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = bench_env(tmp, DB_BACKEND="json")
+            data_path = env["DATA_PATH"]
+            journal_path = os.path.join(tmp, "data.journal")
+            if size:
+                write_snapshot(data_path, size)
+                # Перевод в текущую схему отдельно: миграция - разовая запись, не часть обычного запуска
+                from database import Database
+                legacy = Database(data_path=data_path)
+                legacy.admins = []
+                legacy.save()
+            for label in ("первый", "повторный"):
+                before = file_state(data_path, journal_path)
+                timings = run_child("benchmarks.bench_startup", [], env)
+                wrote = file_state(data_path, journal_path) != before
+                print(f"{size:>9} {label:>10} {timings['import']:>10.2f} {timings['ready']:>9.2f} "
+                      f"{'да' if wrote else 'нет':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Страница /myorders: полный перебор заказов против индекса по пользователю
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_user_orders --orders 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import Timer, percentile, write_snapshot
+from database import Database
+
+
+def scan_page(db: Database, user_id: int, page: int, per_page: int = 5) -> list:
+    """Прежняя реализация: фильтр по всем заказам и сортировка на каждый запрос"""
+    all_orders = [order for order in db.orders.values() if order.user_id == user_id]
+    start = (page - 1) * per_page
+    return sorted(all_orders, key=lambda x: (x.created_at, x.id), reverse=True)[start:start + per_page]
+
+
+def run(label: str, func, user_ids: list, repeats: int):
+    samples = []
+    for i in range(repeats):
+        user_id = user_ids[i % len(user_ids)]
+        start = time.perf_counter()
+        func(user_id, 1 + i % 3)
+        samples.append(time.perf_counter() - start)
+    print(f"{label:>8}: p50 {percentile(samples, 50) * 1000:.3f} мс, p99 {percentile(samples, 99) * 1000:.3f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        write_snapshot(path, args.orders, args.users)
+        with Timer() as t:
+            db = Database(data_path=path, journal=True, compact_every=0)
+        print(f"Загрузка и построение индекса: {t.elapsed:.2f} с, заказов {len(db.orders)}")
+
+        user_ids = random.Random(1).sample(sorted(db._user_orders), min(100, len(db._user_orders)))
+        for user_id in user_ids[:10]:
+            assert scan_page(db, user_id, 1) == db.get_user_orders_paginated(user_id, 1)["orders"]
+        run("перебор", lambda u, p: scan_page(db, u, p), user_ids, args.repeats)
+        run("индекс", lambda u, p: db.get_user_orders_paginated(u, p), user_ids, args.repeats * 100)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Сквозная задержка и пропускная способность: webhook против long polling
+
+Бот поднимается с Dispatcher из bot.create_dispatcher() и его startup/shutdown,
+но вместо Telegram используется поддельная сессия: каждый вызов Bot API стоит
+--rtt секунд, getUpdates отдает накопившиеся апдейты как long polling. В режиме webhook
+синтетические апдейты отправляются POST-запросами на локальный сервер
+(webhook.create_app), в режиме polling - кладутся в очередь getUpdates.
+Задержка считается от появления апдейта «в Telegram» до вызова sendMessage
+обработчиком /start.
+
+Каждый режим - отдельный процесс: startup/shutdown бота проходят по разу.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_webhook --updates 2000 --concurrency 50 --rtt 0.05
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import ClientSession, web
+
+from benchmarks.fake_telegram import BOT_TOKEN, FakeTelegram, command_update
+
+SECRET = "bench-secret"
+MODES = ("webhook", "polling")
+
+
+class Waiters(dict):
+    """chat_id -> future, которую завершает первый sendMessage в этот чат"""
+
+    def __call__(self, chat_id: int):
+        waiter = self.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+
+
+async def drive(waiters: Waiters, deliver, updates: int, concurrency: int, first_id: int):
+    """Гоняет апдейты через deliver, возвращает задержки и общее время"""
+    samples = []
+    ids = iter(range(first_id, first_id + updates))
+
+    async def client():
+        for update_id in ids:
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            waiters[update_id] = waiter
+            start = time.perf_counter()
+            await deliver(command_update(update_id, update_id))
+            samples.append(await asyncio.wait_for(waiter, timeout=30) - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def run_webhook(dp: Dispatcher, args) -> tuple:
+    from webhook import create_app
+
+    waiters = Waiters()
+    bot = Bot(BOT_TOKEN, session=FakeTelegram(args.rtt, on_send=waiters))
+    app = create_app(dp, bot, secret_token=SECRET)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/webhook"
+    async with ClientSession() as http:
+        async with http.post(url, json=command_update(1, 1), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as resp:
+            assert resp.status == 401, f"запрос с неверным секретом принят: {resp.status}"
+
+        async def deliver(update: dict):
+            # Доставка апдейта от Telegram до сервера - половина rtt
+            await asyncio.sleep(args.rtt / 2)
+            async with http.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+                assert resp.status == 200, resp.status
+
+        result = await drive(waiters, deliver, args.updates, args.concurrency, 10_000_000)
+    await runner.cleanup()
+    return result
+
+
+async def run_polling(dp: Dispatcher, args) -> tuple:
+    waiters = Waiters()
+    session = FakeTelegram(args.rtt, on_send=waiters)
+    bot = Bot(BOT_TOKEN, session=session)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False,
+                                                   polling_timeout=10))
+
+    async def deliver(update: dict):
+        session.updates.put_nowait(Update.model_validate(update, context={"bot": bot}))
+
+    result = await drive(waiters, deliver, args.updates, args.concurrency, 20_000_000)
+    await dp.stop_polling()
+    await polling
+    return result
+
+
+def run_one(args) -> dict:
+    """Прогон одного режима в текущем процессе; окружение уже выставлено родителем"""
+    from benchmarks.common import percentile, stub_rates
+    from bot import create_dispatcher
+
+    stub_rates()
+    dp = create_dispatcher()
+    run = run_webhook if args.mode == "webhook" else run_polling
+    samples, elapsed = asyncio.run(run(dp, args))
+    return {"p50": percentile(samples, 50), "p99": percentile(samples, 99), "rate": len(samples) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных пользователей")
+    parser.add_argument("--rtt", type=float, default=0.05, help="время ответа Bot API, сек")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args)))
+        return
+
+    from benchmarks.common import bench_env, child_args, run_child
+
+    print(f"{'режим':>8} {'p50, мс':>9} {'p99, мс':>9} {'апд/с':>8}")
+    for mode in MODES:
+        args.mode = mode
+        with tempfile.TemporaryDirectory() as tmp:
+            # Замеряется пропускная способность, а не антифлуд: синтетические пользователи шлют апдейты без пауз
+            report = run_child("benchmarks.bench_webhook", child_args(args), bench_env(tmp, THROTTLE="0"))
+        print(f"{mode:>8} {report['p50'] * 1000:>9.1f} {report['p99'] * 1000:>9.1f} {report['rate']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
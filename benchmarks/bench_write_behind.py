@@ -0,0 +1,63 @@
+"""Нагрузочный тест: задержка «обработчика» с отложенной записью и без неё
+
+Каждый симулированный пользователь создает заказ и меняет его статус через
+run_db, как это делают confirm_yes и paid. Замеряется время от начала до
+конца обработки одного апдейта.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_write_behind --orders 100000 --users 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.common import percentile, write_snapshot
+from database import Database, WriteBehind, run_db
+
+
+async def simulate_user(db: Database, user_id: int, updates: int, samples: list):
+    for i in range(updates):
+        start = time.perf_counter()
+        order = await run_db(db.add_order, user_id, "Free Fire", "100+5", 7500, str(i), None)
+        await run_db(db.update_order, order.id, {"status": "ожидает проверки", "payment_method": "TON"})
+        samples.append(time.perf_counter() - start)
+
+
+async def run_mode(path: str, journal: bool, write_behind: bool, users: int, updates: int, interval: float):
+    db = Database(data_path=path, journal=journal, compact_every=0, write_behind=write_behind)
+    scheduler = WriteBehind(db, interval=interval)
+    await scheduler.start()
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(*(simulate_user(db, 1_000_000 + u, updates, samples) for u in range(users)))
+    elapsed = time.perf_counter() - start
+    await scheduler.stop()
+    db.close()
+    return samples, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=100_000, help="заказов в базе до теста")
+    parser.add_argument("--users", type=int, default=200, help="одновременных пользователей")
+    parser.add_argument("--updates", type=int, default=5, help="апдейтов на пользователя")
+    parser.add_argument("--interval", type=float, default=0.5, help="DB_FLUSH_INTERVAL")
+    args = parser.parse_args()
+
+    print(f"{'журнал':>7} {'отлож.':>7} {'p50, мс':>10} {'p99, мс':>10} {'апд/с':>8}")
+    for journal in (False, True):
+        for write_behind in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "data.json")
+                write_snapshot(path, args.orders)
+                samples, elapsed = await run_mode(path, journal, write_behind, args.users,
+                                                  args.updates, args.interval)
+            print(f"{'да' if journal else 'нет':>7} {'да' if write_behind else 'нет':>7} "
+                  f"{percentile(samples, 50) * 1000:>10.2f} {percentile(samples, 99) * 1000:>10.2f} "
+                  f"{len(samples) / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
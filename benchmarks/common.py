@@ -0,0 +1,127 @@
+"""Общие помощники для бенчмарков: синтетические данные, замер времени и дочерние процессы"""
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+STATUSES = ["ожидает оплаты", "ожидает проверки", "в работе", "выполнен", "отменён"]
+PAYMENT_METHODS = [None, "TON", "USDT", "Банк"]
+
+
+def synthetic_orders(n_orders: int, n_users: int = 1000, seed: int = 42):
+    """Генерирует заказы в формате data.json с возрастающими id и датами"""
+    # Импорт здесь, а не в модуле: дочерний bench_startup меряет холодный импорт проекта
+    from config import GAMES
+
+    rnd = random.Random(seed)
+    games = list(GAMES.items())
+    start = datetime(2025, 1, 1)
+    for i in range(1, n_orders + 1):
+        game, currencies = rnd.choice(games)
+        currency, price = rnd.choice(list(currencies.items()))
+        ts = (start + timedelta(seconds=i * 7)).isoformat()
+        yield {
+            "id": str(i),
+            "user_id": 1_000_000 + rnd.randrange(n_users),
+            "game": game,
+            "currency": currency,
+            "amount": price,
+            "game_id": str(rnd.randrange(10**8)),
+            "payment_method": rnd.choice(PAYMENT_METHODS),
+            "status": rnd.choice(STATUSES),
+            "created_at": ts,
+            "updated_at": ts,
+        }
+
+
+def write_snapshot(path: str, n_orders: int, n_users: int = 1000):
+    """Записывает снимок data.json с n_orders заказами"""
+    users = {
+        str(1_000_000 + i): {"username": f"user{i}", "first_name": f"User {i}",
+                             "created_at": "2025-01-01T00:00:00"}
+        for i in range(n_users)
+    }
+    orders = {order["id"]: order for order in synthetic_orders(n_orders, n_users)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"users": users, "orders": orders, "admins": [], "last_order_id": n_orders},
+                  f, ensure_ascii=False, separators=(",", ":"))
+
+
+def bench_env(tmp: str, **overrides) -> dict:
+    """Окружение дочернего процесса: все файлы бота во временном каталоге tmp"""
+    env = dict(
+        os.environ,
+        DATA_PATH=os.path.join(tmp, "data.json"),
+        SQLITE_PATH=os.path.join(tmp, "data.sqlite3"),
+        FSM_PATH=os.path.join(tmp, "fsm.sqlite3"),
+        BROADCAST_STATE_PATH=os.path.join(tmp, "broadcast.json"),
+        # Без эндпоинта метрик: прогоны не занимают порт запущенного рядом бота
+        METRICS_PORT="0",
+    )
+    env.update(overrides)
+    return env
+
+
+def prepare_database(env: dict, n_orders: int):
+    """База из n_orders синтетических заказов по путям из env
+
+    Для DB_BACKEND=sqlite снимок переносится в SQLite отдельным процессом -
+    подготовка, не часть замера.
+    """
+    if not n_orders:
+        return
+    write_snapshot(env["DATA_PATH"], n_orders)
+    if env.get("DB_BACKEND") == "sqlite":
+        subprocess.run([sys.executable, "-m", "sqlite_database", "--source", env["DATA_PATH"],
+                        "--target", env["SQLITE_PATH"]], env=env, check=True, capture_output=True)
+
+
+def child_args(args, exclude=()) -> list:
+    """Аргументы родителя для дочернего процесса в виде --name=value, кроме exclude"""
+    return [f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+            if name not in ("child", *exclude)]
+
+
+def run_child(module: str, args: list, env: dict) -> dict:
+    """Запускает python -m module --child args и возвращает JSON из последней строки вывода"""
+    output = subprocess.run([sys.executable, "-m", module, "--child", *args], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def stub_rates(rtt: float = 0.0):
+    """Заглушка источника курсов TON/USDT: фиксированное значение после задержки «запроса» rtt"""
+    import asyncio
+
+    from rates import Rate, rates
+
+    async def stub_fetch(name: str) -> Rate:
+        await asyncio.sleep(rtt)
+        rate = Rate({"ton": 250.0, "usdt": 90.0}[name], time.monotonic())
+        rates._cache[name] = rate
+        return rate
+
+    rates._fetch = stub_fetch
+
+
+def percentile(samples: list, p: float) -> float:
+    """Перцентиль p (0..100) по отсортированной копии выборки"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Timer:
+    """Контекстный менеджер для замера времени в секундах"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,100 @@
+"""Поддельный Bot API для бенчмарков: настоящие роутеры, без сети"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates, SendMessage
+from aiogram.types import Chat, Message, User
+
+BOT_TOKEN = "42:BENCHMARK"
+
+
+class FakeTelegram(BaseSession):
+    """Сессия Bot API: задержка rtt на вызов и очередь для getUpdates
+
+    on_send(chat_id) вызывается на каждый sendMessage - по нему бенчмарк
+    понимает, что обработчик закончил работу. calls считает вызовы по методам.
+    """
+
+    def __init__(self, rtt: float = 0.0, on_send: Optional[Callable[[int], None]] = None):
+        super().__init__()
+        self.rtt = rtt
+        self.on_send = on_send
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.calls: Counter = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[method.__api_method__] += 1
+        if isinstance(method, GetUpdates):
+            # Запрос идет до Telegram, ждет апдейтов, ответ идет обратно
+            await asyncio.sleep(self.rtt / 2)
+            try:
+                batch = [await asyncio.wait_for(self.updates.get(), timeout=method.timeout or 1)]
+            except asyncio.TimeoutError:
+                return []
+            while not self.updates.empty() and len(batch) < (method.limit or 100):
+                batch.append(self.updates.get_nowait())
+            await asyncio.sleep(self.rtt / 2)
+            return batch
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        if isinstance(method, GetMe):
+            return User(id=42, is_bot=True, first_name="Bench", username="bench_bot")
+        if isinstance(method, SendMessage):
+            if self.on_send is not None:
+                self.on_send(method.chat_id)
+            return Message(message_id=1, date=datetime.now(), text=method.text,
+                           chat=Chat(id=method.chat_id, type="private"))
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def text_update(update_id: int, user_id: int, text: str) -> dict:
+    """Апдейт с обычным текстом от пользователя user_id в личном чате"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"bench{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def command_update(update_id: int, user_id: int, text: str = "/start") -> dict:
+    """Апдейт с командой от пользователя user_id в личном чате"""
+    update = text_update(update_id, user_id, text)
+    command = text.split()[0]
+    update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return update
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    """Нажатие inline-кнопки с callback_data под сообщением бота"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"bench{user_id}"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "Bench"},
+                "text": "...",
+            },
+        },
+    }
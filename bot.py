@@ -3,44 +3,132 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from config import TOKEN, ADMIN_IDS
-from database import db  # Импортируем db напрямую
+from config import (
+    TOKEN, ADMIN_IDS, BOT_MODE, DROP_PENDING_UPDATES, WORKERS,
+    METRICS_HOST, METRICS_PORT, LOOP_LAG_INTERVAL
+)
+from database import db, write_behind, archiver, run_db  # Импортируем db напрямую
+from analytics import rebuild_analytics
+from rates import rates
+from broadcast import broadcaster
 from handlers import user_handlers, admin_handlers
+from keyboards import warm_up_keyboards
+from fsm_storage import create_fsm_storage
+from metrics import LoopLagMonitor, MetricsServer
+from middlewares import ApiMetricsMiddleware, LegacyCallbackMiddleware, setup_metrics, setup_throttling
+from api_session import TunedSession, RetryMiddleware
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+loop_lag = LoopLagMonitor(LOOP_LAG_INTERVAL)
+metrics_server = MetricsServer()
 
-async def main():
-    # Синхронизация админов при запуске    
-    db.sync_with_config_admins(ADMIN_IDS)
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler("bot.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+
+async def open_database():
+    """Загружает данные и синхронизирует админов из config.py - единственная запись при старте, если что-то изменилось"""
+    await run_db(db.open)
+    await run_db(db.sync_with_config_admins, ADMIN_IDS)
     logging.info(f"Список администраторов: {db.admins}")
-    print(f"Админы после синхронизации: {db.admins}")
+    # Агрегаты аналитики считаются один раз по всем заказам, дальше обновляются на каждое изменение
+    await run_db(rebuild_analytics)
+
 
+async def on_startup(bot: Bot, worker_index: int = 0):
+    await loop_lag.start()
+    if METRICS_PORT:
+        try:
+            await metrics_server.start(METRICS_HOST, METRICS_PORT + worker_index)
+        except OSError as e:
+            logging.error(f"Не удалось поднять эндпоинт метрик: {e}")
+    await open_database()
+    # Курсы обновляются в фоне, обработчики оплаты читают их из кэша
+    await rates.start()
+    await write_behind.start()
+    # Старые завершенные заказы уходят из памяти в архив на диске
+    await archiver.start()
+    # Прерванная перезапуском рассылка продолжается с сохраненного места (в одном воркере)
+    if worker_index == 0:
+        await broadcaster.resume(bot)
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    await broadcaster.stop()
+    await archiver.stop()
+    await rates.close()
+    # Несохраненные состояния FSM дописываются в базу
+    await dispatcher.storage.close()
+    # Дописываем отложенные мутации до выхода
+    await write_behind.stop()
+    await metrics_server.stop()
+    await loop_lag.stop()
+
+
+def create_bot() -> Bot:
     bot = Bot(
         token=TOKEN,
+        # Пул соединений, таймауты по методам и адрес Bot API - из config.py
+        session=TunedSession(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher()
+    bot.session.middleware(ApiMetricsMiddleware())
+    # Повторы внутри замера: bot_api_seconds - полное время вызова вместе с паузами
+    bot.session.middleware(RetryMiddleware())
+    return bot
 
+
+def create_dispatcher() -> Dispatcher:
+    # Состояния покупателей хранятся на диске и переживают перезапуск
+    dp = Dispatcher(storage=create_fsm_storage())
     dp.include_router(admin_handlers.router)
     dp.include_router(user_handlers.router)
+    # Время апдейтов и обработчиков - для /stats и Prometheus
+    setup_metrics(dp)
+    # Антифлуд до фильтров; лимиты по группам обработчиков - в самих роутерах
+    setup_throttling(dp)
+    # Кнопки старого формата в уже отправленных сообщениях
+    dp.callback_query.outer_middleware(LegacyCallbackMiddleware())
+    # Один и тот же жизненный цикл для polling и webhook
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def main():
+    setup_logging()
+    bot = create_bot()
+    dp = create_dispatcher()
+    warm_up_keyboards()
 
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        logging.info("Бот запущен")
-        await dp.start_polling(bot)
+        if WORKERS > 1:
+            # Этот процесс только принимает апдейты, обработчики работают в воркерах
+            from sharding import run_sharded
+            logging.info(f"Бот запущен ({BOT_MODE}, воркеров: {WORKERS})")
+            await run_sharded(bot, dp.resolve_used_update_types(), WORKERS, BOT_MODE)
+        elif BOT_MODE == "webhook":
+            from webhook import run_webhook
+            logging.info("Бот запущен (webhook)")
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+            logging.info("Бот запущен (polling)")
+            await dp.start_polling(bot)
     except (KeyboardInterrupt, SystemExit):
         logging.info("Бот завершает работу...")
     except Exception as e:
         logging.error(f"Ошибка: {e}")
     finally:
         await bot.session.close()
+        db.close()
         logging.info("Сессия бота закрыта")
 
 if __name__ == "__main__":
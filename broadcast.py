@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, IO, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import Message
+
+from api_session import own_flood_control
+from config import (
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_STATE_PATH, BROADCAST_MAX_ATTEMPTS
+)
+
+
+class TokenBucket:
+    """Ограничитель скорости: не больше rate отправок в секунду с запасом capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Останавливает все отправки (ответ Telegram retry_after)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class FileLock:
+    """Межпроцессная блокировка на файле без ожидания
+
+    Блокировку держит ОС, поэтому она снимается и при падении процесса -
+    устаревших lock-файлов не бывает. Повторный acquire в том же процессе
+    тоже получает отказ: файл открывается заново.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[IO] = None
+
+    def acquire(self) -> bool:
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            # Закрытие файла снимает блокировку на любой платформе
+            self._file.close()
+            self._file = None
+
+
+def payload_from_message(message: Message) -> Dict:
+    """Текст рассылается с подписью, остальное (фото, видео, ...) - копией сообщения"""
+    if message.text:
+        return {"type": "text", "text": f"📢 Сообщение от администратора:\n\n{message.text}"}
+    return {"type": "copy", "from_chat_id": message.chat.id, "message_id": message.message_id}
+
+
+class Broadcaster:
+    """Рассылка с ограничением скорости, прогрессом и продолжением после перезапуска
+
+    Состояние хранится в двух файлах: BROADCAST_STATE_PATH (получатели и
+    содержимое, пишется один раз) и рядом .cursor (сколько получателей
+    обработано подряд с начала списка, номера уже обработанных после него и
+    счетчики; обновляется по ходу рассылки). После перезапуска рассылка
+    продолжается с курсора, пропуская обработанных; повторно могут получить
+    сообщение только отправки, которые шли в момент остановки (не больше
+    BROADCAST_CONCURRENCY), и в счетчиках они учитываются один раз.
+    Пока рассылка идет, процесс держит блокировку на файле .lock: при
+    WORKERS > 1 вторую рассылку не начнет ни этот, ни другой воркер.
+    """
+
+    def __init__(self, state_path: str = BROADCAST_STATE_PATH, rate: float = BROADCAST_RATE,
+                 concurrency: int = BROADCAST_CONCURRENCY,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL,
+                 max_attempts: int = BROADCAST_MAX_ATTEMPTS):
+        self.state_path = state_path
+        self.cursor_path = os.path.splitext(state_path)[0] + ".cursor"
+        self._lock = FileLock(os.path.splitext(state_path)[0] + ".lock")
+        self.rate = rate
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot: Bot, admin_chat_id: int, payload: Dict, user_ids: List[int]) -> bool:
+        """Начинает новую рассылку; False - уже идет другая (в этом или соседнем воркере)"""
+        if self.running or not self._lock.acquire():
+            return False
+        try:
+            progress = await bot.send_message(admin_chat_id, f"📢 Рассылка: 0/{len(user_ids)}")
+            state = {
+                "admin_chat_id": admin_chat_id,
+                "progress_message_id": progress.message_id,
+                "payload": payload,
+                "user_ids": user_ids
+            }
+            await asyncio.to_thread(self._write_json, self.state_path, state)
+            await asyncio.to_thread(self._write_json, self.cursor_path,
+                                    {"cursor": 0, "done": [], "success": 0, "failed": 0})
+        except BaseException:
+            self._lock.release()
+            raise
+        self._launch(bot, state)
+        return True
+
+    async def resume(self, bot: Bot) -> bool:
+        """Продолжает прерванную рассылку, если она есть"""
+        if self.running or not os.path.exists(self.state_path):
+            return False
+        if not self._lock.acquire():
+            # Рассылку ведет другой процесс
+            return False
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Не удалось прочитать состояние рассылки: {e}")
+            self._lock.release()
+            return False
+        logging.info(f"Продолжаем рассылку на {len(state['user_ids'])} пользователей")
+        self._launch(bot, state)
+        return True
+
+    def _launch(self, bot: Bot, state: Dict):
+        self._task = asyncio.create_task(self._run(bot, state))
+        # Через колбэк, а не finally в _run: задачу могут отменить до первого шага
+        self._task.add_done_callback(lambda _: self._lock.release())
+
+    async def stop(self):
+        """Прерывает рассылку; курсор сохраняется для продолжения"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    def _write_json(path: str, data: Dict):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _read_cursor(self) -> Dict:
+        try:
+            with open(self.cursor_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"cursor": 0, "done": [], "success": 0, "failed": 0}
+
+    async def _send(self, bot: Bot, bucket: TokenBucket, user_id: int, payload: Dict) -> bool:
+        for _ in range(self.max_attempts):
+            await bucket.acquire()
+            try:
+                # 429 не ждем в сессии: пауза нужна всем отправителям сразу, а не одному
+                with own_flood_control():
+                    if payload["type"] == "text":
+                        await bot.send_message(chat_id=user_id, text=payload["text"])
+                    else:
+                        await bot.copy_message(chat_id=user_id, from_chat_id=payload["from_chat_id"],
+                                               message_id=payload["message_id"])
+                return True
+            except TelegramRetryAfter as e:
+                # Лимит общий для бота - притормаживаем всех отправителей
+                bucket.pause(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Бот заблокирован или чат не существует - повтор не поможет
+                logging.info(f"Рассылка пропущена для {user_id}: {e}")
+                return False
+            except Exception as e:
+                logging.error(f"Ошибка рассылки для {user_id}: {e}")
+                return False
+        return False
+
+    async def _report(self, bot: Bot, state: Dict, text: str):
+        try:
+            await bot.edit_message_text(text=text, chat_id=state["admin_chat_id"],
+                                        message_id=state["progress_message_id"])
+        except Exception as e:
+            logging.warning(f"Не удалось обновить прогресс рассылки: {e}")
+
+    async def _run(self, bot: Bot, state: Dict):
+        try:
+            await self._broadcast(bot, state)
+        except Exception as e:
+            # Файлы состояния не трогаем: после перезапуска рассылка продолжится с курсора
+            logging.error(f"Рассылка прервана ошибкой: {e}")
+
+    async def _broadcast(self, bot: Bot, state: Dict):
+        user_ids = state["user_ids"]
+        total = len(user_ids)
+        progress = self._read_cursor()
+        bucket = TokenBucket(self.rate)
+        # Обработанные после курсора: курсор стоит на самой медленной из текущих отправок
+        done = set(progress.pop("done", []))
+        positions = (idx for idx in range(progress["cursor"], total) if idx not in done)
+
+        async def worker():
+            # Общий итератор раздает позиции между воркерами
+            for idx in positions:
+                if await self._send(bot, bucket, user_ids[idx], state["payload"]):
+                    progress["success"] += 1
+                else:
+                    progress["failed"] += 1
+                done.add(idx)
+                while progress["cursor"] in done:
+                    done.remove(progress["cursor"])
+                    progress["cursor"] += 1
+
+        async def save_cursor():
+            try:
+                # Снимок берется в цикле событий, запись - в потоке
+                await asyncio.to_thread(self._write_json, self.cursor_path, dict(progress, done=sorted(done)))
+            except OSError as e:
+                logging.warning(f"Не удалось сохранить курсор рассылки: {e}")
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                await save_cursor()
+                await self._report(bot, state, (
+                    f"📢 Рассылка: {progress['cursor']}/{total}\n"
+                    f"Успешно: {progress['success']}\nНе удалось: {progress['failed']}"
+                ))
+
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            reporter_task.cancel()
+            await save_cursor()
+        await self._report(bot, state, (
+            f"📢 Рассылка завершена:\nУспешно: {progress['success']}\nНе удалось: {progress['failed']}"
+        ))
+        for path in (self.state_path, self.cursor_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+broadcaster = Broadcaster()
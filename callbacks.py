@@ -0,0 +1,103 @@
+import re
+from typing import Optional, Tuple
+
+from aiogram.filters.callback_data import CallbackData
+
+from catalog import catalog
+
+# Короткие префиксы: callback_data ограничена 64 байтами
+
+
+class GameCallback(CallbackData, prefix="g"):
+    """Выбор игры; v - версия каталога, для которой собрана кнопка"""
+    v: int
+    game: int
+
+
+class SkuCallback(CallbackData, prefix="s"):
+    """Выбор позиции каталога"""
+    v: int
+    sku: int
+
+
+class PaidCallback(CallbackData, prefix="pd"):
+    """Кнопка «Я оплатил»; method - ton, usdt или bank"""
+    method: str
+    order: int
+
+
+class OrderDetailCallback(CallbackData, prefix="od"):
+    order: int
+    admin: bool = False
+
+
+class OrdersPageCallback(CallbackData, prefix="op"):
+    """Страница списка заказов по курсору
+
+    ts и order - ключ (created_at, id) крайнего заказа текущей страницы, older -
+    листать к более старым заказам (иначе к более новым); order=0 - первая
+    страница. page - только номер для подписи «N/M».
+    """
+    page: int
+    admin: bool = False
+    ts: int = 0
+    order: int = 0
+    older: bool = True
+
+    @property
+    def cursor(self) -> Optional[Tuple[int, int]]:
+        return (self.ts, self.order) if self.order else None
+
+
+class SearchPageCallback(CallbackData, prefix="sp"):
+    """Страница результатов поиска; сами фильтры лежат в данных FSM админа"""
+    page: int
+
+
+class OrderStatusCallback(CallbackData, prefix="st"):
+    """Смена статуса админом; status - work или done, notify - уведомить покупателя"""
+    status: str
+    order: int
+    notify: bool = True
+
+
+# Строковые форматы до перехода на классы CallbackData: такие кнопки остаются
+# в уже отправленных сообщениях (в том числе «Я оплатил» у неоплаченных заказов)
+_LEGACY_PAID = re.compile(r"paid_(ton|usdt|bank)_(\d+)")
+_LEGACY_ORDERS = re.compile(r"(admin_)?(order_detail|orders_page)_(\d+)")
+_LEGACY_STATUS = re.compile(r"(admin_)?status_(work|done)_(\d+)")
+_LEGACY_CURRENCY = re.compile(r"currency_(\d+)")
+
+
+def legacy_callback(data: str, game: Optional[str] = None) -> Optional[str]:
+    """Старая callback_data в новом формате; None - данные не старого формата
+
+    game - выбранная игра из данных FSM: кнопка currency_N хранила только
+    номер позиции внутри игры.
+    """
+    match = _LEGACY_PAID.fullmatch(data)
+    if match:
+        return PaidCallback(method=match[1], order=int(match[2])).pack()
+    match = _LEGACY_ORDERS.fullmatch(data)
+    if match:
+        admin = bool(match[1])
+        if match[2] == "order_detail":
+            return OrderDetailCallback(order=int(match[3]), admin=admin).pack()
+        # Номер страницы без курсора не переводится - открываем первую
+        return OrdersPageCallback(page=1, admin=admin).pack()
+    match = _LEGACY_STATUS.fullmatch(data)
+    if match:
+        # admin_status_* уведомляли покупателя, status_* - нет
+        return OrderStatusCallback(status=match[2], order=int(match[3]), notify=bool(match[1])).pack()
+    if data.startswith("game_"):
+        for item in catalog.games:
+            if item.name == data[len("game_"):]:
+                return GameCallback(v=catalog.version, game=item.id).pack()
+        return None
+    match = _LEGACY_CURRENCY.fullmatch(data)
+    if match and game is not None:
+        index = int(match[1])
+        for item in catalog.games:
+            if item.name == game and index < len(item.skus):
+                return SkuCallback(v=catalog.version, sku=item.skus[index].id).pack()
+    return None
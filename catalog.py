@@ -0,0 +1,69 @@
+import json
+import zlib
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from config import GAMES
+
+
+def to_kopecks(price) -> int:
+    """Цена из конфига (рубли, возможно дробные) в целые копейки без ошибок округления float"""
+    return int(Decimal(str(price)) * 100)
+
+
+def format_price(kopecks: int) -> str:
+    """Копейки в строку для сообщений: 6900 -> 69, 1590 -> 15.90"""
+    rubles, rest = divmod(int(kopecks), 100)
+    return f"{rubles}.{rest:02d}" if rest else str(rubles)
+
+
+@dataclass(frozen=True)
+class Sku:
+    """Позиция каталога: количество валюты и цена в копейках"""
+    id: int
+    game_id: int
+    name: str
+    price: int
+
+
+@dataclass(frozen=True)
+class Game:
+    id: int
+    name: str
+    skus: Tuple[Sku, ...]
+
+
+class Catalog:
+    """Каталог из config.GAMES с целочисленными id игр и позиций
+
+    id - это порядковые номера, поэтому при изменении каталога они могут
+    сдвинуться; version меняется вместе с каталогом и передается в
+    callback_data, чтобы не продать не ту позицию по старой кнопке.
+    """
+
+    def __init__(self, games: Dict[str, Dict[str, float]]):
+        # Без sort_keys: id зависят от порядка, значит и версия должна от него зависеть.
+        # Короткая версия, чтобы уложиться в 64 байта callback_data
+        raw = json.dumps(games, ensure_ascii=False).encode()
+        self.version = zlib.crc32(raw) & 0xFFFF
+        skus = []
+        games_list = []
+        for game_id, (name, currencies) in enumerate(games.items()):
+            game_skus = []
+            for currency, price in currencies.items():
+                sku = Sku(len(skus), game_id, currency, to_kopecks(price))
+                skus.append(sku)
+                game_skus.append(sku)
+            games_list.append(Game(game_id, name, tuple(game_skus)))
+        self.games: Tuple[Game, ...] = tuple(games_list)
+        self.skus: Tuple[Sku, ...] = tuple(skus)
+
+    def game(self, game_id: int) -> Optional[Game]:
+        return self.games[game_id] if 0 <= game_id < len(self.games) else None
+
+    def sku(self, sku_id: int) -> Optional[Sku]:
+        return self.skus[sku_id] if 0 <= sku_id < len(self.skus) else None
+
+
+catalog = Catalog(GAMES)
@@ -5,13 +5,131 @@ from typing import Dict, List
 os.makedirs("data", exist_ok=True)
 load_dotenv()
 
+
+def _optional_float(name: str, default: str):
+    """Число из переменной окружения; пустое значение означает «не задано»"""
+    value = os.getenv(name, default)
+    return float(value) if value else None
+
+
 # Основные настройки
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id]
+# Отказ в доступе к админке логируется не чаще раза в столько секунд на пользователя
+ADMIN_DENY_LOG_INTERVAL = float(os.getenv("ADMIN_DENY_LOG_INTERVAL", "60"))
+
+# Получение апдейтов: "polling" (getUpdates) или "webhook" (Telegram сам присылает апдейты на WEBHOOK_URL)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Сбрасывать ли накопившиеся апдейты при запуске
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "1") == "1"
+# Публичный адрес, на который Telegram отправляет апдейты, например https://bot.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token; пустой - генерируется при запуске
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Адрес, который слушает локальный сервер (за прокси или балансировщиком)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько одновременных соединений Telegram может открыть к серверу (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Сколько секунд при остановке ждать обработки уже принятых апдейтов
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "10"))
+
+# Число процессов-обработчиков; при WORKERS > 1 апдейты распределяются по from_user.id (нужен DB_BACKEND=sqlite)
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "10000"))  # апдейтов в очереди одного воркера
+
+# Метрики: эндпоинт Prometheus на локальном порту (0 - не поднимать); воркер N слушает METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # секунд между замерами задержки цикла событий
+
+# Антифлуд: лимиты на пользователя по группам обработчиков (флаг throttle у обработчика).
+# Группа: (запросов в секунду в среднем, сколько можно подряд сверх среднего); "0" в THROTTLE отключает
+THROTTLE = os.getenv("THROTTLE", "1") == "1"
+THROTTLE_LIMITS = {
+    # Все апдейты пользователя до разбора по обработчикам: отсекает флуд до фильтров
+    "flood": (float(os.getenv("THROTTLE_FLOOD_RATE", "5")), int(os.getenv("THROTTLE_FLOOD_BURST", "20"))),
+    # Создание и оплата заказа
+    "checkout": (float(os.getenv("THROTTLE_CHECKOUT_RATE", "0.5")), int(os.getenv("THROTTLE_CHECKOUT_BURST", "4"))),
+    # Листание списков заказов
+    "pagination": (float(os.getenv("THROTTLE_PAGINATION_RATE", "2")), int(os.getenv("THROTTLE_PAGINATION_BURST", "5"))),
+    # Всё в админ-роутере
+    "admin": (float(os.getenv("THROTTLE_ADMIN_RATE", "5")), int(os.getenv("THROTTLE_ADMIN_BURST", "15"))),
+    # Остальные обработчики покупателя
+    "default": (float(os.getenv("THROTTLE_DEFAULT_RATE", "2")), int(os.getenv("THROTTLE_DEFAULT_BURST", "8"))),
+}
+
+# Хранилище данных: "json" (data.json + журнал) или "sqlite"
+DB_BACKEND = os.getenv("DB_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/data.sqlite3")
+DATA_PATH = os.getenv("DATA_PATH", "data/data.json")
+# Журнал изменений: каждая мутация дописывается одной строкой вместо перезаписи всего файла
+DB_JOURNAL = os.getenv("DB_JOURNAL", "1") == "1"
+# Через сколько записей журнал сворачивается в снимок (0 - только вручную)
+DB_COMPACT_EVERY = int(os.getenv("DB_COMPACT_EVERY", "10000"))
+# Отложенная запись: мутации копятся в памяти и сбрасываются на диск пачкой
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0") == "1"
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))  # секунд между сбросами
+DB_FLUSH_BATCH = int(os.getenv("DB_FLUSH_BATCH", "500"))  # сброс раньше срока при таком числе мутаций
+
+# Архив (только DB_BACKEND=json): выполненные и отмененные заказы, не менявшиеся ARCHIVE_AFTER_DAYS дней,
+# переносятся из памяти в сжатые сегменты на диске (0 - не архивировать)
+ARCHIVE_AFTER = float(os.getenv("ARCHIVE_AFTER_DAYS", "30")) * 24 * 3600
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", str(6 * 3600)))  # секунд между проходами
+ARCHIVE_SEGMENT_SIZE = int(os.getenv("ARCHIVE_SEGMENT_SIZE", "5000"))  # заказов в одном сегменте
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv("ARCHIVE_CACHE_SEGMENTS", "4"))  # распакованных сегментов в памяти
+
+# Хранилище состояний FSM: "sqlite" (переживает перезапуск) или "memory"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_PATH = os.getenv("FSM_PATH", "data/fsm.sqlite3")
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))  # сессий в LRU-кэше
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))  # секунд между записями в базу
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "500"))
+# Сессия без изменений дольше FSM_TTL секунд считается брошенной (0 - хранить вечно)
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600)))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "3600"))
 
 # Добавим API для получения курса TON:
-USDT_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=tether&vs_currencies=rub"
-TON_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=the-open-network&vs_currencies=rub"
+USDT_API_URL = os.getenv("USDT_API_URL", "https://api.coingecko.com/api/v3/simple/price?ids=tether&vs_currencies=rub")
+TON_API_URL = os.getenv("TON_API_URL", "https://api.coingecko.com/api/v3/simple/price?ids=the-open-network&vs_currencies=rub")
+
+# Курсы: время жизни кэша, сколько можно отдавать устаревшее значение, период фонового обновления (сек)
+RATE_TTL = float(os.getenv("RATE_TTL", "60"))
+RATE_MAX_STALE = float(os.getenv("RATE_MAX_STALE", "900"))
+RATE_REFRESH_INTERVAL = float(os.getenv("RATE_REFRESH_INTERVAL", "30"))
+RATE_TIMEOUT = float(os.getenv("RATE_TIMEOUT", "5"))
+# Запасные курсы на случай недоступности API (пустое значение - не использовать)
+TON_RATE_FALLBACK = _optional_float("TON_RATE_FALLBACK", "235")
+USDT_RATE_FALLBACK = _optional_float("USDT_RATE_FALLBACK", "81")
+
+# Исходящие запросы к Bot API
+# Свой сервер Bot API (или мок в бенчмарках), например http://localhost:8081; пусто - api.telegram.org
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "100"))  # одновременных соединений с Bot API
+API_KEEPALIVE = float(os.getenv("API_KEEPALIVE", "60"))  # секунд держать простаивающее соединение открытым
+API_DNS_TTL = int(os.getenv("API_DNS_TTL", "300"))  # секунд кэшировать адрес api.telegram.org
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "15"))  # таймаут вызова по умолчанию, сек
+# Таймауты отдельных методов: "метод=секунды" через запятую
+API_METHOD_TIMEOUTS = {
+    method.strip(): float(seconds)
+    for method, seconds in (
+        item.split("=") for item in
+        os.getenv("API_METHOD_TIMEOUTS", "answerCallbackQuery=5,sendDocument=120,copyMessage=30").split(",")
+        if item.strip()
+    )
+}
+# Повторы при временных ошибках (сеть, 5xx, 429); ответ 429 дольше API_RETRY_AFTER_MAX отдается вызывающему
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))  # первая пауза, дальше вдвое больше
+API_RETRY_AFTER_MAX = float(os.getenv("API_RETRY_AFTER_MAX", "5"))
+
+# Рассылка: лимит Telegram ~30 сообщений/сек на бота, берем с запасом
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))  # секунд между правками прогресса
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "5"))
+BROADCAST_STATE_PATH = os.getenv("BROADCAST_STATE_PATH", "data/broadcast.json")
 
 # Платежные реквизиты
 USDT_WALLET = os.getenv("USDT_WALLET")
@@ -121,4 +239,5 @@ class States:
     PAYMENT = "payment"
     AWAITING_BROADCAST = "awaiting_broadcast"
     AWAITING_USER_MESSAGE = "awaiting_user_message"
-    AWAITING_USER_MESSAGE_TEXT = "awaiting_user_message_text"
\ No newline at end of file
+    AWAITING_USER_MESSAGE_TEXT = "awaiting_user_message_text"
+    AWAITING_SEARCH = "awaiting_search"
\ No newline at end of file
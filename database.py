@@ -1,170 +1,538 @@
+import asyncio
+import bisect
 import json
 import os
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
-from config import ADMIN_IDS  # Добавляем импорт
-
-class Database:
-    def __init__(self):
-        self.data_path = "data/data.json"
-        self._ensure_data_dir()
-        self.admins = ADMIN_IDS.copy()  # Копируем список админов из config.py
-        self._load_data()
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import (  # Добавляем импорт
+    DATA_PATH, DB_JOURNAL, DB_COMPACT_EVERY, DB_BACKEND,
+    DB_WRITE_BEHIND, DB_FLUSH_INTERVAL, DB_FLUSH_BATCH, ARCHIVE_AFTER, ARCHIVE_INTERVAL
+)
+from archive import ColdArchive, archivable
+from search import OrderIndex, OrderQuery, day_of, is_empty
+from catalog import to_kopecks
+from metrics import metrics
+from models import Order, User, now_ts
+from storage import Storage
+
+# Версия формата data.json: 3 - заказы и пользователи строками-массивами, время в секундах, суммы в копейках
+# (2 - то же с суммами в рублях, 1 - словари с датами ISO; старые версии переводятся при загрузке)
+SCHEMA_VERSION = 3
+
+# Один поток на все обращения к базе: вызовы не блокируют цикл событий и не пересекаются
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет метод базы в отдельном потоке, не блокируя цикл событий"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(func, *args, **kwargs))
+
+
+class Database(Storage):
+    def __init__(self, data_path: str = DATA_PATH, journal: bool = DB_JOURNAL,
+                 compact_every: int = DB_COMPACT_EVERY, write_behind: bool = DB_WRITE_BEHIND,
+                 flush_batch: int = DB_FLUSH_BATCH, lazy: bool = False):
+        super().__init__()
+        self.data_path = data_path
+        self.journal_path = os.path.splitext(data_path)[0] + ".journal"
+        # Старые завершенные заказы - в сжатых сегментах рядом с data.json, в память не грузятся
+        self.archive = ColdArchive(os.path.splitext(data_path)[0] + ".archive")
+        self.journal = journal
+        self.compact_every = compact_every
+        self.write_behind = write_behind
+        self.flush_batch = flush_batch
+        self._journal_file = None
+        self._journal_records = 0
+        # Мутации, ещё не записанные на диск (в режиме отложенной записи)
+        self._pending: List[str] = []
+        self._pending_count = 0
+        self.loaded = False
+        if not lazy:
+            self.open()
     
-    def _ensure_data_dir(self):
-        """Создает директорию data, если она не существует"""
-        os.makedirs("data", exist_ok=True)
-        if not os.path.exists(self.data_path):
-            with open(self.data_path, "w", encoding="utf-8") as f:
-                json.dump({
-                    "users": {},
-                    "orders": {},
-                    "admins": ADMIN_IDS.copy(),  # Сохраняем админов при создании файла
-                    "last_order_id": 0
-                }, f)
+    def open(self):
+        """Загружает данные с диска; при lazy=True вызывается на этапе запуска бота"""
+        if self.loaded:
+            return
+        os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+        self._load_data()
+        self.loaded = True
     
     def _load_data(self):
         """Загружает данные из файла"""
+        corrupt = False
         try:
             with open(self.data_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                self.users = data.get("users", {})
-                self.orders = data.get("orders", {})
+                self.users, self.orders = self._decode(data)
+                self._stored_admins = set(data.get("admins", []))
                 # Объединяем админов из config и базы данных
-                self.admins = list(set(self.admins + data.get("admins", [])))
+                self.admins = list(set(self.admins) | self._stored_admins)
                 self.last_order_id = data.get("last_order_id", 0)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Ошибка загрузки данных: {e}")
+        except FileNotFoundError:
+            # Первый запуск: файл появится при первой мутации
+            self.users = {}
+            self.orders = {}
+            self.last_order_id = 0
+            data = {"schema": SCHEMA_VERSION}
+        except json.JSONDecodeError as e:
+            # Битый снимок не перезаписываем: откладываем его в сторону, а журнал
+            # (заказы после последнего сжатия) применяем к пустым данным
+            corrupt_path = self.data_path + ".corrupt"
+            os.replace(self.data_path, corrupt_path)
+            logging.error(f"Ошибка загрузки данных: {e}; снимок перенесен в {corrupt_path}")
             self.users = {}
             self.orders = {}
             # self.admins уже инициализирован через ADMIN_IDS
             self.last_order_id = 0
+            data = {"schema": SCHEMA_VERSION}
+            corrupt = True
+        self._replay_journal()
+        if corrupt:
+            # Новый снимок - только после журнала: save() его обнуляет
+            self.save()
+        if data.get("schema", 1) < 3:
+            # До схемы 3 суммы хранились в рублях; журнал писался вместе со снимком,
+            # поэтому переводим уже после его применения и сразу сохраняем
+            for order in self.orders.values():
+                order.amount = to_kopecks(order.amount)
             self.save()
+        self._rebuild_indexes()
+    
+    @staticmethod
+    def _decode(data: dict):
+        """Разбирает снимок data.json в словари User и Order"""
+        if data.get("schema", 1) >= 2:
+            users = {int(user_id): User.from_row(row) for user_id, row in data.get("users", {}).items()}
+            orders = {}
+            for row in data.get("orders", []):
+                order = Order.from_row(row)
+                orders[order.id] = order
+            return users, orders
+        # Старый формат: словари с ISO-датами, ключи - строки
+        users = {int(user_id): User.from_dict(user) for user_id, user in data.get("users", {}).items()}
+        orders = {}
+        for raw in data.get("orders", {}).values():
+            order = Order.from_dict(raw)
+            orders[order.id] = order
+        return users, orders
+    
+    def _rebuild_indexes(self):
+        """Строит вторичные индексы по заказам (один раз при загрузке)
+
+        Архивные заказы попадают в индексы по записям индекса архива, сами
+        заказы читаются из сегментов только при обращении.
+        """
+        # Индексы для поиска заказов админом: статус, игра, оплата, пользователь, игровой ID, день
+        self._search = OrderIndex()
+        entries = []
+        for order in self.orders.values():
+            entries.append((order.id, order.user_id))
+            self._search.add(order)
+        for order_id, user_id, created_at, status, game, payment_method, game_id in self.archive.open(self.orders.keys()):
+            entries.append((order_id, user_id))
+            self._search.add_entry(order_id, (status, game, payment_method, user_id, game_id, day_of(created_at)))
+        # Порядок создания - порядок id: id выдаются по возрастанию, а created_at
+        # (часы сервера) может идти назад при коррекции времени
+        entries.sort()
+        # user_id -> id заказов в порядке создания (новые в конце)
+        self._user_orders: Dict[int, List[int]] = {}
+        # Все id заказов в порядке создания - для админского списка
+        self._order_index: List[int] = []
+        for order_id, user_id in entries:
+            self._user_orders.setdefault(user_id, []).append(order_id)
+            self._order_index.append(order_id)
+        self.orders_total = len(self._order_index)
+        # username в нижнем регистре -> id пользователей
+        self._usernames: Dict[str, List[int]] = {}
+        for user_id, user in self.users.items():
+            if user.username:
+                self._usernames.setdefault(user.username.lower(), []).append(user_id)
     
+    def _replay_journal(self):
+        """Применяет к снимку записи журнала, сделанные после последнего сжатия"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная строка после аварийного завершения - дальше ничего нет
+                    logging.warning(f"Повреждённая запись журнала пропущена: {line[:100]!r}")
+                    break
+                self._apply(record)
+                self._journal_records += 1
+    
+    def _apply(self, record: dict):
+        """Применяет одну запись журнала к данным в памяти"""
+        kind = record["t"]
+        if kind == "user":
+            value = record["v"]
+            self.users[int(record["id"])] = User.from_dict(value) if isinstance(value, dict) else User.from_row(value)
+        elif kind == "order":
+            value = record["v"]
+            order = Order.from_dict(value) if isinstance(value, dict) else Order.from_row(value)
+            self.orders[order.id] = order
+            self.last_order_id = max(self.last_order_id, order.id)
+        elif kind == "admins":
+            self.admins = record["v"]
+            self._stored_admins = set(record["v"])
+    
+    def _commit(self, record: dict):
+        """Фиксирует мутацию: строка в журнал или полная перезапись файла"""
+        if self.journal:
+            # Сериализуем сразу: словарь заказа может измениться до записи
+            self._pending.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._pending_count += 1
+        # При отложенной записи на диск уходит сразу пачка, иначе - каждая мутация
+        if not self.write_behind or self._pending_count >= self.flush_batch:
+            self.flush()
+    
+    @property
+    def dirty(self) -> bool:
+        """Есть ли мутации, ещё не записанные на диск"""
+        return self._pending_count > 0
+    
+    @metrics.timed("bot_db_write_seconds", "flush")
+    def flush(self):
+        """Записывает накопленные мутации одной операцией"""
+        if not self._pending_count:
+            return
+        if not self.journal:
+            self.save()
+            return
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_file.write("".join(self._pending))
+        self._journal_file.flush()
+        self._journal_records += len(self._pending)
+        self._pending.clear()
+        self._pending_count = 0
+        if self.compact_every and self._journal_records >= self.compact_every:
+            self.save()
+    
+    @metrics.timed("bot_db_write_seconds", "save")
     def save(self):
-        """Сохраняет данные в файл"""
-        with open(self.data_path, "w", encoding="utf-8") as f:
+        """Сохраняет полный снимок данных в файл и очищает журнал"""
+        tmp_path = self.data_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump({
-                "users": self.users,
-                "orders": self.orders,
+                "schema": SCHEMA_VERSION,
+                "users": {str(user_id): user.to_row() for user_id, user in self.users.items()},
+                "orders": [order.to_row() for order in self.orders.values()],
                 "admins": self.admins,
                 "last_order_id": self.last_order_id
-            }, f, ensure_ascii=False, indent=2)
+            }, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.data_path)
+        self._stored_admins = set(self.admins)
+        # Снимок уже содержит всё из журнала, поэтому журнал можно обнулить
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+        if os.path.exists(self.journal_path):
+            open(self.journal_path, "w").close()
+        self._journal_records = 0
+        self._pending.clear()
+        self._pending_count = 0
+    
+    def close(self):
+        """Дописывает отложенные мутации и закрывает файл журнала"""
+        self.flush()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
     
     def add_user(self, user_id: int, username: str, first_name: str):
         """Добавляет нового пользователя"""
-        user_id_str = str(user_id)
-        if user_id_str not in self.users:
-            self.users[user_id_str] = {
-                "username": username,
-                "first_name": first_name,
-                "created_at": datetime.now().isoformat()
-            }
-            self.save()
+        if user_id not in self.users:
+            user = User(username, first_name, now_ts())
+            self.users[user_id] = user
+            if username:
+                self._usernames.setdefault(username.lower(), []).append(user_id)
+            self._commit({"t": "user", "id": user_id, "v": user.to_row()})
     
-    def add_order(self, user_id: int, game: str, currency: str, amount: float, game_id: str, payment_method: str = None) -> Dict:
+    def add_order(self, user_id: int, game: str, currency: str, amount: int, game_id: str, payment_method: str = None) -> Order:
         """Добавляет новый заказ"""
         self.last_order_id += 1
-        order_id = str(self.last_order_id)
-        
-        order = {
-            "id": order_id,
-            "user_id": user_id,
-            "game": game,
-            "currency": currency,
-            "amount": amount,
-            "game_id": game_id,
-            "payment_method": payment_method,  # Добавлено
-            "status": "ожидает оплаты",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
+        now = now_ts()
+        order = Order(self.last_order_id, user_id, game, currency, amount, game_id,
+                      payment_method, "ожидает оплаты", now, now)
         
-        self.orders[order_id] = order
-        self.save()
+        self.orders[order.id] = order
+        # id монотонно растут, значит вставка в конец сохраняет порядок индексов
+        self._user_orders.setdefault(user_id, []).append(order.id)
+        self._order_index.append(order.id)
+        self.orders_total += 1
+        self._search.add(order)
+        self._commit({"t": "order", "v": order.to_row()})
+        self._notify_order(order, None)
         return order
     
-    def update_order(self, order_id: str, update_data: dict) -> bool:
+    def get_user(self, user_id) -> Optional[User]:
+        """Возвращает пользователя по ID"""
+        return self.users.get(int(user_id))
+    
+    def get_user_ids(self) -> List[int]:
+        """Возвращает ID всех пользователей"""
+        return list(self.users.keys())
+    
+    def get_order(self, order_id) -> Optional[Order]:
+        """Возвращает заказ по ID (из памяти или из архива)"""
+        try:
+            order_id = int(order_id)
+        except (TypeError, ValueError):
+            return None
+        order = self.orders.get(order_id)
+        if order is None and order_id in self.archive:
+            order = self.archive.get(order_id)
+        return order
+    
+    def _order(self, order_id: int) -> Order:
+        """Заказ из индекса: горячий или архивный"""
+        order = self.orders.get(order_id)
+        return order if order is not None else self.archive.get(order_id)
+    
+    def update_order(self, order_id, update_data: dict) -> bool:
         """Обновляет любые данные заказа"""
-        if order_id in self.orders:
-            self.orders[order_id].update(update_data)
-            self.orders[order_id]["updated_at"] = datetime.now().isoformat()
-            self.save()
-            return True
-        return False
-
+        order = self.get_order(order_id)
+        if order is None:
+            return False
+        if order.id not in self.orders:
+            # Изменение архивного заказа возвращает его в горячее хранилище
+            self.orders[order.id] = order
+            self.archive.forget(order.id)
+        previous = Order.from_row(order.to_row())
+        if "user_id" in update_data and update_data["user_id"] != order.user_id:
+            self._move_user_order(order, update_data["user_id"])
+        order.update(update_data)
+        order.updated_at = now_ts()
+        self._search.update(order, previous)
+        self._commit({"t": "order", "v": order.to_row()})
+        self._notify_order(order, previous)
+        return True
+    
+    def _move_user_order(self, order: Order, new_user_id: int):
+        """Переносит заказ в индексе другого пользователя, сохраняя порядок создания"""
+        ids = self._user_orders[order.user_id]
+        del ids[bisect.bisect_left(ids, order.id)]
+        bisect.insort(self._user_orders.setdefault(new_user_id, []), order.id)
+    
     # И модифицируйте существующий метод:
-    def update_order_status(self, order_id: str, status: str) -> bool:
+    def update_order_status(self, order_id, status: str) -> bool:
         """Обновляет только статус (для обратной совместимости)"""
         return self.update_order(order_id, {"status": status})
     
-    def get_user_orders(self, user_id: int) -> List[Dict]:
-        """Возвращает заказы пользователя"""
-        return [
-            order for order in self.orders.values() 
-            if order["user_id"] == user_id
-        ]
-    
-    def get_all_orders(self) -> List[Dict]:
-        """Возвращает все заказы"""
-        return list(self.orders.values())
-    
-    def is_admin(self, user_id: int) -> bool:
-        """Проверка прав администратора с логированием"""
-        result = user_id in self.admins
-        if not result:
-            logging.warning(f"Попытка доступа неадмина: {user_id}. Админы: {self.admins}")
-        return result
-    
-    def sync_with_config_admins(self, config_admins: list):
-        """Синхронизирует список админов с конфигом"""
-        # Приводим оба списка к int для сравнения
-        db_admins = [int(x) for x in self.admins]
-        config_admins = [int(x) for x in config_admins]
-        
-        # Объединяем списки без дубликатов
-        combined = list(set(db_admins + config_admins))
-        
-        # Обновляем список в базе данных
-        self.admins = combined
+    def get_user_orders(self, user_id: int) -> List[Order]:
+        """Возвращает заказы пользователя (от старых к новым)"""
+        return [self._order(order_id) for order_id in self._user_orders.get(user_id, [])]
+    
+    def get_all_orders(self) -> List[Order]:
+        """Возвращает все заказы, включая архивные (архив читается с диска целиком)"""
+        return list(self.orders.values()) + list(self.archive.iter_orders())
+    
+    @metrics.timed("bot_db_write_seconds", "archive")
+    def archive_orders(self, max_age: float) -> int:
+        """Переносит в архив завершенные заказы, не менявшиеся дольше max_age секунд
+
+        Порядок записи: сегмент, строка индекса, затем снимок без этих заказов.
+        Сбой между шагами оставляет заказ и в снимке, и в архиве - при загрузке
+        побеждает снимок, так что потерь нет.
+        """
+        cold = archivable(self.orders.values(), now_ts() - max_age)
+        if not cold:
+            return 0
+        cold.sort(key=lambda order: order.id)
+        self.archive.append(cold)
+        for order in cold:
+            del self.orders[order.id]
         self.save()
-        
-        logging.info(f"Синхронизированы админы. Итоговый список: {self.admins}")
+        logging.info(f"В архив перенесено заказов: {len(cold)}, в памяти осталось: {len(self.orders)}")
+        return len(cold)
+    
+    def _store_admins(self):
+        # Одна строка журнала, а не весь файл
+        self._commit({"t": "admins", "v": self.admins})
     
     def get_user_orders_paginated(self, user_id: int, page: int = 1, per_page: int = 5) -> dict:
         """Возвращает заказы пользователя с пагинацией"""
-        all_orders = [
-            order for order in self.orders.values() 
-            if order["user_id"] == user_id
-        ]
-        total = len(all_orders)
+        ids = self._user_orders.get(user_id, [])
+        total = len(ids)
         pages = (total + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        end = start + per_page
+        # Индекс хранится от старых к новым, поэтому страница отсчитывается с конца
+        end = max(total - (page - 1) * per_page, 0)
+        start = max(end - per_page, 0)
         
         return {
-            "orders": sorted(all_orders, key=lambda x: x["created_at"], reverse=True)[start:end],
+            "orders": [self._order(order_id) for order_id in reversed(ids[start:end])],
+            "page": page,
+            "pages": pages,
+            "total": total
+        }
+
+    def get_user_orders_page(self, user_id: int, cursor: Optional[Tuple[int, int]] = None,
+                             older: bool = True, per_page: int = 5) -> dict:
+        """Страница заказов пользователя по курсору (created_at, id), новые первыми"""
+        return self._keyset_page(self._user_orders.get(user_id, []), cursor, older, per_page)
+    
+    def get_all_orders_page(self, cursor: Optional[Tuple[int, int]] = None,
+                            older: bool = True, per_page: int = 10) -> dict:
+        """Страница всех заказов по курсору (created_at, id), новые первыми"""
+        return self._keyset_page(self._order_index, cursor, older, per_page)
+    
+    def _keyset_page(self, ids: List[int], cursor: Optional[Tuple[int, int]],
+                     older: bool, per_page: int) -> dict:
+        """Страница из индекса, упорядоченного от старых к новым
+
+        cursor - ключ (created_at, id) крайнего заказа предыдущей страницы:
+        older=True - заказы старше него, older=False - новее. Без курсора -
+        самые новые. Индексы упорядочены по id, поэтому позиция ищется по id
+        бинарным поиском: цена не зависит от глубины страницы, а новые заказы
+        в конце индекса не сдвигают уже открытые страницы.
+        """
+        if cursor is None:
+            end = len(ids)
+            start = max(end - per_page, 0)
+        elif older:
+            end = bisect.bisect_left(ids, cursor[1])
+            start = max(end - per_page, 0)
+        else:
+            start = bisect.bisect_right(ids, cursor[1])
+            end = min(start + per_page, len(ids))
+        total = len(ids)
+        return {
+            "orders": [self._order(order_id) for order_id in reversed(ids[start:end])],
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+            "has_newer": end < total,
+            "has_older": start > 0
+        }
+    
+    def find_users(self, username: str) -> List[int]:
+        """ID пользователей с таким username (без учета регистра)"""
+        return list(self._usernames.get(username.lower(), []))
+    
+    def search_orders(self, query: OrderQuery, page: int = 1, per_page: int = 10) -> dict:
+        """Заказы по фильтрам, новые первыми; пересечение индексов без перебора заказов"""
+        ids = sorted(self._search.query(query), reverse=True)
+        total = len(ids)
+        pages = (total + per_page - 1) // per_page
+        start = (page - 1) * per_page
+        return {
+            "orders": [self._order(order_id) for order_id in ids[start:start + per_page]],
             "page": page,
             "pages": pages,
             "total": total
         }
+    
+    def iter_orders(self, query: Optional[OrderQuery] = None) -> Iterator[Order]:
+        """Заказы по фильтрам в порядке создания, по одному (для выгрузки)
+
+        Список id снимается сразу, в потоке базы; сами заказы читаются по мере
+        обхода, так что генератор можно потреблять в другом потоке. Архивные
+        заказы читаются из сегментов через их LRU, целиком в память не попадают.
+        """
+        if query is None or is_empty(query):
+            ids = list(self._order_index)
+        else:
+            ids = sorted(self._search.query(query))
+        return (order for order in map(self._order, ids) if order is not None)
 
     def get_all_orders_paginated(self, page: int = 1, per_page: int = 10) -> dict:
         """Возвращает все заказы с пагинацией"""
-        all_orders = list(self.orders.values())
-        total = len(all_orders)
+        total = self.orders_total
         pages = (total + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        end = start + per_page
+        end = max(total - (page - 1) * per_page, 0)
+        start = max(end - per_page, 0)
         
         return {
-            "orders": sorted(all_orders, key=lambda x: x["created_at"], reverse=True)[start:end],
+            "orders": [self._order(order_id) for order_id in reversed(self._order_index[start:end])],
             "page": page,
             "pages": pages,
             "total": total
         }
 
-print(f"Инициализация базы данных. Админы: {ADMIN_IDS}")
-# Инициализация базы данных
-db = Database()
\ No newline at end of file
+class WriteBehind:
+    """Фоновый сброс отложенных мутаций: не чаще раза в interval секунд, в потоке базы"""
+    
+    def __init__(self, database, interval: float = DB_FLUSH_INTERVAL):
+        self.db = database
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Запускает периодический сброс, если включена отложенная запись"""
+        if self.db.write_behind and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self.db.dirty:
+                    await run_db(self.db.flush)
+            except Exception as e:
+                logging.error(f"Ошибка фоновой записи базы: {e}")
+    
+    async def flush(self):
+        """Записывает все накопленные мутации и ждёт завершения записи"""
+        await run_db(self.db.flush)
+    
+    async def stop(self):
+        """Останавливает фоновый сброс и дописывает остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class Archiver:
+    """Периодический перенос старых завершенных заказов в архив (только для JSON-хранилища)"""
+    
+    def __init__(self, database, max_age: float = ARCHIVE_AFTER, interval: float = ARCHIVE_INTERVAL):
+        self.db = database
+        self.max_age = max_age
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Запускает архивацию, если она включена и хранилище её поддерживает"""
+        if self.max_age and hasattr(self.db, "archive_orders") and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            try:
+                await run_db(self.db.archive_orders, self.max_age)
+            except Exception as e:
+                logging.error(f"Ошибка архивации заказов: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def create_database():
+    """Создает хранилище согласно DB_BACKEND"""
+    if DB_BACKEND == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(lazy=True)
+    return Database(lazy=True)
+
+# Данные читаются не при импорте, а в db.open() на этапе запуска бота
+db = create_database()
+write_behind = WriteBehind(db)
+archiver = Archiver(db)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from models import Order, User
+from search import OrderQuery, parse_query
+
+FORMATS = ("csv", "jsonl")
+COLUMNS = ("id", "created_at", "updated_at", "status", "game", "currency", "amount", "payment_method",
+           "game_id", "user_id", "username", "first_name")
+# Ограничение Bot API на отправку документов ботом
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+EXPORT_HELP = (
+    "📤 Выгрузка заказов\n\n"
+    "/export [csv|jsonl] [gz] [фильтры]\n"
+    "Формат по умолчанию - csv, gz - сжать файл. Фильтры - как в поиске заказов "
+    "(статус:, игра:, оплата:, юзер:, ид:, дата:), без фильтров выгружаются все заказы.\n\n"
+    "Например: /export csv gz дата:01.10.2026-31.10.2026 статус:выполнен"
+)
+
+
+def parse_export_args(text: str, find_users: Callable[[str], List[int]]) -> Tuple[str, bool, OrderQuery]:
+    """Аргументы /export: формат, сжатие и фильтры; ошибки - QueryError"""
+    fmt, compress = "csv", False
+    words = text.split()
+    while words and words[0].lower() in FORMATS + ("gz", "gzip"):
+        word = words.pop(0).lower()
+        if word in FORMATS:
+            fmt = word
+        else:
+            compress = True
+    return fmt, compress, parse_query(" ".join(words), find_users, allow_empty=True)
+
+
+def _datetime(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def export_rows(orders: Iterable[Order], get_user: Callable[[int], Optional[User]]) -> Iterator[tuple]:
+    """Строки выгрузки в порядке COLUMNS: заказ плюс username и имя покупателя"""
+    # Покупатели повторяются из заказа в заказ, а в SQLite каждый get_user - запрос
+    user_of = lru_cache(maxsize=4096)(get_user)
+    for order in orders:
+        user = user_of(order.user_id)
+        yield (
+            order.id, _datetime(order.created_at), _datetime(order.updated_at), order.status,
+            order.game, order.currency, f"{order.amount // 100}.{order.amount % 100:02d}",
+            order.payment_method or "", order.game_id, order.user_id,
+            user.username if user else "", user.first_name if user else "",
+        )
+
+
+def write_export(orders: Iterable[Order], get_user: Callable[[int], Optional[User]], fmt: str = "csv",
+                 compress: bool = False, directory: Optional[str] = None) -> Tuple[str, int]:
+    """Пишет выгрузку во временный файл строка за строкой; возвращает путь и число заказов
+
+    Память не зависит от числа заказов: в каждый момент в работе одна строка
+    и буферы файла/gzip. Вызывается в отдельном потоке (asyncio.to_thread),
+    удаление файла - на вызывающем.
+    """
+    suffix = f".{fmt}" + (".gz" if compress else "")
+    fd, path = tempfile.mkstemp(prefix="orders-", suffix=suffix, dir=directory)
+    os.close(fd)
+    # BOM - чтобы Excel открыл CSV с кириллицей без выбора кодировки
+    encoding = "utf-8-sig" if fmt == "csv" else "utf-8"
+    count = 0
+    try:
+        if compress:
+            f = gzip.open(path, "wt", encoding=encoding, newline="", compresslevel=6)
+        else:
+            f = open(path, "w", encoding=encoding, newline="")
+        with f:
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for row in export_rows(orders, get_user):
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in export_rows(orders, get_user):
+                    f.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+                    count += 1
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, count
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    """Имя файла для Telegram: orders-20261018-1530.csv.gz"""
+    return time.strftime("orders-%Y%m%d-%H%M") + f".{fmt}" + (".gz" if compress else "")
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import (
+    FSM_STORAGE, FSM_PATH, FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH, FSM_TTL, FSM_SWEEP_INTERVAL
+)
+from database import run_db
+from models import now_ts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_updated ON fsm (updated_at);
+"""
+
+
+class _Session:
+    """Состояние и данные одного ключа FSM в кэше"""
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], updated_at: int):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def _db_key(key: StorageKey) -> str:
+    # business_connection_id есть в StorageKey только с aiogram 3.4
+    business_connection_id = getattr(key, "business_connection_id", None)
+    return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{business_connection_id or ''}:{key.destiny}")
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище на SQLite: переживает перезапуск бота
+
+    Чтение идет из LRU-кэша в памяти, промахи - из базы через run_db.
+    Записи копятся и уходят одной транзакцией раз в flush_interval секунд
+    (или раньше, при flush_batch изменениях), поэтому при аварийном
+    завершении теряется не больше последнего интервала. Сессии, не
+    менявшиеся дольше ttl секунд, считаются брошенными и удаляются.
+    """
+
+    def __init__(self, path: str = FSM_PATH, cache_size: int = FSM_CACHE_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL, flush_batch: int = FSM_FLUSH_BATCH,
+                 ttl: float = FSM_TTL, sweep_interval: float = FSM_SWEEP_INTERVAL):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cache: "OrderedDict[StorageKey, _Session]" = OrderedDict()
+        # Изменения, еще не записанные в базу, и пачка, которая пишется прямо сейчас
+        self._dirty: Dict[StorageKey, _Session] = {}
+        self._flushing: Dict[StorageKey, _Session] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._early_flush: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    # --- Работа с базой (в потоке run_db) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _load(self, key: StorageKey) -> Optional[_Session]:
+        row = self._connect().execute(
+            "SELECT state, data, updated_at FROM fsm WHERE key = ?", (_db_key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        return _Session(row[0], json.loads(row[1]), row[2])
+
+    def _write(self, upserts: list, deletes: list):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                "updated_at = excluded.updated_at",
+                upserts
+            )
+            conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_expired(self, deadline: int) -> int:
+        return self._connect().execute("DELETE FROM fsm WHERE updated_at < ?", (deadline,)).rowcount
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- Кэш ---
+
+    @staticmethod
+    def _rows(batch: Dict[StorageKey, _Session]):
+        """Сериализует пачку в потоке цикла: обработчики могут менять данные во время записи"""
+        upserts = []
+        deletes = []
+        for key, session in batch.items():
+            if session.empty:
+                deletes.append((_db_key(key),))
+            else:
+                upserts.append((_db_key(key), session.state,
+                                json.dumps(session.data, ensure_ascii=False, separators=(",", ":")),
+                                session.updated_at))
+        return upserts, deletes
+
+    def _expired(self, session: _Session) -> bool:
+        return bool(self.ttl) and session.updated_at < now_ts() - self.ttl
+
+    def _remember(self, key: StorageKey, session: _Session):
+        self._cache[key] = session
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            # Несохраненные изменения остаются в _dirty, из кэша их можно вытеснять
+            self._cache.popitem(last=False)
+
+    async def _session(self, key: StorageKey) -> _Session:
+        session = self._cache.get(key)
+        if session is None:
+            session = self._dirty.get(key) or self._flushing.get(key)
+            if session is None:
+                session = await run_db(self._load, key)
+                # Пока читали базу, ключ мог быть записан - кэш важнее
+                session = self._cache.get(key) or self._dirty.get(key) or session
+            if session is None or self._expired(session):
+                session = _Session(None, {}, now_ts())
+            self._remember(key, session)
+        else:
+            self._cache.move_to_end(key)
+        return session
+
+    def _touch(self, key: StorageKey, session: _Session):
+        session.updated_at = now_ts()
+        self._dirty[key] = session
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if len(self._dirty) >= self.flush_batch and (self._early_flush is None or self._early_flush.done()):
+            # Пачка набралась раньше срока - пишем, не дожидаясь интервала
+            self._early_flush = asyncio.create_task(self._flush_logged())
+
+    # --- Интерфейс BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        session = await self._session(key)
+        session.state = state.state if isinstance(state, State) else state
+        self._touch(key, session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._session(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        session = await self._session(key)
+        session.data = dict(data)
+        self._touch(key, session)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._session(key)).data.copy()
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        # Без лишней копии из get_data: запись сразу в объект сессии
+        session = await self._session(key)
+        session.data.update(data)
+        self._touch(key, session)
+        return session.data.copy()
+
+    # --- Фоновая запись ---
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                await run_db(self._write, *self._rows(self._flushing))
+            except Exception:
+                # Не теряем изменения: вернем их к следующей попытке, более новые важнее
+                self._flushing.update(self._dirty)
+                self._dirty = self._flushing
+                raise
+            finally:
+                self._flushing = {}
+
+    async def sweep(self):
+        """Удаляет брошенные сессии из кэша и базы"""
+        if not self.ttl:
+            return
+        deadline = now_ts() - self.ttl
+        for key in [key for key, session in self._cache.items() if session.updated_at < deadline]:
+            del self._cache[key]
+        removed = await run_db(self._delete_expired, deadline)
+        if removed:
+            logging.info(f"FSM: удалено брошенных сессий: {removed}")
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Ошибка записи FSM: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+            if loop.time() >= next_sweep:
+                next_sweep = loop.time() + self.sweep_interval
+                try:
+                    await self.sweep()
+                except Exception as e:
+                    logging.error(f"Ошибка очистки FSM: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._early_flush is not None:
+            await self._early_flush
+            self._early_flush = None
+        await self.flush()
+        await run_db(self._close_connection)
+
+
+def create_fsm_storage() -> BaseStorage:
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage()
@@ -1,37 +1,46 @@
+import asyncio
+import html
 import logging
+import os
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile
 from aiogram.fsm.context import FSMContext
-from aiogram.filters import Command, StateFilter
-from datetime import datetime
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.exceptions import TelegramBadRequest
 
-from config import ADMIN_IDS, States
+from config import States
 from keyboards import (
     create_admin_keyboard,
     create_order_status_keyboard,
     create_back_to_admin_keyboard,
-    create_order_list_keyboard
+    create_order_list_keyboard,
+    create_analytics_keyboard,
+    page_number,
+    page_is_approximate
 )
-from database import db
+from database import db, run_db
+from catalog import format_price
+from callbacks import OrderDetailCallback, OrdersPageCallback, OrderStatusCallback, SearchPageCallback
+from broadcast import broadcaster, payload_from_message
+from middlewares import AdminMiddleware, ThrottlingMiddleware
+from rendering import admin_order_text, admin_orders_text
+from metrics import format_stats
+from analytics import analytics_report
+from search import SEARCH_HELP, QueryError, describe, parse_query
+from export import EXPORT_HELP, MAX_DOCUMENT_SIZE, export_filename, parse_export_args, write_export
 
 router = Router()
-
-# Добавляем синхронизацию админов при старте
-def sync_admins():
-    """Синхронизирует админов из config.py с базой данных"""
-    for admin_id in ADMIN_IDS:
-        if admin_id not in db.admins:
-            db.admins.append(admin_id)
-    db.save()
-
-# Вызываем при импорте
-sync_admins()
+# Все обработчики роутера - только для админов; список синхронизируется при запуске (bot.on_startup)
+_admin_only = AdminMiddleware()
+router.message.middleware(_admin_only)
+router.callback_query.middleware(_admin_only)
+# Антифлуд после проверки прав: корзины заводятся только на админов
+_throttle = ThrottlingMiddleware("admin")
+router.message.middleware(_throttle)
+router.callback_query.middleware(_throttle)
 
 @router.message(Command("admin"))
 async def admin_panel(message: Message):
-    if not db.is_admin(message.from_user.id):
-        return  # Полное игнорирование для не-админов
-    
     try:
         # Удаляем предыдущие сообщения с админ-панелью
         await message.delete()
@@ -47,145 +56,118 @@ async def admin_panel(message: Message):
     except Exception as e:
         logging.error(f"Ошибка админ-панели: {e}")
 
+@router.message(Command("stats"))
+async def admin_stats(message: Message):
+    # Метрики текущего процесса; при нескольких воркерах - того, что обработал команду
+    await message.answer(format_stats(), parse_mode=None)
+
+@router.message(Command("export"))
+async def admin_export(message: Message, command: CommandObject):
+    try:
+        fmt, compress, query = await run_db(parse_export_args, command.args or "", db.find_users)
+    except QueryError as e:
+        await message.answer(f"❌ {e}\n\n{EXPORT_HELP}", parse_mode=None)
+        return
+    await message.answer(f"⏳ Готовлю выгрузку: {describe(query)}", parse_mode=None)
+    # id снимаются в потоке базы, сами заказы читаются и пишутся в файл в отдельном потоке
+    orders = await run_db(db.iter_orders, query)
+    path, count = await asyncio.to_thread(write_export, orders, db.get_user, fmt, compress)
+    try:
+        if not count:
+            await message.answer("Ничего не найдено")
+        elif os.path.getsize(path) > MAX_DOCUMENT_SIZE:
+            await message.answer("❌ Файл больше 50 МБ - сузьте фильтры или добавьте gz")
+        else:
+            await message.answer_document(FSInputFile(path, filename=export_filename(fmt, compress)),
+                                          caption=f"📤 Заказов: {count}")
+    finally:
+        os.remove(path)
+
 @router.callback_query(F.data.startswith("admin_all_orders"))
 async def admin_all_orders(callback: CallbackQuery):
     await show_admin_orders_page(callback, 1)
 
-async def show_admin_orders_page(callback: CallbackQuery, page: int):
-    if not db.is_admin(callback.from_user.id):
-        await callback.answer("⛔ Доступ запрещен", show_alert=True)
-        return
-    
-    orders_data = db.get_all_orders_paginated(page)
+async def show_admin_orders_page(callback: CallbackQuery, page: int, cursor=None, older: bool = True):
+    orders_data = await run_db(db.get_all_orders_page, cursor, older)
     
     if not orders_data["orders"]:
         await callback.answer("📭 Нет заказов на этой странице", show_alert=True)
         return
+    page = page_number(page, orders_data)
     
-    text = f"📋 Все заказы (страница {page} из {orders_data['pages']}):\n\n"
-    for order in orders_data["orders"]:
-        user = db.users.get(str(order["user_id"]), {})
-        status_emoji = {
-            "ожидает оплаты": "🟡",
-            "ожидает проверки": "🟠",
-            "в работе": "🔵",
-            "выполнен": "🟢",
-            "отменён": "🔴"
-        }.get(order["status"], "⚪️")
-        
-        created_at = datetime.fromisoformat(order["created_at"]).strftime("%d.%m.%Y %H:%M")
-        
-        text += (
-            f"🆔 Заказ: {order['id']}\n"
-            f"👤 Пользователь: @{user.get('username', 'N/A')} (ID: {order['user_id']})\n"
-            f"🎮 Игра: {order['game']}\n"
-            f"💎 Валюта: {order['currency']} - {order['amount']}₽\n"
-            f"💳 Метод: {order.get('payment_method', 'не указан')}\n"
-            f"📅 Дата: {created_at}\n"            
-            f"{status_emoji} Статус: {order['status']}\n\n"
-        )
+    # Имена пользователей читаются в потоке базы и только для заказов, которых нет в кэше
+    text = await run_db(admin_orders_text, orders_data["orders"], page, orders_data["pages"], db.get_user,
+                        approximate=page_is_approximate(orders_data))
     
     # Изменяем существующее сообщение вместо отправки нового
     await callback.message.edit_text(
         text=text,
         reply_markup=create_order_list_keyboard(
             orders_data["orders"],
-            orders_data["page"],
+            page,
             orders_data["pages"],
-            is_admin=True
+            is_admin=True,
+            has_newer=orders_data["has_newer"],
+            has_older=orders_data["has_older"]
         )
     )
 
-@router.callback_query(F.data.startswith("admin_orders_page_"))
-async def handle_admin_orders_pagination(callback: CallbackQuery):
-    if not db.is_admin(callback.from_user.id):
-        await callback.answer("⛔ Доступ запрещен", show_alert=True)
-        return
-    
+@router.callback_query(OrdersPageCallback.filter(F.admin == True))
+async def handle_admin_orders_pagination(callback: CallbackQuery, callback_data: OrdersPageCallback):
     try:
-        page = int(callback.data.split("_")[-1])
-        await show_admin_orders_page(callback, page)
+        await show_admin_orders_page(callback, callback_data.page, callback_data.cursor, callback_data.older)
     except Exception as e:
         logging.error(f"Ошибка пагинации: {e}")
         await callback.answer("❌ Ошибка загрузки страницы", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("admin_order_detail_"))
-async def admin_show_order_detail(callback: CallbackQuery):
-    if not db.is_admin(callback.from_user.id):
-        await callback.answer("⛔ Доступ запрещен", show_alert=True)
-        return
-    
-    order_id = callback.data.split("_")[-1]
-    order = db.orders.get(order_id)
+@router.callback_query(OrderDetailCallback.filter(F.admin == True))
+async def admin_show_order_detail(callback: CallbackQuery, callback_data: OrderDetailCallback):
+    await show_admin_order(callback, callback_data.order)
+
+async def show_admin_order(callback: CallbackQuery, order_id: int):
+    order = await run_db(db.get_order, order_id)
     
     if not order:
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    user = db.users.get(str(order["user_id"]), {})
-    status_emoji = {
-        "ожидает оплаты": "🟡",
-        "ожидает проверки": "🟠",
-        "в работе": "🔵",
-        "выполнен": "🟢",
-        "отменён": "🔴"
-    }.get(order["status"], "⚪️")
-    
-    created_at = datetime.fromisoformat(order["created_at"]).strftime("%d.%m.%Y %H:%M")
-    updated_at = datetime.fromisoformat(order["updated_at"]).strftime("%d.%m.%Y %H:%M")
-    
-    text = (
-        f"📋 Детали заказа #{order['id']}\n\n"
-        f"👤 Пользователь: @{user.get('username', 'N/A')} (ID: {order['user_id']})\n"
-        f"🎮 Игра: {order['game']}\n"
-        f"💎 Валюта: {order['currency']}\n"
-        f"💰 Сумма: {order['amount']}₽\n"
-        f"🆔 Игровой ID: {order['game_id']}\n"
-        f"💳 Метод оплаты: {order.get('payment_method', 'не указан')}\n"
-        f"📅 Создан: {created_at}\n"
-        f"🔄 Обновлен: {updated_at}\n"
-        f"{status_emoji} Статус: {order['status']}\n\n"
-    )
+    text = await run_db(admin_order_text, order, db.get_user)
     
     await callback.message.edit_text(
         text,
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="🔄 В работе", callback_data=f"admin_status_work_{order_id}"),
-                InlineKeyboardButton(text="✅ Выполнен", callback_data=f"admin_status_done_{order_id}"),
+                InlineKeyboardButton(text="🔄 В работе", callback_data=OrderStatusCallback(status="work", order=order_id).pack()),
+                InlineKeyboardButton(text="✅ Выполнен", callback_data=OrderStatusCallback(status="done", order=order_id).pack()),
             ],
             [
-                InlineKeyboardButton(text="🔙 К списку заказов", callback_data="admin_orders_page_1")
+                InlineKeyboardButton(text="🔙 К списку заказов", callback_data=OrdersPageCallback(page=1, admin=True).pack())
             ]
         ])
     )
 
-@router.callback_query(F.data.startswith("admin_status_"))
-async def admin_change_order_status(callback: CallbackQuery):
-    if not db.is_admin(callback.from_user.id):
-        await callback.answer("⛔ Доступ запрещен", show_alert=True)
-        return
+# Коды статусов в callback_data -> статус заказа
+STATUS_CODES = {
+    "work": "в работе",
+    "done": "выполнен"
+}
 
+@router.callback_query(OrderStatusCallback.filter(F.notify == True))
+async def admin_change_order_status(callback: CallbackQuery, callback_data: OrderStatusCallback):
     # Определяем новый статус
-    if callback.data.startswith("admin_status_work_"):
-        order_id = callback.data[18:]
-        new_status = "в работе"
-        status_text = "в работу"
-    elif callback.data.startswith("admin_status_done_"):
-        order_id = callback.data[18:]
-        new_status = "выполнен"
-        status_text = "выполнен"
-    else:
+    order_id = callback_data.order
+    new_status = STATUS_CODES.get(callback_data.status)
+    if new_status is None:
         await callback.answer("Неизвестная команда", show_alert=True)
         return
     
     # Обновляем статус заказа
-    if not db.update_order_status(order_id, new_status):
+    if not await run_db(db.update_order_status, order_id, new_status):
         await callback.answer("❌ Ошибка изменения статуса", show_alert=True)
         return
     
-    order = db.orders.get(order_id)
+    order = await run_db(db.get_order, order_id)
     if not order:
         await callback.answer("❌ Заказ не найден", show_alert=True)
         return
@@ -193,38 +175,31 @@ async def admin_change_order_status(callback: CallbackQuery):
     # Уведомляем пользователя
     try:
         await callback.bot.send_message(
-            chat_id=order["user_id"],
+            chat_id=order.user_id,
             text=f"🔄 Статус вашего заказа #{order_id} изменен на '{new_status}'\n\n"
-                 f"🎮 Игра: {order['game']}\n"
-                 f"💎 Валюта: {order['currency']}\n"
-                 f"💰 Сумма: {order['amount']}₽\n\n"
+                 f"🎮 Игра: {order.game}\n"
+                 f"💎 Валюта: {order.currency}\n"
+                 f"💰 Сумма: {format_price(order.amount)}₽\n\n"
                  f"Если у вас есть вопросы, обратитесь к администратору."
         )
     except Exception as e:
-        logging.error(f"Не удалось уведомить пользователя {order['user_id']}: {e}")
+        logging.error(f"Не удалось уведомить пользователя {order.user_id}: {e}")
         await callback.answer(f"✅ Статус изменен, но не удалось уведомить пользователя", show_alert=True)
     else:
         await callback.answer(f"✅ Статус изменен на '{new_status}'", show_alert=False)
     
     # Обновляем сообщение с деталями заказа
-    await admin_show_order_detail(callback)
+    await show_admin_order(callback, order_id)
 
-@router.callback_query(F.data.startswith("status_"))
-async def change_order_status(callback: CallbackQuery):
-    if callback.data.startswith("status_work_"):
-        order_id = callback.data[12:]
-        if db.update_order_status(order_id, "в работе"):
-            await callback.message.edit_text(
-                f"✅ Статус заказа {order_id} изменён на 'в работе'",
-                reply_markup=create_back_to_admin_keyboard()
-            )
-    elif callback.data.startswith("status_done_"):
-        order_id = callback.data[12:]
-        if db.update_order_status(order_id, "выполнен"):
-            await callback.message.edit_text(
-                f"✅ Статус заказа {order_id} изменён на 'выполнен'",
-                reply_markup=create_back_to_admin_keyboard()
-            )
+@router.callback_query(OrderStatusCallback.filter(F.notify == False))
+async def change_order_status(callback: CallbackQuery, callback_data: OrderStatusCallback):
+    order_id = callback_data.order
+    new_status = STATUS_CODES.get(callback_data.status)
+    if new_status and await run_db(db.update_order_status, order_id, new_status):
+        await callback.message.edit_text(
+            f"✅ Статус заказа {order_id} изменён на '{new_status}'",
+            reply_markup=create_back_to_admin_keyboard()
+        )
 
 @router.callback_query(F.data == "admin_broadcast")
 async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
@@ -238,24 +213,12 @@ async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
 
 @router.message(StateFilter(States.AWAITING_BROADCAST))
 async def admin_broadcast_send(message: Message, state: FSMContext, bot):
-    users = db.users.keys()
-    success = 0
-    failed = 0
-    
-    for user_id in users:
-        try:
-            await bot.send_message(
-                chat_id=int(user_id),
-                text=f"📢 Сообщение от администратора:\n\n{message.text}"
-            )
-            success += 1
-        except Exception as e:
-            print(f"Ошибка рассылки для {user_id}: {e}")
-            failed += 1
-    
-    await message.answer(
-        f"📢 Рассылка завершена:\nУспешно: {success}\nНе удалось: {failed}"
-    )
+    user_ids = [int(user_id) for user_id in await run_db(db.get_user_ids)]
+    # Рассылка идет в фоне, прогресс обновляется в отдельном сообщении;
+    # проверка «уже идет» - по блокировке, общей для всех воркеров
+    if not await broadcaster.start(bot, message.chat.id, payload_from_message(message), user_ids):
+        await message.answer("⏳ Предыдущая рассылка ещё не завершена")
+        return
     await state.clear()
 
 @router.callback_query(F.data == "admin_message_user")
@@ -304,6 +267,68 @@ async def admin_message_user_send(message: Message, state: FSMContext, bot):
     
     await state.clear()
 
+@router.callback_query(F.data == "admin_search")
+async def admin_search_start(callback: CallbackQuery, state: FSMContext):
+    await callback.message.edit_text(SEARCH_HELP, reply_markup=create_back_to_admin_keyboard())
+    await state.set_state(States.AWAITING_SEARCH)
+
+@router.message(StateFilter(States.AWAITING_SEARCH))
+async def admin_search_query(message: Message, state: FSMContext):
+    try:
+        query = await run_db(parse_query, message.text or "", db.find_users)
+    except QueryError as e:
+        await message.answer(f"❌ {e}", parse_mode=None)
+        return
+    # Фильтры остаются в данных FSM для пагинации, состояние ввода сбрасывается
+    await state.set_state(None)
+    await state.update_data(search_query=query.text)
+    await show_search_page(message, query, 1, edit=False)
+
+@router.callback_query(SearchPageCallback.filter())
+async def admin_search_pagination(callback: CallbackQuery, callback_data: SearchPageCallback, state: FSMContext):
+    text = (await state.get_data()).get("search_query")
+    try:
+        query = await run_db(parse_query, text or "", db.find_users)
+    except QueryError:
+        await callback.answer("Поиск устарел, задайте фильтры заново", show_alert=True)
+        return
+    await show_search_page(callback.message, query, callback_data.page, edit=True)
+
+async def show_search_page(message: Message, query, page: int, edit: bool):
+    result = await run_db(db.search_orders, query, page)
+    # В фильтрах - ввод админа, сообщение уходит в HTML
+    filters = html.escape(describe(query))
+    if not result["orders"]:
+        text = f"🔎 {filters}\n\nНичего не найдено"
+        reply_markup = create_back_to_admin_keyboard()
+    else:
+        text = await run_db(admin_orders_text, result["orders"], page, result["pages"], db.get_user,
+                            title=f"🔎 {filters}: {result['total']}\n\n📋 Найдено")
+        reply_markup = create_order_list_keyboard(
+            result["orders"], result["page"], result["pages"], is_admin=True,
+            page_callback=lambda page: SearchPageCallback(page=page)
+        )
+    if edit:
+        await message.edit_text(text, reply_markup=reply_markup)
+    else:
+        await message.answer(text, reply_markup=reply_markup)
+
+@router.callback_query(F.data == "admin_analytics")
+async def admin_analytics(callback: CallbackQuery):
+    # Отчет строится по накопленным агрегатам (при WORKERS > 1 - по сводке общей базы)
+    text = await run_db(analytics_report)
+    await callback.message.edit_text(text, reply_markup=create_analytics_keyboard(), parse_mode=None)
+
+@router.callback_query(F.data == "admin_analytics_rebuild")
+async def admin_analytics_rebuild(callback: CallbackQuery):
+    await callback.answer("Пересчитываю...")
+    text = await run_db(analytics_report, True)
+    try:
+        await callback.message.edit_text(text, reply_markup=create_analytics_keyboard(), parse_mode=None)
+    except TelegramBadRequest:
+        # Цифры не изменились - Telegram отказывается редактировать сообщение тем же текстом
+        pass
+
 @router.callback_query(F.data == "admin_back")
 async def admin_back(callback: CallbackQuery, state: FSMContext):
     await state.clear()
@@ -2,9 +2,14 @@ from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command, StateFilter
-from datetime import datetime
+from models import format_ts
 
-from config import GAMES, States, TON_WALLET, BANK_DETAILS, TON_API_URL, USDT_WALLET, USDT_API_URL
+from config import States, TON_WALLET, BANK_DETAILS, USDT_WALLET
+from catalog import catalog, format_price
+from callbacks import (
+    GameCallback, SkuCallback, PaidCallback, OrderDetailCallback,
+    OrdersPageCallback, OrderStatusCallback
+)
 from keyboards import (
     create_game_keyboard,
     create_currency_keyboard,
@@ -14,40 +19,27 @@ from keyboards import (
     create_bank_payment_keyboard,
     create_order_status_keyboard,
     create_order_list_keyboard,
-    create_usdt_payment_keyboard
+    create_usdt_payment_keyboard,
+    page_number,
+    page_is_approximate
 )
-from database import db
-import requests
+from database import db, run_db, write_behind
+from rates import rates
+from rendering import user_order_text, user_orders_text
+from middlewares import ThrottlingMiddleware
+import asyncio
 import logging
 
 router = Router()
-
-async def get_ton_rate() -> float:
-    """Получает текущий курс TON к рублю"""
-    try:
-        response = requests.get(TON_API_URL)
-        response.raise_for_status()
-        data = response.json()
-        return data["the-open-network"]["rub"]
-    except Exception as e:
-        logging.error(f"Ошибка получения курса TON: {e}")
-        return 235.0  # Значение по умолчанию
-
-async def get_usdt_rate() -> float:
-    """Получает текущий курс USDT к рублю"""
-    try:
-        response = requests.get(USDT_API_URL)
-        response.raise_for_status()
-        data = response.json()
-        return data["tether"]["rub"]
-    except Exception as e:
-        logging.error(f"Ошибка получения курса USDT: {e}")
-        return 81.0  # Значение по умолчанию
+# Антифлуд: обработчики без флага throttle - в группе default
+_throttle = ThrottlingMiddleware("default")
+router.message.middleware(_throttle)
+router.callback_query.middleware(_throttle)
 
 @router.message(Command("start"))
 async def start(message: Message, state: FSMContext):
     user = message.from_user
-    db.add_user(user.id, user.username or "", user.first_name or "")
+    await run_db(db.add_user, user.id, user.username or "", user.first_name or "")
     await message.answer(
         "🎮 Добро пожаловать в бота по продаже игровой валюты!",
         reply_markup=create_game_keyboard()
@@ -62,26 +54,40 @@ async def back_to_games(callback: CallbackQuery, state: FSMContext):
     )
     await state.set_state(States.SELECT_GAME)
 
-@router.callback_query(F.data.startswith("game_"), StateFilter(States.SELECT_GAME))
-async def select_game(callback: CallbackQuery, state: FSMContext):
-    game = callback.data.split("_")[1]
-    await state.update_data(game=game)
+async def catalog_outdated(callback: CallbackQuery, state: FSMContext):
+    """Кнопка собрана для старой версии каталога - показываем актуальный список"""
+    await callback.answer("Каталог обновился, выберите товар заново", show_alert=True)
+    await callback.message.edit_text(
+        "Выберите игру из списка:",
+        reply_markup=create_game_keyboard()
+    )
+    await state.set_state(States.SELECT_GAME)
+
+@router.callback_query(GameCallback.filter(), StateFilter(States.SELECT_GAME))
+async def select_game(callback: CallbackQuery, callback_data: GameCallback, state: FSMContext):
+    game = catalog.game(callback_data.game) if callback_data.v == catalog.version else None
+    if game is None:
+        await catalog_outdated(callback, state)
+        return
+    await state.update_data(game=game.name)
     await callback.message.edit_text(
-        f"🎮 Игра: {game}\n\nВыберите количество валюты:",
-        reply_markup=create_currency_keyboard(game)
+        f"🎮 Игра: {game.name}\n\nВыберите количество валюты:",
+        reply_markup=create_currency_keyboard(game.id)
     )
     await state.set_state(States.SELECT_CURRENCY)
 
-@router.callback_query(F.data.startswith("currency_"), StateFilter(States.SELECT_CURRENCY))
-async def select_currency(callback: CallbackQuery, state: FSMContext):
-    idx = int(callback.data.split("_")[1])
-    data = await state.get_data()
-    game = data["game"]
-    currency, price = list(GAMES[game].items())[idx]
+@router.callback_query(SkuCallback.filter(), StateFilter(States.SELECT_CURRENCY))
+async def select_currency(callback: CallbackQuery, callback_data: SkuCallback, state: FSMContext):
+    sku = catalog.sku(callback_data.sku) if callback_data.v == catalog.version else None
+    if sku is None:
+        await catalog_outdated(callback, state)
+        return
+    game = catalog.game(sku.game_id)
     
-    await state.update_data(currency=currency, price=price)
+    # Цена в копейках; название фиксируется на момент выбора
+    await state.update_data(game=game.name, currency=sku.name, price=sku.price, sku_id=sku.id)
     await callback.message.edit_text(
-        f"🎮 Игра: {game}\n💎 Валюта: {currency} - {price}₽\n\n"
+        f"🎮 Игра: {game.name}\n💎 Валюта: {sku.name} - {format_price(sku.price)}₽\n\n"
         "Введите ваш игровой ID:"
     )
     await state.set_state(States.ENTER_GAME_ID)
@@ -103,7 +109,7 @@ async def enter_game_id(message: Message, state: FSMContext):
         f"🔍 Проверьте данные заказа:\n\n"
         f"🎮 Игра: {game}\n"
         f"💎 Валюта: {currency}\n"
-        f"💰 Сумма: {price}₽\n"
+        f"💰 Сумма: {format_price(price)}₽\n"
         f"🆔 Игровой ID: {game_id}\n\n"
         "Всё верно?",
         reply_markup=create_confirmation_keyboard()
@@ -119,10 +125,11 @@ async def confirm_no(callback: CallbackQuery, state: FSMContext):
     await state.set_data({})
     await state.set_state(States.SELECT_GAME)
 
-@router.callback_query(F.data == "confirm_yes", StateFilter(States.CONFIRM_ORDER))
+@router.callback_query(F.data == "confirm_yes", StateFilter(States.CONFIRM_ORDER), flags={"throttle": "checkout"})
 async def confirm_yes(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    order = db.add_order(
+    order = await run_db(
+        db.add_order,
         user_id=callback.from_user.id,
         game=data["game"],
         currency=data["currency"],
@@ -131,24 +138,27 @@ async def confirm_yes(callback: CallbackQuery, state: FSMContext):
         payment_method=None  # Пока неизвестен, установится при оплате
     )
     
-    await state.update_data(order_id=order["id"])
+    await state.update_data(order_id=order.id)
     await callback.message.edit_text(
-        f"💰 К оплате: {data['price']}₽\n\n"
+        f"💰 К оплате: {format_price(data['price'])}₽\n\n"
         "Выберите способ оплаты:",
         reply_markup=create_payment_keyboard()
     )
     await state.set_state(States.PAYMENT)
 
-@router.callback_query(F.data == "payment_ton", StateFilter(States.PAYMENT))
+@router.callback_query(F.data == "payment_ton", StateFilter(States.PAYMENT), flags={"throttle": "checkout"})
 async def payment_ton(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    ton_rate = await get_ton_rate()
-    ton_amount = data['price'] / ton_rate
+    rate = await rates.get("ton")
+    if rate is None:
+        await callback.answer("❌ Курс TON временно недоступен, попробуйте позже", show_alert=True)
+        return
+    ton_amount = data['price'] / 100 / rate.value
     
     await callback.message.edit_text(
         f"💳 Оплата через TON\n\n"
-        f"Сумма: {data['price']}₽ (~{ton_amount:.2f} TON)\n"
-        f"Курс: 1 TON = {ton_rate:.2f}₽\n"
+        f"Сумма: {format_price(data['price'])}₽ (~{ton_amount:.2f} TON)\n"
+        f"Курс: 1 TON = {rate.value:.2f}₽{' (ориентировочный)' if rate.approximate else ''}\n"
         f"Кошелек: {TON_WALLET}\n\n"
         "1. Откройте @wallet в Telegram\n"
         "2. Переведите указанную сумму\n"
@@ -157,16 +167,19 @@ async def payment_ton(callback: CallbackQuery, state: FSMContext):
         reply_markup=create_ton_payment_keyboard(data['order_id'])
     )
 
-@router.callback_query(F.data == "payment_usdt", StateFilter(States.PAYMENT))
+@router.callback_query(F.data == "payment_usdt", StateFilter(States.PAYMENT), flags={"throttle": "checkout"})
 async def payment_usdt(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    usdt_rate = await get_usdt_rate()
-    usdt_amount = data['price'] / usdt_rate
+    rate = await rates.get("usdt")
+    if rate is None:
+        await callback.answer("❌ Курс USDT временно недоступен, попробуйте позже", show_alert=True)
+        return
+    usdt_amount = data['price'] / 100 / rate.value
     
     await callback.message.edit_text(
         f"💳 Оплата через USDT (TRC20)\n\n"
-        f"Сумма: {data['price']}₽ (~{usdt_amount:.2f} USDT)\n"
-        f"Курс: 1 USDT = {usdt_rate:.2f}₽\n"
+        f"Сумма: {format_price(data['price'])}₽ (~{usdt_amount:.2f} USDT)\n"
+        f"Курс: 1 USDT = {rate.value:.2f}₽{' (ориентировочный)' if rate.approximate else ''}\n"
         f"Кошелек: {USDT_WALLET}\n\n"
         "1. Переведите указанную сумму\n"
         "2. Нажмите кнопку 'Я оплатил'\n\n"
@@ -174,30 +187,31 @@ async def payment_usdt(callback: CallbackQuery, state: FSMContext):
         reply_markup=create_usdt_payment_keyboard(data['order_id'])
     )
 
-@router.callback_query(F.data == "payment_bank", StateFilter(States.PAYMENT))
+@router.callback_query(F.data == "payment_bank", StateFilter(States.PAYMENT), flags={"throttle": "checkout"})
 async def payment_bank(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     await callback.message.edit_text(
         f"🏦 Оплата по реквизитам\n\n"
-        f"Сумма: {data['price']}₽\n"
+        f"Сумма: {format_price(data['price'])}₽\n"
         f"{BANK_DETAILS}\n\n"
         "После оплаты нажмите кнопку 'Я оплатил'\n\n"
         f"ID вашего заказа: {data['order_id']}",
         reply_markup=create_bank_payment_keyboard(data['order_id'])
     )
 
-@router.callback_query(F.data.startswith("paid_"))
-async def paid(callback: CallbackQuery, state: FSMContext):
+async def _notify_admin(bot: Bot, admin_id: int, text: str, reply_markup: InlineKeyboardMarkup):
+    try:
+        await bot.send_message(chat_id=admin_id, text=text, reply_markup=reply_markup)
+    except Exception as e:
+        logging.error(f"Ошибка уведомления админа {admin_id}: {e}")
+
+@router.callback_query(PaidCallback.filter(), flags={"throttle": "checkout"})
+async def paid(callback: CallbackQuery, callback_data: PaidCallback, state: FSMContext):
     """Обработчик подтверждения оплаты для всех методов"""
     try:
         bot = callback.bot
-        parts = callback.data.split("_")
-        if len(parts) != 3:
-            await callback.answer("❌ Ошибка в данных заказа", show_alert=True)
-            return
-        
-        payment_type = parts[1]  # ton, usdt или bank
-        order_id = parts[2]
+        payment_type = callback_data.method  # ton, usdt или bank
+        order_id = callback_data.order
         
         payment_method = {
             "ton": "TON",
@@ -206,51 +220,45 @@ async def paid(callback: CallbackQuery, state: FSMContext):
         }.get(payment_type, "неизвестно")
         
         # Обновляем заказ
-        if not db.update_order(order_id, {
+        if not await run_db(db.update_order, order_id, {
             "status": "ожидает проверки",
-            "payment_method": payment_method,
-            "updated_at": datetime.now().isoformat()
+            "payment_method": payment_method
         }):
             await callback.answer("❌ Ошибка обновления заказа", show_alert=True)
             return
+        # Оплаченный заказ должен попасть на диск до уведомления админов
+        await write_behind.flush()
         
         # Получаем данные заказа
-        order = db.orders.get(order_id)
+        order = await run_db(db.get_order, order_id)
         if not order:
             await callback.answer("❌ Заказ не найден", show_alert=True)
             return
         
         # Формируем уведомление для админов
-        user = db.users.get(str(order["user_id"]), {})
-        created_at = datetime.fromisoformat(order["created_at"]).strftime("%d.%m.%Y %H:%M")
+        user = await run_db(db.get_user, order.user_id)
+        created_at = format_ts(order.created_at)
         
         text = (
             "🛒 Новый оплаченный заказ!\n\n"
-            f"🆔 ID заказа: {order['id']}\n"
+            f"🆔 ID заказа: {order.id}\n"
             f"💳 Метод оплаты: {payment_method}\n"
-            f"🎮 Игра: {order['game']}\n"
-            f"💎 Валюта: {order['currency']}\n"
-            f"💰 Сумма: {order['amount']}₽\n"
-            f"🆔 Игровой ID: {order['game_id']}\n"
-            f"👤 Покупатель: @{user.get('username', 'N/A')}\n"
+            f"🎮 Игра: {order.game}\n"
+            f"💎 Валюта: {order.currency}\n"
+            f"💰 Сумма: {format_price(order.amount)}₽\n"
+            f"🆔 Игровой ID: {order.game_id}\n"
+            f"👤 Покупатель: @{user.username if user else 'N/A'}\n"
             f"📅 Время заказа: {created_at}"
         )
         
-        # Отправляем уведомления админам
-        for admin_id in db.admins:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id, 
-                    text=text,
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(text="🔄 В работе", callback_data=f"admin_status_work_{order_id}"),
-                            InlineKeyboardButton(text="✅ Выполнен", callback_data=f"admin_status_done_{order_id}"),
-                        ]
-                    ])
-                )
-            except Exception as e:
-                logging.error(f"Ошибка уведомления админа {admin_id}: {e}")
+        # Уведомления админам уходят одновременно: покупатель ждет не сумму вызовов, а самый долгий
+        reply_markup = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="🔄 В работе", callback_data=OrderStatusCallback(status="work", order=order_id).pack()),
+                InlineKeyboardButton(text="✅ Выполнен", callback_data=OrderStatusCallback(status="done", order=order_id).pack()),
+            ]
+        ])
+        await asyncio.gather(*(_notify_admin(bot, admin_id, text, reply_markup) for admin_id in db.admins))
         
         # Ответ пользователю
         await callback.message.edit_text(
@@ -263,11 +271,11 @@ async def paid(callback: CallbackQuery, state: FSMContext):
         logging.error(f"Ошибка в обработчике оплаты: {e}")
         await callback.answer("❌ Произошла ошибка при обработке оплаты", show_alert=True)
 
-@router.callback_query(F.data == "cancel_order", StateFilter(States.PAYMENT))
+@router.callback_query(F.data == "cancel_order", StateFilter(States.PAYMENT), flags={"throttle": "checkout"})
 async def cancel_order(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     if "order_id" in data:
-        db.update_order_status(data["order_id"], "отменён")
+        await run_db(db.update_order_status, data["order_id"], "отменён")
     
     await callback.message.edit_text(
         "Заказ отменён. Выберите игру из списка:",
@@ -276,51 +284,36 @@ async def cancel_order(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(States.SELECT_GAME)
 
-@router.message(Command("myorders"))
+@router.message(Command("myorders"), flags={"throttle": "pagination"})
 async def my_orders(message: Message, state: FSMContext):
     await show_orders_page(message, message.from_user.id, 1)
 
-async def show_orders_page(message: Message, user_id: int, page: int):
-    orders_data = db.get_user_orders_paginated(user_id, page)
+async def show_orders_page(message: Message, user_id: int, page: int, cursor=None, older: bool = True):
+    orders_data = await run_db(db.get_user_orders_page, user_id, cursor, older)
     
     if not orders_data["orders"]:
         await message.answer("У вас пока нет заказов.")
         return
+    page = page_number(page, orders_data)
     
-    text = f"📋 Ваши заказы (страница {page} из {orders_data['pages']}):\n\n"
-    for order in orders_data["orders"]:
-        status_emoji = {
-            "ожидает оплаты": "🟡",
-            "ожидает проверки": "🟠",
-            "в работе": "🔵",
-            "выполнен": "🟢",
-            "отменён": "🔴"
-        }.get(order["status"], "⚪️")
-        
-        created_at = datetime.fromisoformat(order["created_at"]).strftime("%d.%m.%Y %H:%M")
-        
-        text += (
-            f"🆔 ID заказа: {order['id']}\n"
-            f"🎮 Игра: {order['game']}\n"
-            f"💎 Валюта: {order['currency']} - {order['amount']}₽\n"
-            f"📅 Дата: {created_at}\n"
-            f"{status_emoji} Статус: {order['status']}\n\n"
-        )
+    text = user_orders_text(orders_data["orders"], page, orders_data["pages"], page_is_approximate(orders_data))
     
     await message.answer(
         text,
         reply_markup=create_order_list_keyboard(
             orders_data["orders"],
-            orders_data["page"],
-            orders_data["pages"]
+            page,
+            orders_data["pages"],
+            has_newer=orders_data["has_newer"],
+            has_older=orders_data["has_older"]
         )
     )
 
-@router.callback_query(F.data.startswith("orders_page_"))
-async def handle_orders_pagination(callback: CallbackQuery):
-    page = int(callback.data.split("_")[-1])
+@router.callback_query(OrdersPageCallback.filter(F.admin == False), flags={"throttle": "pagination"})
+async def handle_orders_pagination(callback: CallbackQuery, callback_data: OrdersPageCallback):
     await callback.message.delete()
-    await show_orders_page(callback.message, callback.from_user.id, page)
+    await show_orders_page(callback.message, callback.from_user.id, callback_data.page,
+                           callback_data.cursor, callback_data.older)
 
 @router.callback_query(F.data == "back_to_start")
 async def back_to_start(callback: CallbackQuery, state: FSMContext):
@@ -332,42 +325,29 @@ async def back_to_start(callback: CallbackQuery, state: FSMContext):
     )
     await state.set_state(States.SELECT_GAME)
 
-@router.callback_query(F.data.startswith("order_detail_"))
-async def show_order_detail(callback: CallbackQuery):
-    order_id = callback.data.split("_")[-1]
-    order = db.orders.get(order_id)
+@router.callback_query(OrderDetailCallback.filter(F.admin == False), flags={"throttle": "pagination"})
+async def show_order_detail(callback: CallbackQuery, callback_data: OrderDetailCallback):
+    order = await run_db(db.get_order, callback_data.order)
     
     if not order:
         await callback.answer("Заказ не найден", show_alert=True)
         return
     
-    status_emoji = {
-        "ожидает оплаты": "🟡",
-        "ожидает проверки": "🟠",
-        "в работе": "🔵",
-        "выполнен": "🟢",
-        "отменён": "🔴"
-    }.get(order["status"], "⚪️")
-    
-    created_at = datetime.fromisoformat(order["created_at"]).strftime("%d.%m.%Y %H:%M")
-    updated_at = datetime.fromisoformat(order["updated_at"]).strftime("%d.%m.%Y %H:%M")
-    
-    text = (
-        f"📋 Детали заказа #{order['id']}\n\n"
-        f"🎮 Игра: {order['game']}\n"
-        f"💎 Валюта: {order['currency']}\n"
-        f"💰 Сумма: {order['amount']}₽\n"
-        f"💳 Метод оплаты: {order.get('payment_method', 'не указан')}\n"
-        f"🆔 Игровой ID: {order['game_id']}\n"
-        f"📅 Создан: {created_at}\n"
-        f"🔄 Обновлен: {updated_at}\n"
-        f"{status_emoji} Статус: {order['status']}\n\n"
-    )
+    text = user_order_text(order)
     
     await callback.message.edit_text(
         text,
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 К списку заказов", callback_data="orders_page_1")]
+            [InlineKeyboardButton(text="🔙 К списку заказов", callback_data=OrdersPageCallback(page=1).pack())]
         ])
     )
 
+@router.callback_query(F.data == "current_page")
+async def current_page(callback: CallbackQuery):
+    # Номер страницы в клавиатуре - просто подпись
+    await callback.answer()
+
+@router.callback_query()
+async def outdated_button(callback: CallbackQuery):
+    """Нажатие, которому не нашлось обработчика: кнопка из старого сообщения или другого шага"""
+    await callback.answer("Кнопка устарела, откройте /start", show_alert=True)
@@ -1,41 +1,85 @@
+from typing import Callable, Dict, Hashable, Optional
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from config import GAMES
+from aiogram.filters.callback_data import CallbackData
+from callbacks import (
+    GameCallback, SkuCallback, PaidCallback, OrderDetailCallback,
+    OrdersPageCallback, OrderStatusCallback
+)
+from catalog import Catalog, catalog, format_price
+
+
+class KeyboardCache:
+    """Готовые клавиатуры, собранные один раз для текущей версии каталога
+
+    Версия каталога входит в ключ записи: после смены каталога клавиатура со
+    старыми v= в callback_data уже не выдается, а собирается заново.
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self._keyboards: Dict[Hashable, InlineKeyboardMarkup] = {}
+
+    @property
+    def version(self) -> int:
+        return self.catalog.version
+
+    def get(self, key: Hashable, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        key = (self.version, key)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = self._keyboards[key] = build()
+        return keyboard
+
+
+_cache = KeyboardCache(catalog)
+
+
+def warm_up_keyboards():
+    """Собирает клавиатуры каталога и статические клавиатуры заранее, при запуске"""
+    create_game_keyboard()
+    for game in _cache.catalog.games:
+        create_currency_keyboard(game.id)
+    create_confirmation_keyboard()
+    create_payment_keyboard()
+    create_admin_keyboard()
+    create_back_to_admin_keyboard()
+
 
 def create_game_keyboard() -> InlineKeyboardMarkup:
-    games = list(GAMES.keys())
+    return _cache.get("games", _build_game_keyboard)
+
+
+def _build_game_keyboard() -> InlineKeyboardMarkup:
+    games = _cache.catalog.games
+    version = _cache.version
     keyboard = []
     
     for i in range(0, len(games), 2):
-        row = []
-        if i < len(games):
-            row.append(InlineKeyboardButton(text=games[i], callback_data=f"game_{games[i]}"))
-        if i + 1 < len(games):
-            row.append(InlineKeyboardButton(text=games[i+1], callback_data=f"game_{games[i+1]}"))
-        if row:
-            keyboard.append(row)
+        keyboard.append([
+            InlineKeyboardButton(text=game.name, callback_data=GameCallback(v=version, game=game.id).pack())
+            for game in games[i:i + 2]
+        ])
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def create_currency_keyboard(game: str) -> InlineKeyboardMarkup:
-    currencies = list(GAMES[game].items())
+def create_currency_keyboard(game_id: int) -> InlineKeyboardMarkup:
+    return _cache.get(("currency", game_id), lambda: _build_currency_keyboard(game_id))
+
+
+def _build_currency_keyboard(game_id: int) -> InlineKeyboardMarkup:
+    skus = _cache.catalog.game(game_id).skus
+    version = _cache.version
     keyboard = []
     
-    for i in range(0, len(currencies), 2):
-        row = []
-        if i < len(currencies):
-            currency, price = currencies[i]
-            row.append(InlineKeyboardButton(
-                text=f"{currency} - {price}₽",
-                callback_data=f"currency_{i}"
-            ))
-        if i + 1 < len(currencies):
-            currency, price = currencies[i+1]
-            row.append(InlineKeyboardButton(
-                text=f"{currency} - {price}₽",
-                callback_data=f"currency_{i+1}"
-            ))
-        if row:
-            keyboard.append(row)
+    for i in range(0, len(skus), 2):
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"{sku.name} - {format_price(sku.price)}₽",
+                callback_data=SkuCallback(v=version, sku=sku.id).pack()
+            )
+            for sku in skus[i:i + 2]
+        ])
     
     keyboard.append([InlineKeyboardButton(
         text="⬅️ Назад",
@@ -44,6 +88,10 @@ def create_currency_keyboard(game: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 def create_confirmation_keyboard() -> InlineKeyboardMarkup:
+    return _cache.get("confirmation", _build_confirmation_keyboard)
+
+
+def _build_confirmation_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_yes"),
@@ -52,6 +100,10 @@ def create_confirmation_keyboard() -> InlineKeyboardMarkup:
     ])
 
 def create_payment_keyboard() -> InlineKeyboardMarkup:
+    return _cache.get("payment", _build_payment_keyboard)
+
+
+def _build_payment_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="💳 Оплата USDT", callback_data="payment_usdt")],
         [InlineKeyboardButton(text="💳 Оплата TON", callback_data="payment_ton")],
@@ -59,86 +111,132 @@ def create_payment_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="❌ Отменить заказ", callback_data="cancel_order")]
     ])
 
-def create_ton_payment_keyboard(order_id: str) -> InlineKeyboardMarkup:
+def create_ton_payment_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=f"paid_ton_{order_id}")],
+        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=PaidCallback(method="ton", order=order_id).pack())],
         [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_order")]
     ])
 
-def create_usdt_payment_keyboard(order_id: str) -> InlineKeyboardMarkup:
+def create_usdt_payment_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=f"paid_usdt_{order_id}")],
+        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=PaidCallback(method="usdt", order=order_id).pack())],
         [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_order")]
     ])
 
-def create_bank_payment_keyboard(order_id: str) -> InlineKeyboardMarkup:
+def create_bank_payment_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=f"paid_bank_{order_id}")],
+        [InlineKeyboardButton(text="✅ Я оплатил", callback_data=PaidCallback(method="bank", order=order_id).pack())],
         [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_order")]
     ])
 
 def create_admin_keyboard() -> InlineKeyboardMarkup:
+    return _cache.get("admin", _build_admin_keyboard)
+
+
+def _build_admin_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📊 Все заказы", callback_data="admin_all_orders")],
+        [InlineKeyboardButton(text="🔎 Поиск заказов", callback_data="admin_search")],
+        [InlineKeyboardButton(text="📈 Аналитика", callback_data="admin_analytics")],
         [InlineKeyboardButton(text="📩 Рассылка", callback_data="admin_broadcast")],
         [InlineKeyboardButton(text="✉️ Написать пользователю", callback_data="admin_message_user")]
     ])
 
-def create_order_status_keyboard(order_id: str) -> InlineKeyboardMarkup:
+def create_order_status_keyboard(order_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔄 В работе", callback_data=f"status_work_{order_id}")],
-        [InlineKeyboardButton(text="✅ Выполнен", callback_data=f"status_done_{order_id}")],
+        [InlineKeyboardButton(text="🔄 В работе", callback_data=OrderStatusCallback(status="work", order=order_id, notify=False).pack())],
+        [InlineKeyboardButton(text="✅ Выполнен", callback_data=OrderStatusCallback(status="done", order=order_id, notify=False).pack())],
         [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
     ])
 
 def create_back_to_admin_keyboard() -> InlineKeyboardMarkup:
+    return _cache.get("back_to_admin", _build_back_to_admin_keyboard)
+
+
+def _build_back_to_admin_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔙 В админ-панель", callback_data="admin_back")]
     ])
 
 
-def create_pagination_keyboard(page: int, pages: int, prefix: str) -> InlineKeyboardMarkup:
-    """Создает клавиатуру пагинации"""
-    keyboard = []
-    
-    # Кнопки навигации
-    nav_buttons = []
-    if page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_{page-1}"))
-    
-    nav_buttons.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data="current_page"))
-    
-    if page < pages:
-        nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"{prefix}_{page+1}"))
-    
-    if nav_buttons:
-        keyboard.append(nav_buttons)
-    
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def create_analytics_keyboard() -> InlineKeyboardMarkup:
+    return _cache.get("analytics", _build_analytics_keyboard)
+
+
+def _build_analytics_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Пересчитать", callback_data="admin_analytics_rebuild")],
+        [InlineKeyboardButton(text="🔙 В админ-панель", callback_data="admin_back")]
+    ])
+
+
+def page_number(page: int, page_data: dict) -> int:
+    """Номер страницы для подписи: у курсорной страницы края определяются точно, середина - по счетчику кликов
+
+    Новые заказы сдвигают нумерацию, поэтому номер в середине приблизительный -
+    подпись такой страницы помечается «≈» (page_is_approximate).
+    """
+    if not page_data["has_newer"]:
+        return 1
+    if not page_data["has_older"]:
+        return page_data["pages"]
+    return min(max(page, 2), max(page_data["pages"] - 1, 2))
+
+
+def page_is_approximate(page_data: dict) -> bool:
+    """Номер курсорной страницы точен только на краях списка"""
+    return page_data["has_newer"] and page_data["has_older"]
+
+
+def create_order_list_keyboard(orders: list, page: int, pages: int, is_admin: bool = False,
+                               page_callback: Optional[Callable[[int], CallbackData]] = None,
+                               has_newer: Optional[bool] = None, has_older: Optional[bool] = None) -> InlineKeyboardMarkup:
+    """Создает клавиатуру со списком заказов
+
+    По умолчанию кнопки листают по курсору: OrdersPageCallback несет ключ первого
+    заказа страницы для «Назад» и последнего - для «Вперёд». page_callback(page) -
+    данные кнопок для постраничных списков (поиск). has_newer/has_older - есть ли
+    заказы в ту сторону; по умолчанию определяются по номеру страницы.
+    """
+    # Номер курсорной страницы в середине списка - по счетчику кликов, а не точный
+    approximate = page_callback is None and bool(has_newer and has_older)
+    if has_newer is None:
+        has_newer = page > 1
+    if has_older is None:
+        has_older = page < pages
+
+    def page_data(target: int, older: bool) -> str:
+        if page_callback is not None:
+            return page_callback(target).pack()
+        edge = orders[-1] if older else orders[0]
+        return OrdersPageCallback(page=max(target, 1), admin=is_admin, ts=edge.created_at,
+                                  order=edge.id, older=older).pack()
 
-def create_order_list_keyboard(orders: list, page: int, pages: int, is_admin: bool = False) -> InlineKeyboardMarkup:
-    """Создает клавиатуру со списком заказов"""
     keyboard = []
     
     # Кнопки заказов
     for order in orders:
-        prefix = "admin_" if is_admin else ""
         keyboard.append([
             InlineKeyboardButton(
-                text=f"Заказ #{order['id']} - {order['status']}",
-                callback_data=f"{prefix}order_detail_{order['id']}"
+                text=f"Заказ #{order.id} - {order.status}",
+                callback_data=OrderDetailCallback(order=order.id, admin=is_admin).pack()
             )
         ])
     
     # Кнопки пагинации
     nav_buttons = []
-    if page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}orders_page_{page-1}"))
-    
-    nav_buttons.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data="current_page"))
-    
-    if page < pages:
-        nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"{prefix}orders_page_{page+1}"))
+    if has_newer:
+        nav_buttons.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=page_data(page - 1, older=False)
+        ))
+    
+    nav_buttons.append(InlineKeyboardButton(text=f"{'≈' if approximate else ''}{page}/{pages}",
+                                            callback_data="current_page"))
+    
+    if has_older:
+        nav_buttons.append(InlineKeyboardButton(
+            text="Вперёд ➡️", callback_data=page_data(page + 1, older=True)
+        ))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин в секундах - как у клиентов Prometheus по умолчанию, плюс миллисекундные
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: запись - один bisect и два сложения"""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.buckets[index - 1] if index else 0.0
+                high = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class Metrics:
+    """Реестр гистограмм и счетчиков процесса
+
+    Метрика объявляется один раз (histogram/counter) с именами меток, значения
+    пишутся по кортежу меток. Запись возможна и из потока базы, поэтому новые
+    серии создаются под блокировкой; сама запись в существующую серию - без нее
+    (потеря единичного наблюдения при гонке допустима).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._help: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}  # имя -> (тип, описание, метки)
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self._help[name] = ("histogram", description, labels)
+        self._histograms.setdefault(name, {})
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self._help[name] = ("counter", description, labels)
+        self._counters.setdefault(name, {})
+
+    def observe(self, name: str, labels: tuple, value: float):
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = series.setdefault(labels, Histogram())
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        series = self._counters[name]
+        if labels not in series:
+            with self._lock:
+                series.setdefault(labels, 0)
+        series[labels] += value
+
+    def timed(self, name: str, *labels: str):
+        """Декоратор для синхронных функций: время вызова пишется в гистограмму name"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, labels, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def series(self, name: str) -> Dict[tuple, Histogram]:
+        return dict(self._histograms.get(name, {}))
+
+    def counters(self, name: str) -> Dict[tuple, float]:
+        return dict(self._counters.get(name, {}))
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus (version 0.0.4)"""
+        lines: List[str] = []
+        for name, (kind, description, label_names) in self._help.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for labels, value in self.counters(name).items():
+                    lines.append(f"{name}{_labels(label_names, labels)} {value}")
+                continue
+            for labels, histogram in self.series(name).items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (le,))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+metrics.counter("bot_updates_total", "Обработанные апдейты", ("type", "result"))
+metrics.histogram("bot_update_seconds", "Полное время обработки апдейта", ("type",))
+metrics.histogram("bot_handler_seconds", "Время обработчика", ("router", "handler"))
+metrics.histogram("bot_api_seconds", "Время вызова Bot API", ("method",))
+metrics.counter("bot_api_retries_total", "Повторы вызовов Bot API", ("method", "reason"))
+metrics.histogram("bot_db_write_seconds", "Время записи базы на диск", ("op",))
+metrics.histogram("bot_rate_fetch_seconds", "Время запроса курса", ("source", "result"))
+metrics.histogram("bot_loop_lag_seconds", "Задержка цикла событий")
+metrics.counter("bot_throttled_total", "Отброшенные антифлудом запросы", ("group",))
+
+
+class LoopLagMonitor:
+    """Раз в interval секунд проверяет, насколько позже запланированного проснулся цикл событий"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            metrics.observe("bot_loop_lag_seconds", (), max(0.0, loop.time() - expected))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер с /metrics для Prometheus"""
+
+    def __init__(self):
+        self._runner = None
+
+    async def start(self, host: str, port: int):
+        from aiohttp import web
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logging.info(f"Метрики Prometheus: http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def format_stats() -> str:
+    """Сводка для админской команды /stats"""
+    uptime = time.time() - metrics.started_at
+    updates = metrics.counters("bot_updates_total")
+    total = sum(updates.values())
+    overall = Histogram()
+    for histogram in metrics.series("bot_update_seconds").values():
+        _merge(overall, histogram)
+
+    lines = [
+        "📈 Статистика процесса",
+        f"⏱ Работает: {_duration(uptime)}",
+        f"📨 Апдейтов: {total:.0f} ({total / uptime if uptime else 0:.2f}/с)",
+        f"⚙️ Обработка: {_quantiles(overall)}",
+    ]
+    errors = sum(value for (_, result), value in updates.items() if result == "error")
+    if errors:
+        lines.append(f"❌ Ошибок: {errors:.0f}")
+    throttled = metrics.counters("bot_throttled_total")
+    if throttled:
+        lines.append("🚦 Антифлуд: " + ", ".join(f"{group} {value:.0f}" for (group,), value in sorted(throttled.items())))
+
+    handlers = sorted(metrics.series("bot_handler_seconds").items(), key=lambda item: -item[1].count)[:10]
+    _section(lines, "🧩 Обработчики (по числу вызовов):",
+             (f"{router}.{handler}" for (router, handler), _ in handlers), (h for _, h in handlers))
+    api = sorted(metrics.series("bot_api_seconds").items(), key=lambda item: -item[1].count)[:8]
+    _section(lines, "🌐 Bot API:", (method for (method,), _ in api), (h for _, h in api))
+    retries = metrics.counters("bot_api_retries_total")
+    if retries:
+        by_reason: Dict[str, float] = {}
+        for (_, reason), value in retries.items():
+            by_reason[reason] = by_reason.get(reason, 0) + value
+        lines.append("🔁 Повторы Bot API: " + ", ".join(f"{reason} {value:.0f}" for reason, value in sorted(by_reason.items())))
+    db_writes = sorted(metrics.series("bot_db_write_seconds").items())
+    _section(lines, "💾 Запись базы:", (op for (op,), _ in db_writes), (h for _, h in db_writes))
+    rate_fetches = sorted(metrics.series("bot_rate_fetch_seconds").items())
+    _section(lines, "💱 Курсы:", (f"{source.upper()} ({result})" for (source, result), _ in rate_fetches),
+             (h for _, h in rate_fetches))
+
+    lag = metrics.series("bot_loop_lag_seconds").get(())
+    if lag is not None:
+        lines.append(f"\n🔁 Задержка цикла: {_quantiles(lag)}, макс. {lag.max * 1000:.0f} мс")
+    return "\n".join(lines)
+
+
+def _section(lines: List[str], title: str, names, histograms):
+    rows = [f"• {name}: {histogram.count}, {_quantiles(histogram)}" for name, histogram in zip(names, histograms)]
+    if rows:
+        lines.append("\n" + title)
+        lines.extend(rows)
+
+
+def _merge(target: Histogram, source: Histogram):
+    for index, count in enumerate(source.counts):
+        target.counts[index] += count
+    target.sum += source.sum
+    target.count += source.count
+    target.max = max(target.max, source.max)
+
+
+def _quantiles(histogram: Histogram) -> str:
+    return "p50 {:.0f} / p95 {:.0f} / p99 {:.0f} мс".format(
+        *(histogram.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+    )
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return f"{days}д {hours:02d}:{minutes:02d}:{seconds:02d}" if days else f"{hours:02d}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,260 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from callbacks import legacy_callback
+from config import ADMIN_DENY_LOG_INTERVAL, THROTTLE, THROTTLE_LIMITS
+from database import db
+from metrics import metrics
+
+
+class AdminMiddleware(BaseMiddleware):
+    """Пропускает к обработчикам админ-роутера только админов
+
+    Подключается как внутренняя middleware (router.message.middleware):
+    срабатывает только когда фильтры админского обработчика совпали, поэтому
+    не мешает пользовательскому роутеру. Проверка - поиск во frozenset
+    db.admin_ids, который пересобирается при изменении списка админов.
+    Отказы логируются не чаще раза в log_interval секунд на пользователя.
+    """
+
+    def __init__(self, log_interval: float = ADMIN_DENY_LOG_INTERVAL, max_tracked: int = 10000):
+        self.log_interval = log_interval
+        self.max_tracked = max_tracked
+        # user_id -> [время последней записи в лог, отказов с тех пор]
+        self._denied: Dict[int, list] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and user.id in db.admin_ids:
+            return await handler(event, data)
+        self._log_denied(user.id if user else 0, event)
+        if isinstance(event, CallbackQuery):
+            await event.answer("⛔ Доступ запрещен", show_alert=True)
+        # Сообщения от не-админов просто игнорируются
+        return None
+
+    def _log_denied(self, user_id: int, event: TelegramObject):
+        now = time.monotonic()
+        entry = self._denied.get(user_id)
+        if entry is not None and now - entry[0] < self.log_interval:
+            entry[1] += 1
+            return
+        if entry is None and len(self._denied) >= self.max_tracked:
+            self._forget(now)
+        suppressed = entry[1] if entry else 0
+        self._denied[user_id] = [now, 0]
+        what = event.data if isinstance(event, CallbackQuery) else getattr(event, "text", None)
+        logging.warning(
+            f"Попытка доступа неадмина: {user_id} ({type(event).__name__}: {str(what)[:50]!r})"
+            + (f", ещё {suppressed} попыток за последние {self.log_interval:.0f} с" if suppressed else "")
+        )
+
+    def _forget(self, now: float):
+        """Убирает записи, интервал которых истек; если таких нет - самую старую половину"""
+        expired = [user_id for user_id, (logged_at, _) in self._denied.items() if now - logged_at >= self.log_interval]
+        if not expired:
+            expired = sorted(self._denied, key=lambda user_id: self._denied[user_id][0])[:len(self._denied) // 2]
+        for user_id in expired:
+            del self._denied[user_id]
+
+
+class TokenBuckets:
+    """Корзины токенов одной группы обработчиков: user_id -> [токенов, время обновления]
+
+    Корзина пополняется на rate токенов в секунду, но не больше burst; каждый
+    запрос тратит токен. Записи лежат в OrderedDict в порядке последнего
+    обращения, поэтому простаивающие собираются с начала словаря при каждом
+    вызове: память - по числу активных пользователей, операция - O(1)
+    амортизированно. Забывается только корзина, которая за время простоя уже
+    пополнилась бы доверху, так что на лимиты это не влияет.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.idle = burst / rate
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, user_id: int, now: float) -> float:
+        """0 - запрос разрешен, иначе через сколько секунд появится токен"""
+        self._evict(now)
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            user_id, (_, updated_at) = next(iter(buckets.items()))
+            if now - updated_at < self.idle:
+                break
+            del buckets[user_id]
+
+
+# Корзины антифлуда общие для всех роутеров: лимит группы действует на пользователя целиком
+throttle_buckets = {group: TokenBuckets(rate, burst) for group, (rate, burst) in THROTTLE_LIMITS.items()}
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Антифлуд: лимит запросов пользователя по группам обработчиков
+
+    Внутренняя middleware роутера считает только апдейты, дошедшие до
+    обработчика; группа задается флагом обработчика (flags={"throttle": "checkout"}),
+    без флага - default_group роутера. Внешняя middleware диспетчера
+    (setup_throttling) обработчика еще не знает и считает все апдейты
+    пользователя в default_group - флуд отсекается до фильтров, которые
+    aiogram гоняет через поток на каждую проверку. На лишнее нажатие кнопки
+    пользователь получает всплывающую подсказку, лишние сообщения молча
+    отбрасываются.
+    """
+
+    def __init__(self, default_group: str = "default", groups: Optional[Dict[str, TokenBuckets]] = None,
+                 enabled: bool = THROTTLE):
+        self.default_group = default_group
+        self.groups = throttle_buckets if groups is None else groups
+        self.enabled = enabled
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if not self.enabled or user is None:
+            return await handler(event, data)
+        group = get_flag(data, "throttle", default=self.default_group)
+        wait = self.groups[group].take(user.id, time.monotonic())
+        if not wait:
+            return await handler(event, data)
+        metrics.inc("bot_throttled_total", (group,))
+        if isinstance(event, CallbackQuery):
+            await event.answer(f"⏳ Слишком часто, повторите через {math.ceil(wait)} с")
+        return None
+
+
+def setup_throttling(dispatcher: Dispatcher):
+    """Общий лимит на пользователя для сообщений и нажатий кнопок - до выбора обработчика"""
+    flood = ThrottlingMiddleware("flood")
+    dispatcher.message.outer_middleware(flood)
+    dispatcher.callback_query.outer_middleware(flood)
+
+
+class LegacyCallbackMiddleware(BaseMiddleware):
+    """Внешняя middleware диспетчера: кнопки со старым форматом callback_data
+
+    Данные таких кнопок переводятся в формат CallbackData до фильтров, и
+    нажатие попадает в обычный обработчик. Апдейты неизменяемые, поэтому
+    дальше передается копия нажатия с новыми данными.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.data:
+            game = None
+            state = data.get("state")
+            if event.data.startswith("currency_") and state is not None:
+                game = (await state.get_data()).get("game")
+            packed = legacy_callback(event.data, game)
+            if packed is not None:
+                event = event.model_copy(update={"data": packed})
+        return await handler(event, data)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешняя middleware диспетчера: полное время и исход каждого апдейта"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        start = time.perf_counter()
+        result = "error"
+        try:
+            response = await handler(event, data)
+            result = "unhandled" if response is UNHANDLED else "ok"
+            return response
+        finally:
+            update_type = event.event_type
+            metrics.observe("bot_update_seconds", (update_type,), time.perf_counter() - start)
+            metrics.inc("bot_updates_total", (update_type, result))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренняя middleware: время конкретного обработчика с метками роутер/функция"""
+
+    def __init__(self):
+        self._labels: Dict[Callable, tuple] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.observe("bot_handler_seconds", self._labels_for(data["handler"].callback),
+                            time.perf_counter() - start)
+
+    def _labels_for(self, callback: Callable) -> tuple:
+        labels = self._labels.get(callback)
+        if labels is None:
+            # handlers.user_handlers.start -> ("user_handlers", "start")
+            labels = (callback.__module__.rsplit(".", 1)[-1], callback.__name__)
+            self._labels[callback] = labels
+        return labels
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Bot API по методу"""
+
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            metrics.observe("bot_api_seconds", (method.__api_method__,), time.perf_counter() - start)
+
+
+def setup_metrics(dispatcher: Dispatcher):
+    """Подключает сбор метрик ко всем апдейтам и обработчикам диспетчера"""
+    dispatcher.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    # Внутренние middleware диспетчера действуют и на обработчики вложенных роутеров
+    for name, observer in dispatcher.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_metrics)
@@ -0,0 +1,103 @@
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def now_ts() -> int:
+    """Текущее время в секундах Unix"""
+    return int(time.time())
+
+
+def parse_ts(value) -> int:
+    """Время из старого формата data.json (ISO-строка) в секунды Unix"""
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+
+def format_ts(ts: int) -> str:
+    """Дата для сообщений: 25.04.2025 08:41"""
+    return datetime.fromtimestamp(ts).strftime("%d.%m.%Y %H:%M")
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Статусы, игры и способы оплаты повторяются в каждом заказе - храним одну копию строки
+    return sys.intern(value) if value is not None else None
+
+
+class Order:
+    """Заказ. Сумма в копейках, время в секундах Unix, повторяющиеся строки интернированы"""
+    __slots__ = ("id", "user_id", "game", "currency", "amount", "game_id",
+                 "payment_method", "status", "created_at", "updated_at")
+
+    def __init__(self, id: int, user_id: int, game: str, currency: str, amount: int, game_id: str,
+                 payment_method: Optional[str], status: str, created_at: int, updated_at: int):
+        self.id = int(id)
+        self.user_id = user_id
+        self.game = _intern(game)
+        self.currency = _intern(currency)
+        self.amount = amount
+        self.game_id = game_id
+        self.payment_method = _intern(payment_method)
+        self.status = _intern(status)
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    def update(self, data: Dict):
+        """Обновляет поля заказа из словаря"""
+        for key, value in data.items():
+            if key == "id" or key not in self.__slots__:
+                continue
+            if key in ("game", "currency", "payment_method", "status"):
+                value = _intern(value)
+            setattr(self, key, value)
+
+    def to_row(self) -> List:
+        """Компактное представление для data.json и журнала"""
+        return [self.id, self.user_id, self.game, self.currency, self.amount, self.game_id,
+                self.payment_method, self.status, self.created_at, self.updated_at]
+
+    @classmethod
+    def from_row(cls, row: List) -> "Order":
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Order":
+        """Заказ из старого формата data.json (словарь с ISO-датами)"""
+        return cls(
+            data["id"], data["user_id"], data["game"], data["currency"], data["amount"],
+            data["game_id"], data.get("payment_method"), data["status"],
+            parse_ts(data["created_at"]), parse_ts(data.get("updated_at", data["created_at"]))
+        )
+
+    def to_dict(self) -> Dict:
+        return dict(zip(self.__slots__, self.to_row()))
+
+    def __repr__(self):
+        return f"Order(id={self.id}, user_id={self.user_id}, status={self.status!r})"
+
+
+class User:
+    """Пользователь бота"""
+    __slots__ = ("username", "first_name", "created_at")
+
+    def __init__(self, username: str, first_name: str, created_at: int):
+        self.username = username
+        self.first_name = first_name
+        self.created_at = created_at
+
+    def to_row(self) -> List:
+        return [self.username, self.first_name, self.created_at]
+
+    @classmethod
+    def from_row(cls, row: List) -> "User":
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "User":
+        return cls(data.get("username", ""), data.get("first_name", ""),
+                   parse_ts(data.get("created_at", 0)))
+
+    def __repr__(self):
+        return f"User(username={self.username!r})"
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    TON_API_URL, USDT_API_URL, TON_RATE_FALLBACK, USDT_RATE_FALLBACK,
+    RATE_TTL, RATE_MAX_STALE, RATE_REFRESH_INTERVAL, RATE_TIMEOUT
+)
+from metrics import metrics
+
+
+@dataclass(frozen=True)
+class Rate:
+    """Курс валюты к рублю и его происхождение"""
+    value: float
+    fetched_at: float  # time.monotonic() момента получения, 0 для запасного значения
+    stale: bool = False  # значение старше RATE_TTL
+    fallback: bool = False  # значение из конфига, API недоступно
+
+    @property
+    def approximate(self) -> bool:
+        return self.stale or self.fallback
+
+
+@dataclass(frozen=True)
+class RateSource:
+    url: str
+    path: Tuple[str, ...]  # ключи до числа в JSON-ответе
+    fallback: Optional[float]
+
+
+class RateService:
+    """Асинхронный клиент курсов с TTL-кэшем и объединением одновременных запросов"""
+
+    def __init__(self, sources: Dict[str, RateSource], ttl: float = RATE_TTL,
+                 max_stale: float = RATE_MAX_STALE, refresh_interval: float = RATE_REFRESH_INTERVAL,
+                 timeout: float = RATE_TIMEOUT):
+        self.sources = sources
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._cache: Dict[str, Rate] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def start(self):
+        """Запускает фоновое обновление курсов"""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        """Останавливает обновление и закрывает HTTP-сессию"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.gather(*(self.refresh(name) for name in self.sources), return_exceptions=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _fetch(self, name: str) -> Rate:
+        source = self.sources[name]
+        start = time.perf_counter()
+        result = "error"
+        try:
+            async with self._get_session().get(source.url) as response:
+                response.raise_for_status()
+                value = await response.json()
+            result = "ok"
+        finally:
+            metrics.observe("bot_rate_fetch_seconds", (name, result), time.perf_counter() - start)
+        for key in source.path:
+            value = value[key]
+        rate = Rate(float(value), time.monotonic())
+        self._cache[name] = rate
+        return rate
+
+    def _start_fetch(self, name: str) -> asyncio.Task:
+        """Возвращает текущий запрос курса или запускает новый"""
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.create_task(self._fetch(name))
+            self._inflight[name] = task
+            task.add_done_callback(partial(self._fetch_done, name))
+        return task
+
+    def _fetch_done(self, name: str, task: asyncio.Task):
+        self._inflight.pop(name, None)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Ошибка получения курса {name.upper()}: {task.exception()}")
+
+    async def refresh(self, name: str) -> Optional[Rate]:
+        """Запрашивает курс; одновременные вызовы ждут один и тот же запрос"""
+        try:
+            return await asyncio.shield(self._start_fetch(name))
+        except Exception:
+            return None
+
+    async def get(self, name: str) -> Optional[Rate]:
+        """Возвращает курс из кэша, при необходимости обновляя его
+
+        Если свежего значения нет, отдается устаревшее (не старше max_stale),
+        затем запасное из конфига; None - если курс взять неоткуда.
+        """
+        cached = self._cache.get(name)
+        age = time.monotonic() - cached.fetched_at if cached else None
+        if cached and age <= self.ttl:
+            return cached
+        if cached and age <= self.max_stale:
+            # Отдаем что есть, а обновление идет в фоне
+            self._start_fetch(name)
+            return Rate(cached.value, cached.fetched_at, stale=True)
+        fresh = await self.refresh(name)
+        if fresh:
+            return fresh
+        fallback = self.sources[name].fallback
+        if fallback is not None:
+            return Rate(fallback, 0, fallback=True)
+        return None
+
+
+rates = RateService({
+    "ton": RateSource(TON_API_URL, ("the-open-network", "rub"), TON_RATE_FALLBACK),
+    "usdt": RateSource(USDT_API_URL, ("tether", "rub"), USDT_RATE_FALLBACK),
+})
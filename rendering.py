@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from catalog import format_price
+from database import db
+from models import Order, User, format_ts
+
+STATUS_EMOJI = {
+    "ожидает оплаты": "🟡",
+    "ожидает проверки": "🟠",
+    "в работе": "🔵",
+    "выполнен": "🟢",
+    "отменён": "🔴"
+}
+
+# Шаблоны собираются один раз; поля подставляются через format_map
+USER_LIST_ITEM = (
+    "🆔 ID заказа: {id}\n"
+    "🎮 Игра: {game}\n"
+    "💎 Валюта: {currency} - {price}₽\n"
+    "📅 Дата: {created}\n"
+    "{emoji} Статус: {status}\n\n"
+)
+USER_DETAIL = (
+    "📋 Детали заказа #{id}\n\n"
+    "🎮 Игра: {game}\n"
+    "💎 Валюта: {currency}\n"
+    "💰 Сумма: {price}₽\n"
+    "💳 Метод оплаты: {payment_method}\n"
+    "🆔 Игровой ID: {game_id}\n"
+    "📅 Создан: {created}\n"
+    "🔄 Обновлен: {updated}\n"
+    "{emoji} Статус: {status}\n\n"
+)
+ADMIN_LIST_ITEM = (
+    "🆔 Заказ: {id}\n"
+    "👤 Пользователь: @{username} (ID: {user_id})\n"
+    "🎮 Игра: {game}\n"
+    "💎 Валюта: {currency} - {price}₽\n"
+    "💳 Метод: {payment_method}\n"
+    "📅 Дата: {created}\n"
+    "{emoji} Статус: {status}\n\n"
+)
+ADMIN_DETAIL = (
+    "📋 Детали заказа #{id}\n\n"
+    "👤 Пользователь: @{username} (ID: {user_id})\n"
+    "🎮 Игра: {game}\n"
+    "💎 Валюта: {currency}\n"
+    "💰 Сумма: {price}₽\n"
+    "🆔 Игровой ID: {game_id}\n"
+    "💳 Метод оплаты: {payment_method}\n"
+    "📅 Создан: {created}\n"
+    "🔄 Обновлен: {updated}\n"
+    "{emoji} Статус: {status}\n\n"
+)
+
+
+class FragmentCache:
+    """LRU готовых фрагментов текста: (вид, id заказа) -> (версия заказа, текст)
+
+    Версия - (updated_at, status): изменённый заказ не совпадет по версии, даже
+    если invalidate() не был вызван (например, заказ изменил другой процесс).
+    Доступ из цикла событий и из потока базы, поэтому под блокировкой.
+    """
+
+    def __init__(self, max_size: int = 20000):
+        self.max_size = max_size
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, view: str, order: Order, render: Callable[[], str]) -> str:
+        key = (view, order.id)
+        version = (order.updated_at, order.status)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == version:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+        text = render()
+        with self._lock:
+            self.misses += 1
+            self._items[key] = (version, text)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return text
+
+    def invalidate(self, order_id: int):
+        with self._lock:
+            for view in VIEWS:
+                self._items.pop((view, order_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+VIEWS = ("user_list", "user_detail", "admin_list", "admin_detail")
+_cache = FragmentCache()
+
+
+def _fields(order: Order, user: Optional[User] = None) -> dict:
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "username": user.username if user else "N/A",
+        "game": order.game,
+        "currency": order.currency,
+        "price": format_price(order.amount),
+        "payment_method": order.payment_method or "не указан",
+        "game_id": order.game_id,
+        "created": format_ts(order.created_at),
+        "updated": format_ts(order.updated_at),
+        "emoji": STATUS_EMOJI.get(order.status, "⚪️"),
+        "status": order.status,
+    }
+
+
+def user_orders_text(orders: List[Order], page: int, pages: int, approximate: bool = False) -> str:
+    """Страница «Мои заказы»; approximate - номер страницы примерный (середина курсорного списка)"""
+    parts = [f"📋 Ваши заказы (страница {'≈' if approximate else ''}{page} из {pages}):\n\n"]
+    for order in orders:
+        parts.append(_cache.get("user_list", order, lambda: USER_LIST_ITEM.format_map(_fields(order))))
+    return "".join(parts)
+
+
+def user_order_text(order: Order) -> str:
+    """Детали заказа для покупателя"""
+    return _cache.get("user_detail", order, lambda: USER_DETAIL.format_map(_fields(order)))
+
+
+def admin_orders_text(orders: List[Order], page: int, pages: int,
+                      get_user: Callable[[int], Optional[User]], title: str = "📋 Все заказы",
+                      approximate: bool = False) -> str:
+    """Страница «Все заказы»; get_user вызывается только для заказов, которых нет в кэше"""
+    parts = [f"{title} (страница {'≈' if approximate else ''}{page} из {pages}):\n\n"]
+    for order in orders:
+        parts.append(_cache.get("admin_list", order,
+                                lambda: ADMIN_LIST_ITEM.format_map(_fields(order, get_user(order.user_id)))))
+    return "".join(parts)
+
+
+def admin_order_text(order: Order, get_user: Callable[[int], Optional[User]]) -> str:
+    """Детали заказа для админа"""
+    return _cache.get("admin_detail", order,
+                      lambda: ADMIN_DETAIL.format_map(_fields(order, get_user(order.user_id))))
+
+
+# Изменение заказа сразу сбрасывает его фрагменты
+db.add_order_listener(lambda order, previous: _cache.invalidate(order.id) if previous is not None else None)
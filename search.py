@@ -0,0 +1,227 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from catalog import catalog
+from models import Order
+
+STATUSES = ("ожидает оплаты", "ожидает проверки", "в работе", "выполнен", "отменён")
+PAYMENT_METHODS = ("TON", "USDT", "Банк")
+
+SEARCH_HELP = (
+    "🔎 Поиск заказов\n\n"
+    "Введите один или несколько фильтров через пробел:\n"
+    "• статус:проверки - ожидает оплаты / проверки / в работе / выполнен / отменён\n"
+    "• игра:PUBG\n"
+    "• оплата:TON - TON, USDT или Банк\n"
+    "• юзер:@username или юзер:123456789\n"
+    "• ид:12345678 - игровой ID\n"
+    "• дата:сегодня / вчера / неделя / месяц / 01.10.2026 / 01.10.2026-07.10.2026\n\n"
+    "Например: статус:проверки оплата:TON дата:неделя"
+)
+
+_KEYS = {
+    "статус": "status", "status": "status",
+    "игра": "game", "game": "game",
+    "оплата": "payment_method", "payment": "payment_method",
+    "юзер": "user", "user": "user", "пользователь": "user",
+    "ид": "game_id", "id": "game_id",
+    "дата": "date", "date": "date",
+}
+# ключ:значение; значение тянется до следующего известного ключа, поэтому может содержать пробелы и двоеточия
+_TOKEN = re.compile(r"(?i)\b(%s):\s*(.+?)(?=\s+(?:%s):|$)" % ("|".join(_KEYS), "|".join(_KEYS)))
+
+
+class QueryError(ValueError):
+    """Ошибка в тексте запроса; сообщение показывается админу как есть"""
+
+
+@dataclass(frozen=True)
+class OrderQuery:
+    """Фильтры поиска; None - фильтр не задан. Даты - номера дней (date.toordinal), включительно"""
+    status: Optional[str] = None
+    game: Optional[str] = None
+    payment_method: Optional[str] = None
+    user_ids: Optional[Tuple[int, ...]] = None
+    game_id: Optional[str] = None
+    day_from: Optional[int] = None
+    day_to: Optional[int] = None
+    text: str = ""
+
+    @property
+    def ts_from(self) -> Optional[int]:
+        return _day_start(self.day_from) if self.day_from is not None else None
+
+    @property
+    def ts_to(self) -> Optional[int]:
+        """Граница диапазона, не включительно: начало следующего дня"""
+        return _day_start(self.day_to + 1) if self.day_to is not None else None
+
+
+def _day_start(day: int) -> int:
+    return int(datetime.combine(date.fromordinal(day), datetime.min.time()).timestamp())
+
+
+def day_of(ts: int) -> int:
+    """Корзина по дате: номер локального дня"""
+    return date.fromtimestamp(ts).toordinal()
+
+
+def parse_query(text: str, find_users: Callable[[str], List[int]], allow_empty: bool = False) -> OrderQuery:
+    """Разбирает строку фильтров; find_users(username) -> id пользователей с таким username
+
+    allow_empty - пустая строка означает «все заказы» (выгрузка), иначе это ошибка.
+    """
+    filters: Dict[str, object] = {}
+    rest = _TOKEN.sub("", text).strip()
+    if rest:
+        raise QueryError(f"Не понял: {rest!r}. Фильтры пишутся как ключ:значение, например статус:проверки")
+    for key, value in _TOKEN.findall(text):
+        field = _KEYS[key.lower()]
+        value = value.strip()
+        if field == "status":
+            filters["status"] = _choose(value, STATUSES, "статус")
+        elif field == "game":
+            filters["game"] = _choose(value, [game.name for game in catalog.games], "игра")
+        elif field == "payment_method":
+            filters["payment_method"] = _choose(value, PAYMENT_METHODS, "способ оплаты")
+        elif field == "user":
+            filters["user_ids"] = _parse_user(value, find_users)
+        elif field == "game_id":
+            filters["game_id"] = value
+        else:
+            filters["day_from"], filters["day_to"] = _parse_dates(value)
+    if not filters and not allow_empty:
+        raise QueryError("Укажите хотя бы один фильтр")
+    return OrderQuery(text=text.strip(), **filters)
+
+
+def _choose(value: str, options: Iterable[str], what: str) -> str:
+    """Значение из списка по точному совпадению или единственному вхождению подстроки"""
+    options = list(options)
+    lowered = value.lower()
+    for option in options:
+        if option.lower() == lowered:
+            return option
+    matches = [option for option in options if lowered in option.lower()]
+    if len(matches) == 1:
+        return matches[0]
+    raise QueryError(f"{what.capitalize()} {value!r} не найден(а). Варианты: {', '.join(options)}")
+
+
+def _parse_user(value: str, find_users: Callable[[str], List[int]]) -> Tuple[int, ...]:
+    if value.lstrip("-").isdigit():
+        return (int(value),)
+    user_ids = find_users(value.lstrip("@"))
+    if not user_ids:
+        raise QueryError(f"Пользователь {value} не найден")
+    return tuple(user_ids)
+
+
+def _parse_dates(value: str) -> Tuple[int, int]:
+    today = date.today().toordinal()
+    relative = {"сегодня": (today, today), "вчера": (today - 1, today - 1),
+                "неделя": (today - 6, today), "месяц": (today - 29, today)}
+    if value.lower() in relative:
+        return relative[value.lower()]
+    try:
+        if "-" in value:
+            start, end = (datetime.strptime(part.strip(), "%d.%m.%Y").date() for part in value.split("-", 1))
+        else:
+            start = end = datetime.strptime(value, "%d.%m.%Y").date()
+    except ValueError:
+        raise QueryError(f"Дата {value!r}: нужен формат ДД.ММ.ГГГГ или ДД.ММ.ГГГГ-ДД.ММ.ГГГГ")
+    if start > end:
+        start, end = end, start
+    return start.toordinal(), end.toordinal()
+
+
+def is_empty(query: OrderQuery) -> bool:
+    return (query.status is None and query.game is None and query.payment_method is None
+            and query.user_ids is None and query.game_id is None and query.day_from is None)
+
+
+def describe(query: OrderQuery) -> str:
+    """Краткое описание фильтров для заголовка результатов"""
+    parts = []
+    if query.status:
+        parts.append(f"статус «{query.status}»")
+    if query.game:
+        parts.append(f"игра {query.game}")
+    if query.payment_method:
+        parts.append(f"оплата {query.payment_method}")
+    if query.user_ids:
+        parts.append("пользователь " + ", ".join(map(str, query.user_ids)))
+    if query.game_id:
+        parts.append(f"игровой ID {query.game_id}")
+    if query.day_from is not None:
+        start = date.fromordinal(query.day_from).strftime("%d.%m.%Y")
+        end = date.fromordinal(query.day_to).strftime("%d.%m.%Y")
+        parts.append(f"дата {start}" if start == end else f"даты {start}-{end}")
+    return ", ".join(parts) or "все заказы"
+
+
+class OrderIndex:
+    """Инвертированные индексы по заказам в памяти: значение поля -> множество id
+
+    Поддерживается на каждое добавление и изменение заказа; запрос пересекает
+    множества, начиная с самого маленького, поэтому стоит O(размер наименьшего
+    множества), а не O(числа заказов).
+    """
+
+    FIELDS = ("status", "game", "payment_method", "user_id", "game_id", "day")
+
+    def __init__(self):
+        self._sets: Dict[str, Dict[object, Set[int]]] = {field: {} for field in self.FIELDS}
+
+    @staticmethod
+    def _keys(order: Order) -> Tuple:
+        return (order.status, order.game, order.payment_method, order.user_id, order.game_id,
+                day_of(order.created_at))
+
+    def add(self, order: Order):
+        for field, key in zip(self.FIELDS, self._keys(order)):
+            self._sets[field].setdefault(key, set()).add(order.id)
+
+    def add_entry(self, order_id: int, keys: Tuple):
+        """Заказ по готовым значениям полей (архив: заказ не читается с диска)"""
+        for field, key in zip(self.FIELDS, keys):
+            self._sets[field].setdefault(key, set()).add(order_id)
+
+    def update(self, order: Order, previous: Order):
+        for field, old, new in zip(self.FIELDS, self._keys(previous), self._keys(order)):
+            if old == new:
+                continue
+            ids = self._sets[field].get(old)
+            if ids is not None:
+                ids.discard(order.id)
+                if not ids:
+                    del self._sets[field][old]
+            self._sets[field].setdefault(new, set()).add(order.id)
+
+    def query(self, query: OrderQuery) -> Set[int]:
+        candidates: List[Set[int]] = []
+        for field, value in (("status", query.status), ("game", query.game),
+                             ("payment_method", query.payment_method), ("game_id", query.game_id)):
+            if value is not None:
+                candidates.append(self._sets[field].get(value, set()))
+        if query.user_ids is not None:
+            candidates.append(self._union("user_id", query.user_ids))
+        if query.day_from is not None:
+            candidates.append(self._union("day", range(query.day_from, query.day_to + 1)))
+        if not candidates:
+            return set()
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for ids in candidates[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _union(self, field: str, keys: Iterable) -> Set[int]:
+        buckets = [self._sets[field][key] for key in keys if key in self._sets[field]]
+        if len(buckets) == 1:
+            return buckets[0]
+        return set().union(*buckets)
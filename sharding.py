@@ -0,0 +1,235 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+from typing import Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+
+from config import (
+    DB_BACKEND, DB_WRITE_BEHIND, DROP_PENDING_UPDATES, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_MAX_CONNECTIONS, WORKER_QUEUE_SIZE
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хеширование: при изменении числа воркеров переезжает ~1/N пользователей"""
+
+    def __init__(self, nodes: int, replicas: int = 512):
+        self.nodes = nodes
+        ring = sorted((_hash(f"{node}:{replica}"), node)
+                      for node in range(nodes) for replica in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def node_for(self, key: int) -> int:
+        point = _hash(str(key))
+        index = bisect.bisect(self._points, point) % len(self._points)
+        return self._nodes[index]
+
+
+def update_user_id(update: dict) -> int:
+    """Пользователь, от которого пришел апдейт (или чат, если отправителя нет)"""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        sender = event.get("from") or event.get("user")
+        if sender:
+            return sender["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+class ShardedFront:
+    """Принимает сырые апдейты и раздает их воркерам по from_user.id
+
+    Все апдейты одного пользователя попадают в один процесс, поэтому его
+    шаги FSM обрабатываются по порядку. target(index, queue, *args)
+    запускается в каждом процессе-воркере.
+    """
+
+    def __init__(self, workers: int, target: Callable, args: tuple = (),
+                 queue_size: int = WORKER_QUEUE_SIZE):
+        self.ring = HashRing(workers)
+        # spawn: воркер получает чистый интерпретатор, без копии соединений и цикла фронта
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue(queue_size) for _ in range(workers)]
+        self.processes = [
+            context.Process(target=target, args=(index, queue, *args), name=f"bot-worker-{index}", daemon=True)
+            for index, queue in enumerate(self.queues)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def route(self, update: dict):
+        """Передает апдейт воркеру; блокирует, если его очередь переполнена"""
+        self.queues[self.ring.node_for(update_user_id(update))].put(update)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Просит воркеров дообработать очередь и завершиться"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"{process.name} не завершился, останавливаем принудительно")
+                process.terminate()
+
+
+async def serve_queue(dp: Dispatcher, bot: Bot, queue, **workflow_data):
+    """Цикл воркера: апдейты из очереди фронта в диспетчер
+
+    Разные пользователи обрабатываются параллельно, апдейты одного
+    пользователя - строго друг за другом.
+    """
+    loop = asyncio.get_running_loop()
+    tails: Dict[int, asyncio.Task] = {}
+
+    async def handle(update: dict, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait({previous})
+        await dp.feed_raw_update(bot, update, **workflow_data)
+
+    def release(user_id: int, task: asyncio.Task):
+        if tails.get(user_id) is task:
+            del tails[user_id]
+
+    while True:
+        update = await loop.run_in_executor(None, queue.get)
+        if update is None:
+            break
+        user_id = update_user_id(update)
+        task = asyncio.create_task(handle(update, tails.get(user_id)))
+        tails[user_id] = task
+        task.add_done_callback(lambda t, user_id=user_id: release(user_id, t))
+    if tails:
+        await asyncio.wait(set(tails.values()))
+
+
+def run_worker(index: int, queue):
+    """Точка входа процесса-воркера бота"""
+    # Ctrl+C получают все процессы группы; останавливает воркеров фронт через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(index, queue))
+
+
+async def _worker(index: int, queue):
+    from bot import create_bot, create_dispatcher, setup_logging
+    from database import db
+
+    setup_logging()
+    bot = create_bot()
+    dp = create_dispatcher()
+    workflow_data = {"dispatcher": dp, "bots": [bot], "worker_index": index}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    logging.info(f"Воркер {index} запущен (pid {os.getpid()})")
+    try:
+        await serve_queue(dp, bot, queue, worker_index=index)
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+        db.close()
+        logging.info(f"Воркер {index} остановлен")
+
+
+def check_shared_storage():
+    """Воркеры пишут в одну базу, JSON-хранилище для этого не подходит"""
+    if DB_BACKEND != "sqlite":
+        raise RuntimeError("Для WORKERS > 1 нужен DB_BACKEND=sqlite: data.json нельзя писать из нескольких процессов")
+    if DB_WRITE_BEHIND:
+        # Отложенная запись держит транзакцию SQLite открытой до сброса и блокирует соседей
+        logging.warning("DB_WRITE_BEHIND отключен для воркеров: открытая транзакция блокирует запись других процессов")
+        os.environ["DB_WRITE_BEHIND"] = "0"
+
+
+async def _poll(front: ShardedFront, bot: Bot, allowed_updates: List[str], stop: asyncio.Event):
+    await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+    loop = asyncio.get_running_loop()
+    offset = None
+    while not stop.is_set():
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=10, allowed_updates=allowed_updates)
+        except Exception as e:
+            logging.error(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            raw = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+            # put может ждать освобождения очереди - не держим цикл
+            await loop.run_in_executor(None, front.route, raw)
+            offset = update.update_id + 1
+
+
+async def _serve_webhook(front: ShardedFront, bot: Bot, allowed_updates: List[str], stop: asyncio.Event):
+    from aiohttp import web
+    from webhook import healthcheck
+
+    if not WEBHOOK_URL:
+        raise RuntimeError("Для BOT_MODE=webhook нужно задать WEBHOOK_URL")
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    loop = asyncio.get_running_loop()
+
+    async def receive(request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret_token):
+            return web.Response(status=401, text="Unauthorized")
+        await loop.run_in_executor(None, front.route, await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.router.add_get("/healthz", healthcheck)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    await bot.set_webhook(
+        url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=secret_token,
+        allowed_updates=allowed_updates,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=DROP_PENDING_UPDATES
+    )
+    logging.info(f"Сервер вебхука слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_sharded(bot: Bot, allowed_updates: List[str], workers: int, mode: str):
+    """Фронт: получает апдейты (polling или webhook) и раздает их воркерам"""
+    check_shared_storage()
+    front = ShardedFront(workers, run_worker)
+    front.start()
+    logging.info(f"Запущено воркеров: {workers}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    serve = _serve_webhook if mode == "webhook" else _poll
+    receiver = asyncio.create_task(serve(front, bot, allowed_updates, stop))
+    try:
+        await asyncio.wait({receiver, asyncio.create_task(stop.wait())}, return_when=asyncio.FIRST_COMPLETED)
+        stop.set()
+        if receiver.done():
+            receiver.result()
+        else:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+    finally:
+        await loop.run_in_executor(None, front.stop)
@@ -0,0 +1,546 @@
+import os
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from config import SQLITE_PATH, DB_WRITE_BEHIND, DB_FLUSH_BATCH
+from metrics import metrics
+from models import Order, User, now_ts
+from search import OrderQuery
+from storage import Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL DEFAULT '',
+    first_name TEXT NOT NULL DEFAULT '',
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    game_id TEXT NOT NULL,
+    payment_method TEXT,
+    status TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status);
+CREATE INDEX IF NOT EXISTS idx_orders_game ON orders (game, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_payment ON orders (payment_method, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_game_id ON orders (game_id);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS admins (
+    user_id INTEGER PRIMARY KEY
+);
+-- Число заказов поддерживается триггерами: «страница N из M» без COUNT(*) по всей таблице
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS orders_count_insert AFTER INSERT ON orders BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'orders';
+END;
+CREATE TRIGGER IF NOT EXISTS orders_count_delete AFTER DELETE ON orders BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'orders';
+END;
+-- То же для заказов каждого пользователя: /myorders без COUNT(*) на каждую страницу
+CREATE TABLE IF NOT EXISTS user_order_counts (
+    user_id INTEGER PRIMARY KEY,
+    orders INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS user_orders_count_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO user_order_counts VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET orders = orders + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS user_orders_count_update AFTER UPDATE OF user_id ON orders BEGIN
+    UPDATE user_order_counts SET orders = orders - 1 WHERE user_id = OLD.user_id;
+    INSERT INTO user_order_counts VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET orders = orders + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS user_orders_count_delete AFTER DELETE ON orders BEGIN
+    UPDATE user_order_counts SET orders = orders - 1 WHERE user_id = OLD.user_id;
+END;
+-- Сводка продаж для аналитики, тоже на триггерах: отчет читает корзины, а не заказы,
+-- и видит заказы всех воркеров. Способ оплаты без значения хранится как ''
+CREATE TABLE IF NOT EXISTS sales (
+    game TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    payment_method TEXT NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (game, currency, payment_method, day, status)
+);
+CREATE TRIGGER IF NOT EXISTS sales_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO sales VALUES (NEW.game, NEW.currency, IFNULL(NEW.payment_method, ''),
+                              date(NEW.created_at, 'unixepoch', 'localtime'), NEW.status, 1, NEW.amount)
+    ON CONFLICT (game, currency, payment_method, day, status)
+    DO UPDATE SET orders = orders + 1, amount = amount + excluded.amount;
+END;
+CREATE TRIGGER IF NOT EXISTS sales_update
+AFTER UPDATE OF game, currency, payment_method, created_at, status, amount ON orders BEGIN
+    UPDATE sales SET orders = orders - 1, amount = amount - OLD.amount
+    WHERE game = OLD.game AND currency = OLD.currency AND payment_method = IFNULL(OLD.payment_method, '')
+      AND day = date(OLD.created_at, 'unixepoch', 'localtime') AND status = OLD.status;
+    INSERT INTO sales VALUES (NEW.game, NEW.currency, IFNULL(NEW.payment_method, ''),
+                              date(NEW.created_at, 'unixepoch', 'localtime'), NEW.status, 1, NEW.amount)
+    ON CONFLICT (game, currency, payment_method, day, status)
+    DO UPDATE SET orders = orders + 1, amount = amount + excluded.amount;
+END;
+CREATE TRIGGER IF NOT EXISTS sales_delete AFTER DELETE ON orders BEGIN
+    UPDATE sales SET orders = orders - 1, amount = amount - OLD.amount
+    WHERE game = OLD.game AND currency = OLD.currency AND payment_method = IFNULL(OLD.payment_method, '')
+      AND day = date(OLD.created_at, 'unixepoch', 'localtime') AND status = OLD.status;
+END;
+"""
+
+# Полный пересчет счетчиков пользователей и сводки продаж по заказам (миграции и перенос из data.json)
+USER_COUNTS_REBUILD = "INSERT INTO user_order_counts SELECT user_id, COUNT(*) FROM orders GROUP BY user_id"
+SALES_REBUILD = (
+    "INSERT INTO sales SELECT game, currency, IFNULL(payment_method, ''), "
+    "date(created_at, 'unixepoch', 'localtime'), status, COUNT(*), SUM(amount) FROM orders GROUP BY 1, 2, 3, 4, 5"
+)
+
+# PRAGMA user_version: 1 - суммы в копейках, 2 - счетчик заказов, 3 - сводка продаж,
+# 4 - счетчики заказов пользователей
+SCHEMA_VERSION = 4
+
+ORDER_COLUMNS = ("id", "user_id", "game", "currency", "amount", "game_id",
+                 "payment_method", "status", "created_at", "updated_at")
+
+
+def _order_from_row(row) -> Order:
+    return Order.from_row(row)
+
+
+class _OrdersView:
+    """Доступ к заказам в стиле словаря: db.orders.get(order_id)"""
+
+    def __init__(self, db: "SQLiteDatabase"):
+        self._db = db
+
+    def get(self, order_id, default=None):
+        return self._db.get_order(order_id) or default
+
+    def __getitem__(self, order_id):
+        order = self._db.get_order(order_id)
+        if order is None:
+            raise KeyError(order_id)
+        return order
+
+    def __contains__(self, order_id):
+        return self._db.get_order(order_id) is not None
+
+    def __len__(self):
+        return self._db._query_one("SELECT COUNT(*) FROM orders")[0]
+
+    def values(self):
+        return self._db.get_all_orders()
+
+
+class _UsersView:
+    """Доступ к пользователям в стиле словаря: db.users.get(user_id)"""
+
+    def __init__(self, db: "SQLiteDatabase"):
+        self._db = db
+
+    def get(self, user_id, default=None):
+        return self._db.get_user(user_id) or default
+
+    def __getitem__(self, user_id):
+        user = self._db.get_user(user_id)
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __contains__(self, user_id):
+        return self._db.get_user(user_id) is not None
+
+    def __len__(self):
+        return self._db._query_one("SELECT COUNT(*) FROM users")[0]
+
+    def keys(self):
+        return [row[0] for row in self._db._query_all("SELECT user_id FROM users ORDER BY user_id")]
+
+
+class SQLiteDatabase(Storage):
+    """Хранилище на SQLite (WAL) с тем же интерфейсом, что и Database"""
+
+    def __init__(self, path: str = SQLITE_PATH, write_behind: bool = DB_WRITE_BEHIND,
+                 flush_batch: int = DB_FLUSH_BATCH, lazy: bool = False):
+        super().__init__()
+        self.path = path
+        self.write_behind = write_behind
+        self.flush_batch = flush_batch
+        self._pending_count = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.users = _UsersView(self)
+        self.orders = _OrdersView(self)
+        self.loaded = False
+        if not lazy:
+            self.open()
+
+    def open(self):
+        """Открывает соединение и обновляет схему; при lazy=True вызывается на этапе запуска бота"""
+        if self.loaded:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Соединение используется из потока-исполнителя, доступ сериализуется блокировкой
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._stored_admins = {row[0] for row in self._query_all("SELECT user_id FROM admins")}
+        self.admins = list(set(self.admins) | self._stored_admins)
+        self.loaded = True
+
+    def _migrate(self):
+        """Обновляет схему существующей базы до SCHEMA_VERSION"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Суммы из рублей (REAL) в целые копейки
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("UPDATE orders SET amount = CAST(ROUND(amount * 100) AS INTEGER)")
+            self._conn.execute("PRAGMA user_version = 1")
+            self._conn.execute("COMMIT")
+        if version < 2:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('orders', (SELECT COUNT(*) FROM orders))")
+            self._conn.execute("PRAGMA user_version = 2")
+            self._conn.execute("COMMIT")
+        if version < 3:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM sales")
+            self._conn.execute(SALES_REBUILD)
+            self._conn.execute("PRAGMA user_version = 3")
+            self._conn.execute("COMMIT")
+        if version < 4:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM user_order_counts")
+            self._conn.execute(USER_COUNTS_REBUILD)
+            self._conn.execute("PRAGMA user_version = 4")
+            self._conn.execute("COMMIT")
+
+    def _query_one(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _query_all(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()):
+        with self._lock:
+            if not self.write_behind:
+                return self._conn.execute(sql, params)
+            # Групповая фиксация: мутации копятся в одной транзакции до flush()
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            cursor = self._conn.execute(sql, params)
+            self._pending_count += 1
+            if self._pending_count >= self.flush_batch:
+                self._commit_pending()
+            return cursor
+
+    def _commit_pending(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending_count = 0
+
+    @property
+    def dirty(self) -> bool:
+        """Есть ли незафиксированные мутации"""
+        return self._pending_count > 0
+
+    @metrics.timed("bot_db_write_seconds", "flush")
+    def flush(self):
+        """Фиксирует накопленные мутации одной транзакцией"""
+        with self._lock:
+            self._commit_pending()
+
+    @property
+    def last_order_id(self) -> int:
+        row = self._query_one("SELECT seq FROM sqlite_sequence WHERE name = 'orders'")
+        return row[0] if row else 0
+
+    @metrics.timed("bot_db_write_seconds", "save")
+    def save(self):
+        """Сохраняет список админов (заказы и пользователи пишутся сразу)"""
+        self.flush()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM admins")
+            self._conn.executemany("INSERT INTO admins (user_id) VALUES (?)",
+                                   [(int(x),) for x in self.admins])
+            self._conn.execute("COMMIT")
+        self._stored_admins = set(int(x) for x in self.admins)
+
+    def close(self):
+        """Фиксирует отложенные мутации и закрывает соединение с базой"""
+        if self._conn is None:
+            return
+        self.flush()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+        self.loaded = False
+
+    def add_user(self, user_id: int, username: str, first_name: str):
+        """Добавляет нового пользователя"""
+        self._write(
+            "INSERT OR IGNORE INTO users (user_id, username, first_name, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, username, first_name, now_ts())
+        )
+
+    def get_user(self, user_id) -> Optional[User]:
+        """Возвращает пользователя по ID"""
+        row = self._query_one(
+            "SELECT username, first_name, created_at FROM users WHERE user_id = ?", (int(user_id),)
+        )
+        return User.from_row(row) if row else None
+
+    def get_user_ids(self) -> List[int]:
+        """Возвращает ID всех пользователей"""
+        return self.users.keys()
+
+    def add_order(self, user_id: int, game: str, currency: str, amount: int, game_id: str, payment_method: str = None) -> Order:
+        """Добавляет новый заказ"""
+        now = now_ts()
+        cursor = self._write(
+            "INSERT INTO orders (user_id, game, currency, amount, game_id, payment_method, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, game, currency, amount, game_id, payment_method, "ожидает оплаты", now, now)
+        )
+        order = Order(cursor.lastrowid, user_id, game, currency, amount, game_id,
+                      payment_method, "ожидает оплаты", now, now)
+        self._notify_order(order, None)
+        return order
+
+    def get_order(self, order_id) -> Optional[Order]:
+        """Возвращает заказ по ID"""
+        try:
+            order_id = int(order_id)
+        except (TypeError, ValueError):
+            return None
+        row = self._query_one(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders WHERE id = ?", (order_id,))
+        return _order_from_row(row) if row else None
+
+    def update_order(self, order_id, update_data: dict) -> bool:
+        """Обновляет любые данные заказа"""
+        fields = {k: v for k, v in update_data.items() if k in ORDER_COLUMNS and k != "id"}
+        fields["updated_at"] = now_ts()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        try:
+            order_id = int(order_id)
+        except (TypeError, ValueError):
+            return False
+        # Старая версия нужна только подписчикам - без них лишнего чтения нет
+        previous = self.get_order(order_id) if self._order_listeners else None
+        cursor = self._write(f"UPDATE orders SET {assignments} WHERE id = ?", (*fields.values(), order_id))
+        if cursor.rowcount > 0 and self._order_listeners:
+            self._notify_order(self.get_order(order_id), previous)
+        return cursor.rowcount > 0
+
+    def update_order_status(self, order_id, status: str) -> bool:
+        """Обновляет только статус (для обратной совместимости)"""
+        return self.update_order(order_id, {"status": status})
+
+    def get_user_orders(self, user_id: int) -> List[Order]:
+        """Возвращает заказы пользователя (от старых к новым, как и Database)"""
+        rows = self._query_all(
+            f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+        return [_order_from_row(row) for row in rows]
+
+    def get_all_orders(self) -> List[Order]:
+        """Возвращает все заказы"""
+        rows = self._query_all(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders ORDER BY id")
+        return [_order_from_row(row) for row in rows]
+
+    def sales_groups(self) -> List[tuple]:
+        """Сводка для аналитики: (игра, позиция, оплата, день, статус, заказов, сумма)
+
+        Таблица sales ведется триггерами в общей базе - в ней заказы всех
+        воркеров, а чтение стоит O(числа корзин), а не заказов.
+        """
+        return self._query_all(
+            "SELECT game, currency, payment_method, day, status, orders, amount FROM sales WHERE orders != 0"
+        )
+
+    def _store_admins(self):
+        self.save()
+
+    def _paginate(self, where: str, params: tuple, page: int, per_page: int) -> dict:
+        total = self._query_one(f"SELECT COUNT(*) FROM orders {where}", params)[0]
+        pages = (total + per_page - 1) // per_page
+        rows = self._query_all(
+            f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (*params, per_page, (page - 1) * per_page)
+        )
+        return {
+            "orders": [_order_from_row(row) for row in rows],
+            "page": page,
+            "pages": pages,
+            "total": total
+        }
+
+    def get_user_orders_paginated(self, user_id: int, page: int = 1, per_page: int = 5) -> dict:
+        """Возвращает заказы пользователя с пагинацией"""
+        return self._paginate("WHERE user_id = ?", (user_id,), page, per_page)
+
+    def get_all_orders_paginated(self, page: int = 1, per_page: int = 10) -> dict:
+        """Возвращает все заказы с пагинацией"""
+        return self._paginate("", (), page, per_page)
+
+    def get_user_orders_page(self, user_id: int, cursor: Optional[Tuple[int, int]] = None,
+                             older: bool = True, per_page: int = 5) -> dict:
+        """Страница заказов пользователя по курсору (created_at, id), новые первыми"""
+        row = self._query_one("SELECT orders FROM user_order_counts WHERE user_id = ?", (user_id,))
+        return self._keyset_page("user_id = ?", (user_id,), row[0] if row else 0, cursor, older, per_page)
+
+    def get_all_orders_page(self, cursor: Optional[Tuple[int, int]] = None,
+                            older: bool = True, per_page: int = 10) -> dict:
+        """Страница всех заказов по курсору (created_at, id), новые первыми"""
+        total = self._query_one("SELECT value FROM counters WHERE name = 'orders'")[0]
+        return self._keyset_page("", (), total, cursor, older, per_page)
+
+    def _keyset_page(self, condition: str, params: tuple, total: int, cursor: Optional[Tuple[int, int]],
+                     older: bool, per_page: int) -> dict:
+        """Страница поиском по индексу от ключа курсора вместо OFFSET
+
+        id - rowid, поэтому индексы по created_at уже упорядочены по (created_at, id).
+        Лишняя строка в LIMIT показывает, есть ли заказы дальше в ту же сторону.
+        """
+        conditions = [condition] if condition else []
+        if cursor is not None:
+            conditions.append("(created_at, id) < (?, ?)" if older else "(created_at, id) > (?, ?)")
+            params = (*params, *cursor)
+        direction = "DESC" if older else "ASC"
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = self._query_all(
+            f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders {where} "
+            f"ORDER BY created_at {direction}, id {direction} LIMIT ?",
+            (*params, per_page + 1)
+        )
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not older:
+            rows.reverse()
+        return {
+            "orders": [_order_from_row(row) for row in rows],
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+            # С курсором в обратную сторону всегда есть хотя бы заказ самого курсора
+            "has_newer": more if not older else cursor is not None,
+            "has_older": more if older else True
+        }
+
+    def find_users(self, username: str) -> List[int]:
+        """ID пользователей с таким username (без учета регистра)"""
+        return [row[0] for row in self._query_all(
+            "SELECT user_id FROM users WHERE username = ? COLLATE NOCASE", (username,)
+        )]
+
+    def search_orders(self, query: OrderQuery, page: int = 1, per_page: int = 10) -> dict:
+        """Заказы по фильтрам, новые первыми; SQLite выбирает самый избирательный индекс"""
+        where, params = _where(query)
+        return self._paginate(where, params, page, per_page)
+
+    def iter_orders(self, query: Optional[OrderQuery] = None, batch: int = 1000) -> Iterator[Order]:
+        """Заказы по фильтрам в порядке создания, по одному (для выгрузки)
+
+        Отложенные записи фиксируются сразу, чтение идет через отдельное
+        read-only соединение: WAL дает генератору свой снимок базы, поток базы
+        и писатели им не блокируются. Строки читаются пачками по batch.
+        """
+        self.flush()
+        where, params = _where(query) if query is not None else ("", ())
+        sql = f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders {where} ORDER BY id"
+        path = os.path.abspath(self.path)
+
+        def rows() -> Iterator[Order]:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                cursor = conn.execute(sql, params)
+                while True:
+                    chunk = cursor.fetchmany(batch)
+                    if not chunk:
+                        break
+                    for row in chunk:
+                        yield _order_from_row(row)
+            finally:
+                conn.close()
+        return rows()
+
+
+def _where(query: OrderQuery):
+    """WHERE по фильтрам поиска и его параметры"""
+    conditions, params = [], []
+    for column, value in (("status", query.status), ("game", query.game),
+                          ("payment_method", query.payment_method), ("game_id", query.game_id)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if query.user_ids is not None:
+        conditions.append(f"user_id IN ({', '.join('?' * len(query.user_ids))})")
+        params.extend(query.user_ids)
+    if query.day_from is not None:
+        conditions.append("created_at >= ? AND created_at < ?")
+        params.extend((query.ts_from, query.ts_to))
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, tuple(params)
+
+
+def migrate_from_json(json_db, sqlite_path: str = SQLITE_PATH) -> SQLiteDatabase:
+    """Однократно переносит данные из Database (data.json + журнал) в SQLite"""
+    target = SQLiteDatabase(sqlite_path)
+    with target._lock:
+        conn = target._conn
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (user_id, username, first_name, created_at) VALUES (?, ?, ?, ?)",
+            [(user_id, *user.to_row()) for user_id, user in json_db.users.items()]
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO orders ({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})",
+            [order.to_row() for order in json_db.get_all_orders()]
+        )
+        # Следующий id должен продолжать нумерацию из data.json
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'orders'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('orders', ?)", (json_db.last_order_id,))
+        # INSERT OR REPLACE поверх существующих строк счетчик завышает - пересчитываем
+        conn.execute("UPDATE counters SET value = (SELECT COUNT(*) FROM orders) WHERE name = 'orders'")
+        conn.execute("DELETE FROM user_order_counts")
+        conn.execute(USER_COUNTS_REBUILD)
+        conn.execute("DELETE FROM sales")
+        conn.execute(SALES_REBUILD)
+        conn.execute("COMMIT")
+    target.admins = list(set(target.admins) | set(int(x) for x in json_db.admins))
+    target.save()
+    return target
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Перенос data/data.json в SQLite")
+    parser.add_argument("--source", default="data/data.json")
+    parser.add_argument("--target", default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    source = Database(data_path=args.source)
+    migrated = migrate_from_json(source, args.target)
+    print(f"Перенесено: пользователей {len(migrated.users)}, заказов {len(migrated.orders)}, "
+          f"последний id {migrated.last_order_id}")
+    migrated.close()
@@ -0,0 +1,58 @@
+import logging
+from typing import Callable, List, Optional
+
+from config import ADMIN_IDS
+from models import Order
+
+
+class Storage:
+    """Общая часть хранилищ Database и SQLiteDatabase: админы и подписчики на заказы
+
+    Как записать изменившийся список админов на диск, решает хранилище (_store_admins).
+    """
+
+    def __init__(self):
+        self.admins = ADMIN_IDS.copy()  # Копируем список админов из config.py
+        # Админы в том виде, в каком они записаны на диске - чтобы не перезаписывать без изменений
+        self._stored_admins = set()
+        # Подписчики на изменения заказов: listener(order, previous), previous=None для нового заказа
+        self._order_listeners: List[Callable] = []
+
+    @property
+    def admins(self) -> list:
+        return self._admins
+
+    @admins.setter
+    def admins(self, value: list):
+        # Проверка прав идет по frozenset - O(1) и без копирования на каждый апдейт
+        self._admins = value
+        self.admin_ids = frozenset(int(x) for x in value)
+
+    def is_admin(self, user_id: int) -> bool:
+        """Проверка прав администратора"""
+        return user_id in self.admin_ids
+
+    def sync_with_config_admins(self, config_admins: list):
+        """Синхронизирует список админов с конфигом"""
+        # Приводим оба списка к int и объединяем без дубликатов
+        combined = set(int(x) for x in self.admins) | set(int(x) for x in config_admins)
+        self.admins = list(combined)
+        # Пишем на диск, только если список изменился
+        if combined != self._stored_admins:
+            self._store_admins()
+            self._stored_admins = combined
+        logging.info(f"Синхронизированы админы. Итоговый список: {self.admins}")
+
+    def _store_admins(self):
+        raise NotImplementedError
+
+    def add_order_listener(self, listener: Callable):
+        """Подписывает listener(order, previous) на создание и изменение заказов (вызывается в потоке базы)"""
+        self._order_listeners.append(listener)
+
+    def _notify_order(self, order: Order, previous: Optional[Order]):
+        for listener in self._order_listeners:
+            try:
+                listener(order, previous)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика изменения заказа: {e}")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import (
+    DROP_PENDING_UPDATES, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST,
+    WEBHOOK_PORT, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_SHUTDOWN_TIMEOUT
+)
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """Отвечает Telegram 200 сразу, апдейт обрабатывается фоновой задачей
+
+    При остановке дожидается уже принятых апдейтов: Telegram считает их
+    доставленными и повторно не пришлет.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str],
+                 shutdown_timeout: float = WEBHOOK_SHUTDOWN_TIMEOUT, **data):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.shutdown_timeout = shutdown_timeout
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько принятых апдейтов еще обрабатывается"""
+        return len(self._background_feed_update_tasks)
+
+    async def drain(self):
+        """Ждет завершения фоновых обработчиков не дольше shutdown_timeout"""
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logging.info(f"Ожидание обработки {len(tasks)} апдейтов")
+        _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        if pending:
+            logging.warning(f"Не дождались обработки {len(pending)} апдейтов, прерываем")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self):
+        # Сессию бота закрываем только после того, как обработчики допишут ответы
+        await self.drain()
+        await super().close()
+
+
+async def healthcheck(request: web.Request) -> web.Response:
+    """Проверка живости для балансировщика"""
+    return web.Response(text="ok")
+
+
+def create_app(dp: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+               path: str = WEBHOOK_PATH, **data) -> web.Application:
+    """Собирает aiohttp-приложение для приема апдейтов из того же Dispatcher, что и polling
+
+    Startup/shutdown диспетчера вызываются вместе с запуском и остановкой приложения.
+    """
+    app = web.Application()
+    handler = WebhookHandler(dp, bot, secret_token=secret_token)
+    # Регистрируется первым: при остановке сначала дожидаемся апдейтов, потом shutdown диспетчера
+    handler.register(app, path=path)
+    app["webhook_handler"] = handler
+    app.router.add_get("/healthz", healthcheck)
+    setup_application(app, dp, bot=bot, **data)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запускает сервер, регистрирует вебхук в Telegram и работает до SIGINT/SIGTERM"""
+    if not WEBHOOK_URL:
+        raise RuntimeError("Для BOT_MODE=webhook нужно задать WEBHOOK_URL")
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    async def register_webhook(bot: Bot):
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=DROP_PENDING_UPDATES
+        )
+        logging.info(f"Вебхук установлен: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+    dp.startup.register(register_webhook)
+    app = create_app(dp, bot, secret_token=secret_token)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"Сервер вебхука слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остается KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        logging.info("Остановка сервера вебхука...")
+        # Новые соединения больше не принимаются, затем on_shutdown: drain и shutdown диспетчера.
+        # Вебхук в Telegram не удаляем: апдейты накопятся и придут после перезапуска
+        await runner.cleanup()